@@ -0,0 +1,344 @@
+import os
+import re
+import time
+import sqlite3
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+
+import market_data
+import indicators
+
+_CONDITION = re.compile(r"^\s*(price|rsi)?\s*([<>])\s*\$?([0-9]*\.?[0-9]+)\s*$", re.IGNORECASE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id     INTEGER NOT NULL,
+    symbol      TEXT NOT NULL,
+    metric      TEXT NOT NULL,
+    op          TEXT NOT NULL,
+    threshold   REAL NOT NULL,
+    created_at  REAL NOT NULL,
+    fired_at    REAL,
+    fired_value REAL
+)
+"""
+_PENDING_INDEX = "CREATE INDEX IF NOT EXISTS alerts_pending ON alerts (user_id) WHERE fired_at IS NULL"
+
+
+@dataclass
+class Alert:
+    id: int
+    user_id: int
+    symbol: str
+    metric: str
+    op: str
+    threshold: float
+    created_at: float = 0.0
+    fired_at: float = None
+    fired_value: float = None
+
+    def describe(self):
+        label = "" if self.metric == "price" else "RSI "
+        value = f"${self.threshold:,.2f}" if self.metric == "price" else f"{self.threshold:g}"
+        return f"#{self.id} `{self.symbol}` {label}{self.op} {value}"
+
+
+def parse_condition(text):
+    """Parse ``"> 200"`` / ``"rsi<30"`` into ``(metric, op, threshold)``, or None."""
+    match = _CONDITION.match(text or "")
+    if not match:
+        return None
+    metric, op, threshold = match.groups()
+    return (metric or "price").lower(), op, float(threshold)
+
+
+class _Side:
+    # Thresholds kept sorted, with alert ids in a parallel list
+    __slots__ = ("thresholds", "ids")
+
+    def __init__(self):
+        self.thresholds = []
+        self.ids = []
+
+    def add(self, threshold, alert_id):
+        i = bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(i, threshold)
+        self.ids.insert(i, alert_id)
+
+    def remove(self, threshold, alert_id):
+        i = bisect_left(self.thresholds, threshold)
+        while i < len(self.ids) and self.thresholds[i] == threshold:
+            if self.ids[i] == alert_id:
+                del self.thresholds[i], self.ids[i]
+                return
+            i += 1
+
+    def pop_below(self, value):
+        # Every threshold strictly below value (alerts of the form "> threshold")
+        i = bisect_left(self.thresholds, value)
+        fired = self.ids[:i]
+        del self.thresholds[:i], self.ids[:i]
+        return fired
+
+    def pop_above(self, value):
+        # Every threshold strictly above value (alerts of the form "< threshold")
+        i = bisect_right(self.thresholds, value)
+        fired = self.ids[i:]
+        del self.thresholds[i:], self.ids[i:]
+        return fired
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class AlertIndex:
+    """Pending alerts indexed by (symbol, metric) in sorted threshold lists.
+
+    Checking a new value is a binary search on each side plus the alerts that
+    actually crossed; alerts that did not fire are never looked at.
+    """
+
+    def __init__(self):
+        self.alerts = {}  # id -> Alert
+        self._sides = {}  # (symbol, metric, op) -> _Side
+
+    def add(self, alert):
+        self.alerts[alert.id] = alert
+        key = (alert.symbol, alert.metric, alert.op)
+        side = self._sides.get(key)
+        if side is None:
+            side = self._sides[key] = _Side()
+        side.add(alert.threshold, alert.id)
+
+    def remove(self, alert_id):
+        alert = self.alerts.pop(alert_id, None)
+        if alert is None:
+            return None
+        key = (alert.symbol, alert.metric, alert.op)
+        side = self._sides[key]
+        side.remove(alert.threshold, alert.id)
+        if not side:
+            del self._sides[key]
+        return alert
+
+    def match(self, symbol, metric, value):
+        """Remove and return every alert on ``symbol``/``metric`` crossed by ``value``."""
+        fired = []
+        above = self._sides.get((symbol, metric, ">"))
+        if above:
+            fired += above.pop_below(value)
+            if not above:
+                del self._sides[(symbol, metric, ">")]
+        below = self._sides.get((symbol, metric, "<"))
+        if below:
+            fired += below.pop_above(value)
+            if not below:
+                del self._sides[(symbol, metric, "<")]
+        return [self.alerts.pop(alert_id) for alert_id in fired]
+
+    def symbols(self, metric):
+        return {symbol for symbol, m, _ in self._sides if m == metric}
+
+    def __len__(self):
+        return len(self.alerts)
+
+
+class AlertEngine:
+    """Persists alerts in SQLite and checks them from one polling task.
+
+    Each tick fetches every symbol with pending alerts once, no matter how
+    many alerts are on it, and calls ``notify(alert)`` for the ones that fire.
+    Prices are fetched ``batch_size`` symbols per request, ``batches`` at a
+    time, each batch with its own timeout, so a slow or failing batch only
+    delays its own alerts until the next tick.
+
+    The database is the source of truth, so several bot processes can share
+    it: any of them adds, lists and removes alerts, and the one running the
+    polling task picks the changes up at the start of every check. An alert
+    only notifies if this process is the one that marks it fired.
+    """
+
+    def __init__(self, path, notify, interval_open=60, interval_closed=900,
+                 max_per_user=25, concurrency=8, batch_size=10, batches=2, batch_timeout=30):
+        self.path = path
+        self.notify = notify
+        self.interval_open = interval_open
+        self.interval_closed = interval_closed
+        self.max_per_user = max_per_user
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.batches = batches
+        self.batch_timeout = batch_timeout
+        self.index = AlertIndex()
+        self._task = None
+        self._last_id = 0  # highest pending alert id loaded into the index
+        self._version = None  # PRAGMA data_version at the last sync
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute(_PENDING_INDEX)
+
+    def import_db(self, path):
+        """Copy the pending alerts of another alerts database (new ids), then set it aside."""
+        with self._conn:
+            self._conn.execute("ATTACH DATABASE ? AS old", (path,))
+        try:
+            with self._conn:
+                count = self._conn.execute(
+                    "INSERT INTO alerts (user_id, symbol, metric, op, threshold, created_at) "
+                    "SELECT user_id, symbol, metric, op, threshold, created_at "
+                    "FROM old.alerts WHERE fired_at IS NULL"
+                ).rowcount
+        finally:
+            self._conn.execute("DETACH DATABASE old")
+        os.replace(path, path + ".imported")
+        logging.info(f"[alerts] Imported {count} pending alerts from {path}")
+
+    def sync(self):
+        """Bring the index in line with the pending alerts in the database.
+
+        Ids only grow, so new alerts are the rows past the last id loaded.
+        Alerts removed by another process are looked for only when the
+        database was written by another connection since the last sync.
+        """
+        rows = self._conn.execute(
+            "SELECT id, user_id, symbol, metric, op, threshold, created_at "
+            "FROM alerts WHERE id > ? AND fired_at IS NULL", (self._last_id,)
+        ).fetchall()
+        for row in rows:
+            self.index.add(Alert(*row))
+            self._last_id = max(self._last_id, row[0])
+
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            self._version = version
+            pending = {row[0] for row in self._conn.execute("SELECT id FROM alerts WHERE fired_at IS NULL")}
+            for alert_id in [i for i in self.index.alerts if i not in pending]:
+                self.index.remove(alert_id)
+
+    def pending(self, user_id):
+        rows = self._conn.execute(
+            "SELECT id, user_id, symbol, metric, op, threshold, created_at "
+            "FROM alerts WHERE user_id = ? AND fired_at IS NULL ORDER BY id", (user_id,)
+        ).fetchall()
+        return [Alert(*row) for row in rows]
+
+    def add(self, user_id, symbol, metric, op, threshold):
+        now = time.time()
+        with self._conn:
+            # One statement, so the limit holds with other processes adding too
+            cursor = self._conn.execute(
+                "INSERT INTO alerts (user_id, symbol, metric, op, threshold, created_at) "
+                "SELECT ?, ?, ?, ?, ?, ? "
+                "WHERE (SELECT COUNT(*) FROM alerts WHERE user_id = ? AND fired_at IS NULL) < ?",
+                (user_id, symbol, metric, op, threshold, now, user_id, self.max_per_user),
+            )
+        if cursor.rowcount != 1:
+            return None
+        return Alert(cursor.lastrowid, user_id, symbol, metric, op, threshold, now)
+
+    def remove(self, user_id, alert_id):
+        with self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM alerts WHERE id = ? AND user_id = ? AND fired_at IS NULL", (alert_id, user_id)
+            )
+        if cursor.rowcount != 1:
+            return False
+        self.index.remove(alert_id)
+        return True
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _rsi(self, symbol, limiter):
+        async with limiter:
+            hist = await market_data.get_daily_history(symbol)
+        return indicators.rsi(hist["Close"].dropna().to_numpy())
+
+    async def _prices(self, batch, limiter):
+        # A batch that times out keeps loading in the background (the quote
+        # cache shields it), so its prices are there for the next tick
+        async with limiter:
+            return await asyncio.wait_for(market_data.get_prices(batch), self.batch_timeout)
+
+    async def check(self):
+        self.sync()
+        values = {}
+        price_symbols = sorted(self.index.symbols("price"))
+        if price_symbols:
+            limiter = asyncio.Semaphore(self.batches)
+            batches = [
+                price_symbols[i:i + self.batch_size] for i in range(0, len(price_symbols), self.batch_size)
+            ]
+            results = await asyncio.gather(
+                *(self._prices(batch, limiter) for batch in batches), return_exceptions=True
+            )
+            for batch, prices in zip(batches, results):
+                if isinstance(prices, Exception):
+                    error = str(prices) or type(prices).__name__
+                    logging.warning(f"[alerts] Prices for {batch[0]}..{batch[-1]} ({len(batch)}) failed: {error}")
+                    continue
+                values.update(((s, "price"), p) for s, p in prices.items())
+
+        rsi_symbols = sorted(self.index.symbols("rsi"))
+        if rsi_symbols:
+            limiter = asyncio.Semaphore(self.concurrency)
+            results = await asyncio.gather(
+                *(self._rsi(s, limiter) for s in rsi_symbols), return_exceptions=True
+            )
+            failed = []
+            for symbol, value in zip(rsi_symbols, results):
+                if isinstance(value, Exception):
+                    failed.append((symbol, value))
+                    continue
+                values[(symbol, "rsi")] = value
+            if failed:
+                symbol, error = failed[0]
+                logging.warning(f"[alerts] RSI failed for {len(failed)}/{len(rsi_symbols)} symbols ({symbol}: {error})")
+
+        fired = []
+        now = time.time()
+        for (symbol, metric), value in values.items():
+            if value is None:
+                continue
+            for alert in self.index.match(symbol, metric, value):
+                alert.fired_at = now
+                alert.fired_value = value
+                fired.append(alert)
+
+        if fired:
+            # Claim each alert before notifying: one removed since the sync
+            # (or fired elsewhere) no longer matches and is skipped
+            claimed = []
+            with self._conn:
+                for alert in fired:
+                    cursor = self._conn.execute(
+                        "UPDATE alerts SET fired_at = ?, fired_value = ? WHERE id = ? AND fired_at IS NULL",
+                        (alert.fired_at, alert.fired_value, alert.id),
+                    )
+                    if cursor.rowcount == 1:
+                        claimed.append(alert)
+            fired = claimed
+            for alert in fired:
+                try:
+                    await self.notify(alert)
+                except Exception as e:
+                    logging.warning(f"[alerts] Could not notify user {alert.user_id}: {e}")
+        return fired
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                logging.warning(f"[alerts] Check failed: {e}")
+            open_now = market_data.is_market_open()
+            await asyncio.sleep(self.interval_open if open_now else self.interval_closed)
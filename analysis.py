@@ -0,0 +1,192 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import indicators
+
+# CPU-bound analysis (indicator maths, scoring, message building) runs in a
+# small process pool once the input is long enough to hold up the event loop.
+# Fetching stays in market_data; only the numbers cross the process boundary.
+#
+# The pool uses fork and is started once from the main process before the bot
+# connects (start()), so workers inherit numpy and this module already
+# imported instead of re-importing the bot script as spawn/forkserver would.
+# Nothing forks lazily: submitting before start() is an error. Nothing forks
+# again either: once the bot is running, a fork would copy a process whose
+# market-data and discord threads hold locks, so if a worker dies the pool is
+# dropped and the rest of the process's life runs analysis on a thread.
+
+MAX_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(min(2, os.cpu_count() or 1))))
+DEFAULT_TIMEOUT = float(os.getenv("ANALYSIS_TIMEOUT", "10"))
+START_TIMEOUT = float(os.getenv("ANALYSIS_START_TIMEOUT", "30"))
+# A round trip to the pool costs the event loop ~0.3 ms of its own (pickling,
+# pipe I/O, wake-ups), more than the whole analysis of a year of closes
+# (~0.06 ms), so short series are analysed inline and only longer ones are sent
+# to the pool. Measured crossover is a few thousand points.
+INLINE_MAX_POINTS = int(os.getenv("ANALYSIS_INLINE_MAX_POINTS", "4000"))
+
+_executor = None
+_broken = False  # a worker died; submit() runs on a thread from then on
+
+
+# ----- Worker side -----
+
+def _warm():
+    # Pool initializer: touch the numpy code paths once so the first real
+    # request does not pay for it
+    indicators.compute(np.linspace(1.0, 2.0, 260))
+
+
+def _ping():
+    return os.getpid()
+
+
+def _action_report(close, symbol, recommendation):
+    return action_message(symbol, indicators.compute(close), recommendation)
+
+
+def action_message(symbol, values, recommendation, price_label="Current Price"):
+    """Build the ``!action`` message from indicators.compute-style ``values``.
+
+    ``price_label`` names ``values["price"]``, e.g. "Last Close" when it comes
+    from the nightly digest rather than a live quote.
+    """
+    current_price = values["price"]
+    if current_price is None:
+        return f"⚠️ Not enough data to analyze `{symbol}`."
+
+    latest_rsi = values["rsi"]
+    if latest_rsi is None:
+        return f"⚠️ Not enough RSI data for `{symbol}`."
+
+    ma_50 = values["ma_fast"]
+    ma_200 = values["ma_slow"]
+    if ma_50 is None or ma_200 is None:
+        return f"⚠️ Not enough data for moving averages on `{symbol}`."
+
+    # Score
+    score = 0
+    reasons = []
+
+    # Price confirms trend
+    if current_price > ma_50 and ma_50 > ma_200:
+        score += 1
+        reasons.append("🟢 Price > 50-day > 200-day → Confirmed uptrend")
+    elif current_price < ma_50 and ma_50 < ma_200:
+        score -= 1
+        reasons.append("🔴 Price < 50-day < 200-day → Confirmed downtrend")
+    else:
+        reasons.append("🔁 Price and MAs not aligned (neutral trend)")
+
+    # RSI
+    if latest_rsi < 30:
+        score += 1
+        reasons.append(f"📉 RSI {latest_rsi:.2f} < 30 → Oversold")
+    elif latest_rsi > 70:
+        score -= 1
+        reasons.append(f"📈 RSI {latest_rsi:.2f} > 70 → Overbought")
+    else:
+        reasons.append(f"🔁 RSI {latest_rsi:.2f} → Neutral")
+
+    # Analyst recommendation
+    if recommendation in ["buy", "strong buy"]:
+        score += 1
+        reasons.append(f"✅ Analyst rating: {recommendation.title()}")
+    elif recommendation in ["sell", "strong sell"]:
+        score -= 1
+        reasons.append(f"⚠️ Analyst rating: {recommendation.title()}")
+    else:
+        reasons.append(f"❔ Analyst rating: {recommendation.title()}")
+
+    # Final verdict based on score
+    if score >= 3:
+        verdict = "🟢 Recommendation: **BUY**"
+    elif score == 2:
+        verdict = "🔵 Recommendation: **WATCH TO BUY**"
+    elif score == -1:
+        verdict = "🟠 Recommendation: **WATCH TO SELL**"
+    elif score <= -2:
+        verdict = "🔴 Recommendation: **SELL**"
+    else:
+        verdict = "🟡 Recommendation: **HOLD / WAIT**"
+
+    return (
+        f"🤔 **Should You Buy `{symbol}`?**\n"
+        f"💲 {price_label}: `${current_price:,.2f}`\n\n"
+        + "\n".join(reasons)
+        + f"\n\n{verdict}"
+        + "\n⚠️ This is not financial advice. Use your own judgment or consult a professional."
+    )
+
+
+# ----- Main-process side -----
+
+def start():
+    """Fork and warm up the worker processes; call before the bot connects."""
+    global _executor, _broken
+    if _executor is not None:
+        return _executor
+    _broken = False
+    _executor = ProcessPoolExecutor(
+        max_workers=MAX_WORKERS,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_warm,
+    )
+    pids = {f.result(timeout=START_TIMEOUT) for f in [_executor.submit(_ping) for _ in range(MAX_WORKERS)]}
+    logging.info(f"[analysis] {len(pids)} worker process(es) ready")
+    return _executor
+
+
+def stop():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+_broken = False  # a worker died; submit() runs on a thread from then on
+
+
+async def run(func, close, *args, timeout=DEFAULT_TIMEOUT):
+    """Await ``func(close, *args)`` on the pool; ``close`` is a 1-D float array.
+
+    Series of up to INLINE_MAX_POINTS (every daily history the bot keeps) are
+    run inline, which is cheaper; longer ones are pickled to the pool.
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    if close.size <= INLINE_MAX_POINTS:
+        return func(close, *args)
+    return await submit(func, close, *args, timeout=timeout)
+
+
+async def submit(func, *args, timeout=DEFAULT_TIMEOUT):
+    """Await ``func(*args)`` on the pool, whatever the size of the input.
+
+    Raises RuntimeError if start() was not called. After a worker has died
+    the call runs on a thread instead (see the note at the top).
+    """
+    global _broken
+    if _broken:
+        return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout)
+    executor = _executor
+    if executor is None:
+        raise RuntimeError("analysis pool not started; call analysis.start() before the bot runs")
+    try:
+        future = executor.submit(func, *args)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except BrokenProcessPool:
+        # A worker died (OOM, signal). Fail this call and stop using the pool;
+        # restart the bot to get worker processes back.
+        if not _broken:
+            logging.warning("[analysis] Worker pool broke; running analysis on a thread from now on")
+            _broken = True
+            stop()
+        raise
+
+
+async def action_report(symbol, close, recommendation):
+    """The ``!action`` message for ``symbol`` from its daily closes (oldest first)."""
+    return await run(_action_report, close, symbol, recommendation)
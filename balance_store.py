@@ -0,0 +1,119 @@
+import os
+import json
+import sqlite3
+import asyncio
+import logging
+
+
+class BalanceStore:
+    """Dict-like ``user_id -> number`` store persisted to SQLite with write-behind.
+
+    Reads and writes hit an in-memory dict; changed keys are remembered and
+    written in one transaction every ``flush_interval`` seconds (and on
+    ``close()``), so a flush costs O(changed users), not O(all users). The
+    database runs in WAL mode: every flush commits atomically and an
+    interrupted one is rolled back when the file is next opened.
+    """
+
+    def __init__(self, path, table="balances", flush_interval=5.0, legacy_json=None):
+        self.path = path
+        self.table = table
+        self.flush_interval = flush_interval
+        self._values = {}
+        self._dirty = set()
+        self._task = None
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (user_id INTEGER PRIMARY KEY, value NOT NULL)"
+        )
+        self._values = dict(self._conn.execute(f"SELECT user_id, value FROM {table}"))
+        if legacy_json and not self._values:
+            self._import_json(legacy_json)
+
+    def _import_json(self, path):
+        # One-off migration from the old "rewrite the whole file" JSON storage
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            data = json.load(f)
+        for user_id, value in data.items():
+            self[int(user_id)] = value
+        self.flush()
+        os.replace(path, path + ".migrated")
+        logging.info(f"[balances] Imported {len(data)} entries from {path}")
+
+    # ----- dict interface -----
+
+    def __getitem__(self, user_id):
+        return self._values[user_id]
+
+    def __setitem__(self, user_id, value):
+        self._values[user_id] = value
+        self._dirty.add(user_id)
+
+    def __delitem__(self, user_id):
+        del self._values[user_id]
+        self._dirty.add(user_id)
+
+    def __contains__(self, user_id):
+        return user_id in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def get(self, user_id, default=None):
+        return self._values.get(user_id, default)
+
+    def items(self):
+        return self._values.items()
+
+    def add(self, user_id, delta):
+        """Add ``delta`` to the balance (missing users start at 0) and return the new value."""
+        value = self._values.get(user_id, 0) + delta
+        self[user_id] = value
+        return value
+
+    # ----- persistence -----
+
+    def flush(self):
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        upserts = [(k, self._values[k]) for k in dirty if k in self._values]
+        deletes = [(k,) for k in dirty if k not in self._values]
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT INTO {self.table} (user_id, value) VALUES (?, ?) "
+                    f"ON CONFLICT(user_id) DO UPDATE SET value = excluded.value",
+                    upserts,
+                )
+                self._conn.executemany(f"DELETE FROM {self.table} WHERE user_id = ?", deletes)
+        except sqlite3.Error:
+            self._dirty |= dirty  # try again next time
+            raise
+        return len(dirty)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logging.warning(f"[balances] Flush of {self.path} failed: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.flush()
+        self._conn.close()
@@ -0,0 +1,92 @@
+"""Replay a synthetic message stream through ytbot's on_message.
+
+Compares the current pre-dispatch filter with the old pipeline (which ran
+bot.process_commands on every message before looking at it) and reports
+messages/sec handled on one core.
+
+    python bench/dispatch.py [messages]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# bench/ before the repo root would shadow ledger.py with bench/ledger.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeUser, FakeChannel, FakeGuild, FakeMessage, attach
+
+# Share of the stream by message kind
+MIX = {
+    "bot": 0.15,          # other bots / webhooks
+    "chat": 0.50,         # ordinary chat, no prefix
+    "stock_chat": 0.30,   # chat in stock-chat (earns coins)
+    "command": 0.05,      # prefixed: real, wrong-channel and unknown commands
+}
+COMMANDS = ["!balance", "!rules", "!leaderboard", "!nosuchcommand", "!rank"]
+
+
+def build_stream(ytbot, n, seed=1):
+    rng = random.Random(seed)
+    channels = [FakeChannel(id=cid, name=name) for name, cid in ytbot.CHANNELS.items()]
+    general = FakeChannel(name="general")
+    FakeGuild(channels=channels + [general])
+    stock_chat = next(c for c in channels if c.id == ytbot.CHANNELS["stock_chat"])
+    users = [FakeUser() for _ in range(500)]
+    bots = [FakeUser(bot=True) for _ in range(5)]
+
+    kinds, weights = zip(*MIX.items())
+    stream = []
+    for kind in rng.choices(kinds, weights, k=n):
+        if kind == "bot":
+            stream.append(FakeMessage("beep boop market update", rng.choice(bots), general))
+        elif kind == "chat":
+            stream.append(FakeMessage("anyone watching NVDA today?", rng.choice(users), general))
+        elif kind == "stock_chat":
+            stream.append(FakeMessage("SPY looking strong", rng.choice(users), stock_chat))
+        else:
+            stream.append(FakeMessage(rng.choice(COMMANDS), rng.choice(users), rng.choice(channels)))
+    return stream
+
+
+async def replay(handler, stream):
+    started_cpu = time.process_time()
+    started = time.perf_counter()
+    for i, message in enumerate(stream):
+        await handler(message)
+        if i % 1000 == 0:
+            await asyncio.sleep(0)  # let dispatched events (errors, completions) run
+    await asyncio.sleep(0)
+    return time.perf_counter() - started, time.process_time() - started_cpu
+
+
+async def main(n=200_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import logging
+        import ytbot
+        logging.disable(logging.INFO)
+        attach(ytbot.bot)
+
+        async def old_on_message(message):
+            await ytbot.bot.process_commands(message)
+            if message.author.bot:
+                return
+            if message.channel.id == ytbot.CHANNELS["stock_chat"]:
+                ytbot.economy.credit(message.author.id, 1)
+                ytbot.log_chat_reward(message.author.id)
+
+        stream = build_stream(ytbot, n)
+        for name, handler in (("old", old_on_message), ("filtered", ytbot.on_message)):
+            await replay(handler, stream[:2000])  # warm-up
+            wall, cpu = await replay(handler, stream)
+            print(f"{name:9} {n} messages  {n / wall:10.0f} msg/s wall  {n / cpu:10.0f} msg/s per core")
+        os.chdir(ROOT)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(a) for a in sys.argv[1:2])))
@@ -0,0 +1,108 @@
+"""Stand-ins for the discord.py objects a command handler touches.
+
+Enough of Message/Member/Channel/Guild for ``bot.process_commands`` and the
+real command dispatch to run without a gateway connection. Replies are
+recorded on the channel instead of being sent to Discord.
+"""
+import asyncio
+import itertools
+
+import discord
+from discord.ext import commands
+
+_ids = itertools.count(1_000_000)
+
+
+class FakePermissions:
+    def __init__(self, administrator=False):
+        self.administrator = administrator
+
+
+class FakeUser:
+    def __init__(self, id=None, name="user", bot=False, administrator=False):
+        self.id = id if id is not None else next(_ids)
+        self.name = name
+        self.display_name = name
+        self.nick = name
+        self.discriminator = "0"
+        self.bot = bot
+        self.avatar = None
+        self.guild_permissions = FakePermissions(administrator)
+        self.mention = f"<@{self.id}>"
+
+    async def add_roles(self, *roles):
+        pass
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class FakeChannel:
+    def __init__(self, id=None, name="general", guild=None):
+        self.id = id if id is not None else next(_ids)
+        self.name = name
+        self.guild = guild
+        self.sent = []
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, id=None, name="guild", channels=()):
+        self.id = id if id is not None else next(_ids)
+        self.name = name
+        self.member_count = 0
+        self.roles = []
+        self.text_channels = list(channels)
+        for channel in self.text_channels:
+            channel.guild = self
+
+    def get_channel(self, channel_id):
+        return discord.utils.get(self.text_channels, id=channel_id)
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage:
+    _state = None
+
+    def __init__(self, content, author, channel):
+        self.id = next(_ids)
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.attachments = []
+        self.mentions = []
+        self.role_mentions = []
+        self.channel_mentions = []
+        self.reference = None
+
+
+class RecordingContext(commands.Context):
+    """Context whose send() records the reply on the fake channel."""
+
+    async def send(self, content=None, **kwargs):
+        self.channel.sent.append((content, kwargs))
+
+    async def reply(self, content=None, **kwargs):
+        await self.send(content, **kwargs)
+
+
+def attach(bot, user_id=1):
+    """Prepare ``bot`` for offline dispatch.
+
+    Gives it a logged-in user and an event loop (normally set by ``login()``)
+    and makes ``get_context`` build RecordingContexts. Call from a coroutine.
+    """
+    bot.loop = asyncio.get_running_loop()
+    bot._connection.user = FakeUser(id=user_id, name="bot", bot=True)
+    get_context = bot.get_context
+
+    async def recording_get_context(origin, *, cls=RecordingContext):
+        return await get_context(origin, cls=cls)
+
+    bot.get_context = recording_get_context
+    return bot
@@ -0,0 +1,211 @@
+"""Offline stand-in for the parts of yfinance that market_data calls.
+
+``FixtureYF`` answers ``Ticker(symbol)`` (fast_info, info, history, news,
+recommendations) from a recorded fixture file, and makes
+up deterministic data for symbols that are not in it, so any symbol works.
+``install()`` swaps it in for market_data's ``yf``, so the real caches, pool,
+governor and history store all run; only the network is gone.
+
+Record a fixture from live Yahoo (needs network):
+
+    python bench/fixtures.py record AAPL MSFT NVDA TSLA SPY
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import datetime
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_PATH = os.path.join(HERE, "fixtures", "market.json")
+TZ = "America/New_York"
+DAYS = 400  # business days of synthetic history
+
+
+def _frame_to_json(frame):
+    return {
+        "index": [str(i) for i in frame.index],
+        "columns": {c: [None if pd.isna(v) else v for v in frame[c].tolist()] for c in frame.columns},
+    }
+
+
+def _frame_from_json(data):
+    frame = pd.DataFrame(data["columns"])
+    frame.index = pd.to_datetime(data["index"], utc=True).tz_convert(TZ)
+    return frame
+
+
+class FixtureTicker:
+    def __init__(self, market, symbol):
+        self.market = market
+        self.symbol = symbol
+
+    def _data(self):
+        # Every attribute access is one request in the real client
+        self.market.sleep()
+        return self.market.symbol_data(self.symbol)
+
+    @property
+    def fast_info(self):
+        return {"lastPrice": float(self._data()["history"]["Close"].iloc[-1])}
+
+    @property
+    def info(self):
+        return dict(self._data()["info"])
+
+    @property
+    def news(self):
+        return list(self._data()["news"])
+
+    @property
+    def recommendations(self):
+        return self._data()["recommendations"].copy()
+
+    def history(self, period=None, interval="1d", start=None, **kwargs):
+        frame = self._data()["history"]
+        if start is not None:
+            frame = frame[frame.index >= pd.Timestamp(start).tz_localize(TZ)]
+        elif period and period.endswith("d"):
+            frame = frame.iloc[-int(period[:-1]):]
+        elif period and period.endswith("mo"):
+            frame = frame.iloc[-21 * int(period[:-2]):]
+        elif period and period.endswith("y"):
+            frame = frame.iloc[-252 * int(period[:-1]):]
+        return frame.copy()
+
+
+class FixtureYF:
+    """Drop-in for the ``yf`` module as market_data uses it.
+
+    ``latency`` seconds are slept per call (on the market-data worker thread)
+    to stand in for the round trip to Yahoo.
+    """
+
+    def __init__(self, path=FIXTURE_PATH, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._symbols = {}
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                recorded = json.load(f)
+            for symbol, data in recorded["symbols"].items():
+                self._symbols[symbol] = {
+                    "info": data["info"],
+                    "history": _frame_from_json(data["history"]),
+                    "news": data["news"],
+                    "recommendations": pd.DataFrame(data["recommendations"]),
+                }
+
+    def sleep(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def symbol_data(self, symbol):
+        data = self._symbols.get(symbol)
+        if data is None:
+            data = self._symbols[symbol] = self._synthetic(symbol)
+        return data
+
+    def _synthetic(self, symbol):
+        # Seeded by the symbol, so every run sees the same numbers
+        rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+        end = pd.Timestamp(datetime.date.today(), tz=TZ)
+        index = pd.bdate_range(end=end, periods=DAYS, tz=TZ)
+        close = 50 + rng.uniform(0, 400) * np.exp(np.cumsum(rng.normal(0, 0.015, DAYS)))
+        spread = close * rng.uniform(0.002, 0.02, DAYS)
+        history = pd.DataFrame({
+            "Open": close - spread / 2,
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.integers(1_000_000, 50_000_000, DAYS).astype(float),
+        }, index=index)
+        info = {
+            "shortName": f"{symbol} Holdings Inc.",
+            "longBusinessSummary": f"{symbol} makes things. " * 40,
+            "sector": "Technology",
+            "currency": "USD",
+            "marketCap": int(close[-1] * 1e9),
+            "volume": int(history["Volume"].iloc[-1]),
+            "averageVolume": int(history["Volume"].mean()),
+            "trailingPE": round(float(rng.uniform(5, 60)), 2),
+            "dividendYield": round(float(rng.uniform(0, 3)), 2),
+            "fiftyTwoWeekHigh": float(close[-252:].max()),
+            "fiftyTwoWeekLow": float(close[-252:].min()),
+            "recommendationKey": ["strong_buy", "buy", "hold", "sell"][int(rng.integers(0, 4))],
+            "recommendationMean": round(float(rng.uniform(1, 5)), 2),
+        }
+        # Both shapes yfinance has used (flat, then nested under "content"),
+        # with the last story syndicated twice
+        news = [
+            {
+                "title": f"{symbol} headline {i}",
+                "link": f"https://example.com/{symbol.lower()}/{i}",
+                "publisher": "Fixture Wire",
+                "providerPublishTime": int(time.time()) - 3600 * i,
+            }
+            if i % 2 else
+            {
+                "id": f"{symbol}-{i}",
+                "content": {
+                    "title": f"{symbol} headline {i}",
+                    "canonicalUrl": {"url": f"https://example.com/{symbol.lower()}/{i}"},
+                    "provider": {"displayName": "Fixture Wire"},
+                    "pubDate": datetime.datetime.fromtimestamp(
+                        time.time() - 3600 * i, datetime.timezone.utc
+                    ).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                },
+            }
+            for i in range(8)
+        ]
+        news.append(dict(news[-1], title=f"{symbol} headline 7 (syndicated)"))
+        recommendations = pd.DataFrame({
+            "period": ["0m", "-1m", "-2m", "-3m"],
+            "strongBuy": rng.integers(0, 10, 4),
+            "buy": rng.integers(0, 20, 4),
+            "hold": rng.integers(0, 20, 4),
+            "sell": rng.integers(0, 5, 4),
+            "strongSell": rng.integers(0, 3, 4),
+        })
+        return {"info": info, "history": history, "news": news, "recommendations": recommendations}
+
+    def Ticker(self, symbol):
+        return FixtureTicker(self, symbol)
+
+
+def install(market_data, fixture=None):
+    """Point ``market_data`` at ``fixture`` (a FixtureYF) and return it."""
+    fixture = fixture or FixtureYF()
+    market_data.yf = fixture
+    return fixture
+
+
+def record(symbols, path=FIXTURE_PATH):
+    import yfinance as yf
+
+    recorded = {"recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(), "symbols": {}}
+    for symbol in symbols:
+        ticker = yf.Ticker(symbol)
+        recommendations = ticker.recommendations
+        recorded["symbols"][symbol] = {
+            "info": ticker.info,
+            "history": _frame_to_json(ticker.history(period="2y", interval="1d")),
+            "news": ticker.news,
+            "recommendations": [] if recommendations is None else recommendations.to_dict("records"),
+        }
+        print(f"recorded {symbol}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(recorded, f, default=str)
+    print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "record":
+        sys.exit(__doc__)
+    record([s.upper() for s in sys.argv[2:]])
@@ -0,0 +1,85 @@
+"""Compare startup time and memory of keep_alive.py (threaded Flask) with health.py.
+
+Each mode runs in a fresh interpreter that first imports discord.py, like a bot
+would, then starts its web server and polls it until it answers. Reports the
+time to first 200 and the RSS/thread growth caused by the server.
+
+    python bench/health_server.py
+"""
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import os, sys, json, time, asyncio, threading, urllib.request
+sys.path.insert(0, ROOT)
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+import discord
+from discord.ext import commands
+bot = commands.Bot(command_prefix="!", intents=discord.Intents.default())
+base_rss, base_threads = rss_kb(), threading.active_count()
+
+def wait_ok(port):
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as r:
+                if r.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.005)
+
+started = time.perf_counter()
+if MODE == "flask":
+    import keep_alive
+    keep_alive.app.config["ENV"] = "production"
+    threading.Thread(target=lambda: keep_alive.app.run(host="127.0.0.1", port=PORT), daemon=True).start()
+    wait_ok(PORT)
+    elapsed = time.perf_counter() - started
+else:
+    from health import HealthServer
+    async def main():
+        server = HealthServer(bot, host="127.0.0.1", port=PORT)
+        await server.start()
+        await asyncio.to_thread(wait_ok, PORT)
+        return time.perf_counter() - started
+    elapsed = asyncio.run(main())
+
+print(json.dumps({
+    "startup_ms": elapsed * 1000,
+    "rss_delta_kb": rss_kb() - base_rss,
+    "extra_threads": threading.active_count() - base_threads,
+}))
+os._exit(0)
+"""
+
+
+def run(mode, port):
+    code = f"ROOT = {ROOT!r}\nMODE = {mode!r}\nPORT = {port}\n" + CHILD
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, timeout=60
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(runs=5):
+    for mode, port in (("flask", 18080), ("aiohttp", 18081)):
+        results = [run(mode, port) for _ in range(runs)]
+        avg = {k: sum(r[k] for r in results) / runs for k in results[0]}
+        print(
+            f"{mode:8} startup {avg['startup_ms']:7.1f} ms   "
+            f"RSS +{avg['rss_delta_kb'] / 1024:5.1f} MiB   "
+            f"threads +{avg['extra_threads']:.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
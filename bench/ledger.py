@@ -0,0 +1,78 @@
+"""Concurrent purchase benchmark for ledger.Ledger.
+
+Fires thousands of concurrent purchases at a small set of users, each with a
+simulated Discord API await in the middle, and checks the final balances. The
+old read-check-await-subtract pattern is run alongside for comparison.
+
+    python bench/ledger.py [purchases] [users]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from balance_store import BalanceStore
+from ledger import Ledger, InsufficientFunds
+
+START_BALANCE = 1000
+PRICE = 100
+
+
+async def api_call():
+    # Stand-in for interaction.response.send_message / add_roles
+    await asyncio.sleep(random.random() * 0.002)
+
+
+async def naive_buy(store, user_id):
+    balance = store.get(user_id, 0)
+    if balance < PRICE:
+        return False
+    await api_call()
+    store[user_id] = balance - PRICE
+    return True
+
+
+async def ledger_buy(ledger, user_id):
+    try:
+        async with ledger.purchase(user_id, PRICE):
+            await api_call()
+    except InsufficientFunds:
+        return False
+    return True
+
+
+async def run(name, buy, target, store, purchases, users):
+    for user_id in range(users):
+        store[user_id] = START_BALANCE
+    started = time.perf_counter()
+    results = await asyncio.gather(*(buy(target, i % users) for i in range(purchases)))
+    elapsed = time.perf_counter() - started
+
+    sold = sum(results)
+    spent = sum(START_BALANCE - store[u] for u in range(users))
+    overdrawn = sum(1 for u in range(users) if store[u] < 0)
+    lost = sold * PRICE - spent
+    print(
+        f"{name:7} {purchases} purchases in {elapsed * 1000:7.1f} ms "
+        f"({purchases / elapsed:8.0f}/s)  sold {sold:5}  "
+        f"lost updates {lost // PRICE:5}  overdrawn users {overdrawn}"
+    )
+
+
+async def main(purchases=5000, users=50):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BalanceStore(os.path.join(tmp, "bench.db"))
+        await run("naive", naive_buy, store, store, purchases, users)
+        await run("ledger", ledger_buy, Ledger(store), store, purchases, users)
+        store.close()
+    print(f"(each user can afford exactly {START_BALANCE // PRICE} purchases: "
+          f"expected sold = {users * (START_BALANCE // PRICE)})")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(main(*args))
@@ -0,0 +1,327 @@
+"""Replay synthetic commands through the bots' real command dispatch, offline.
+
+    python bench/replay.py [--bot all|stockbot2|kingbot|ytbot] [--commands 5000]
+                           [--concurrency 50] [--latency 0.05] [--cold] [--service]
+                           [--json results.json] [--baseline old.json]
+
+Each bot module is imported unchanged (from a scratch directory, so its data
+files land there) and handed fake messages through ``bot.on_message``, the
+coroutine the gateway would dispatch them to. Replies are recorded instead of
+sent (fakes.py) and Yahoo is replaced by the fixture stand-in (fixtures.py),
+so the caches, market-data pool, governor and history store all run for real.
+
+Per command it reports failures, p50/p95/p99 latency and, from a separate
+tracemalloc pass, the peak memory allocated while handling one command and
+the memory still held afterwards. --json saves the numbers; --baseline
+prints the change against a previous run.
+
+Differences from production: cooldowns are switched off and the governor is
+unlimited (so the numbers measure the code, not the limits), and upstream
+latency is whatever --latency says.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+# bench/ after the repo root: bench/ledger.py would otherwise shadow ledger.py
+sys.path.insert(0, HERE)
+sys.path.insert(0, ROOT)
+
+from discord.ext import commands
+
+from fakes import FakeUser, FakeChannel, FakeGuild, FakeMessage, attach
+import fixtures
+
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "SPY", "QQQ", "AMD",
+           "NFLX", "INTC", "ORCL", "CRM", "ADBE", "PYPL", "UBER", "SHOP", "COIN", "PLTR"]
+
+# (label, message template, channel key or None for any channel)
+SCENARIOS = {
+    "stockbot2": [
+        ("price", "!price {s}", None),
+        ("price x3", "!price {s} {s2} {s3}", None),
+        ("watchlist", "!watchlist", None),
+        ("watch add", "!watch add {s}", None),
+        ("watch list", "!watch list", None),
+        ("alert", "!alert {s} > 100000", None),
+        ("alert list", "!alert list", None),
+        ("info", "!info {s}", None),
+        ("volume", "!volume {s}", None),
+        ("rating", "!rating {s}", None),
+        ("rsi", "!rsi {s}", None),
+        ("summary", "!summary {s}", None),
+        ("movingavg", "!movingavg {s}", None),
+        ("news", "!news {s}", None),
+        ("action", "!action {s}", None),
+        ("spark", "!spark {s}", None),
+        ("chart", "!chart {s}", None),
+        ("help", "!help", None),
+    ],
+    "kingbot": [
+        ("stocks price", "!stocks price {s}", "STOCKBOT_CHANNEL"),
+        ("stocks summary", "!stocks summary {s}", "STOCKBOT_CHANNEL"),
+        ("stocks stats", "!stocks stats {s}", "STOCKBOT_CHANNEL"),
+        ("stocks history", "!stocks history {s} 5", "STOCKBOT_CHANNEL"),
+        ("stocks news", "!stocks news {s}", "STOCKBOT_CHANNEL"),
+        ("games guess", "!games guess 7", "DAILY_REWARD_CHANNEL"),
+        ("balance", "!balance", None),
+        ("leaderboard", "!leaderboard", None),
+        ("rank", "!rank", None),
+        ("store", "!store", None),
+        ("submitmeme", "!submitmeme https://example.com/{n}.jpg", "MEMES_CHANNEL"),
+        ("again", "!again", "MEMES_CHANNEL"),
+        ("wrong channel", "!stocks price {s}", None),
+    ],
+    "ytbot": [
+        ("rules", "!rules", "rules"),
+        ("moreinfo", "!moreinfo {s}", "stock_info"),
+        ("daily", "!daily", "discord_store"),
+        ("balance", "!balance", None),
+        ("leaderboard", "!leaderboard", None),
+        ("rank", "!rank", None),
+        ("logtrade", "!logtrade bought {s}", "trade_bot"),
+        ("buy", "!buy vip", None),
+        ("wrong channel", "!rules", None),
+    ],
+}
+
+# Replies that start like this are the handlers' "couldn't do it" messages
+FAILURE_MARKERS = ("⚠️", "Could not", "Couldn’t")
+
+
+def make_guild(name, module):
+    """A fake guild with the channels ``name``'s router expects, keyed like SCENARIOS."""
+    if name == "kingbot":
+        keys = ["STOCKBOT_CHANNEL", "DAILY_REWARD_CHANNEL", "MEMES_CHANNEL",
+                "WELCOME_COMMITTEE_CHANNEL", "NEW_VIDEOS_CHANNEL", "ANNOUNCEMENTS_CHANNEL"]
+        channels = {key: FakeChannel(name=getattr(module, key)) for key in keys}
+    elif name == "ytbot":
+        channels = {key: FakeChannel(id=cid, name=key) for key, cid in module.CHANNELS.items()}
+    else:
+        channels = {}
+    channels[None] = FakeChannel(name="general")
+    FakeGuild(channels=list(channels.values()))
+    return channels
+
+
+def build_messages(name, channels, n, users, rng):
+    messages = []
+    scenarios = SCENARIOS[name]
+    for i in range(n):
+        label, template, key = scenarios[i % len(scenarios)]
+        s, s2, s3 = rng.sample(SYMBOLS, 3)
+        base = channels[key]
+        # A channel per message (same id) so each command's replies can be inspected
+        channel = FakeChannel(id=base.id, name=base.name, guild=base.guild)
+        content = template.format(s=s, s2=s2, s3=s3, n=i)
+        messages.append((label, FakeMessage(content, rng.choice(users), channel)))
+    rng.shuffle(messages)
+    return messages
+
+
+def disable_cooldowns(bot):
+    for command in bot.walk_commands():
+        command._buckets = commands.CooldownMapping(None, commands.BucketType.default)
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+async def drive(bot, messages, concurrency):
+    latencies = defaultdict(list)
+    failures = defaultdict(int)
+    errors = defaultdict(int)
+    labels = {message.id: label for label, message in messages}
+
+    async def count_error(ctx, error):
+        errors[labels.get(ctx.message.id)] += 1
+
+    bot.add_listener(count_error, "on_command_error")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(label, message):
+        async with semaphore:
+            started = time.perf_counter()
+            await bot.on_message(message)
+            latencies[label].append(time.perf_counter() - started)
+        if any(str(content).startswith(FAILURE_MARKERS) for content, _ in message.channel.sent):
+            failures[label] += 1
+        message.channel.sent.clear()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(label, message) for label, message in messages))
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.05)  # let dispatched on_command_error tasks run
+    bot.remove_listener(count_error, "on_command_error")
+    return elapsed, latencies, failures, errors
+
+
+async def measure_allocations(bot, messages, per_label=100):
+    by_label = defaultdict(list)
+    for label, message in messages:
+        if len(by_label[label]) < per_label:
+            by_label[label].append(message)
+
+    results = {}
+    tracemalloc.start()
+    try:
+        for label, batch in by_label.items():
+            gc.collect()
+            before = tracemalloc.get_traced_memory()[0]
+            peaks = []
+            for message in batch:
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                await bot.on_message(message)
+                peaks.append(tracemalloc.get_traced_memory()[1] - current)
+                message.channel.sent.clear()
+            await asyncio.sleep(0)
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0] - before
+            results[label] = {
+                "peak_kib": sum(peaks) / len(peaks) / 1024,
+                "retained_bytes": retained / len(batch),
+            }
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+async def run_bot(name, module, options, rng):
+    bot = module.bot
+    attach(bot)
+    disable_cooldowns(bot)
+    channels = make_guild(name, module)
+    users = [FakeUser(administrator=(i % 10 == 0)) for i in range(500)]
+
+    # Warm-up: one pass over every scenario fills the caches and the history store
+    warmup = build_messages(name, channels, len(SCENARIOS[name]) * 4, users, rng)
+    await drive(bot, warmup, options.concurrency)
+
+    messages = build_messages(name, channels, options.commands, users, rng)
+    elapsed, latencies, failures, errors = await drive(bot, messages, options.concurrency)
+    allocations = await measure_allocations(bot, build_messages(name, channels, options.commands, users, rng))
+
+    result = {"commands": len(messages), "seconds": elapsed, "throughput": len(messages) / elapsed, "by_command": {}}
+    for label, _, _ in SCENARIOS[name]:
+        ordered = sorted(latencies[label])
+        result["by_command"][label] = {
+            "n": len(ordered),
+            "errors": errors[label],
+            "failures": failures[label],
+            "p50_ms": percentile(ordered, 0.50) * 1e3,
+            "p95_ms": percentile(ordered, 0.95) * 1e3,
+            "p99_ms": percentile(ordered, 0.99) * 1e3,
+            **allocations.get(label, {}),
+        }
+    return result
+
+
+def report(name, result, baseline=None):
+    base = (baseline or {}).get(name)
+    change = ""
+    if base:
+        change = f"  ({(result['throughput'] / base['throughput'] - 1) * 100:+.1f}% vs baseline)"
+    print(f"\n{name}: {result['commands']} commands in {result['seconds']:.2f}s "
+          f"= {result['throughput']:,.0f} cmd/s{change}")
+    print(f"  {'command':16} {'n':>6} {'err':>5} {'fail':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          f" {'peak KiB':>9} {'kept B':>8}" + ("  p99 vs base" if base else ""))
+    for label, row in result["by_command"].items():
+        line = (f"  {label:16} {row['n']:>6} {row['errors']:>5} {row['failures']:>5} {row['p50_ms']:>8.3f}"
+                f" {row['p95_ms']:>8.3f} {row['p99_ms']:>8.3f} {row.get('peak_kib', 0):>9.1f}"
+                f" {row.get('retained_bytes', 0):>8.0f}")
+        old = base and base["by_command"].get(label)
+        if old and old["p99_ms"]:
+            line += f"  {(row['p99_ms'] / old['p99_ms'] - 1) * 100:+.1f}%"
+        print(line)
+
+
+async def main(options):
+    rng = random.Random(options.seed)
+    scratch = tempfile.mkdtemp(prefix="replay-")
+    os.chdir(scratch)  # the bots create their json/db files in the working directory
+    if not options.verbose:
+        logging.disable(logging.CRITICAL)
+
+    import cache
+    import market_data
+    from governor import Governor
+
+    fixture = fixtures.install(market_data, fixtures.FixtureYF(latency=options.latency))
+    market_data.governor = Governor(rate=1e9, burst=10**9)
+    if options.cold:
+        for c in cache.caches.values():
+            c.ttl = 0
+
+    server = None
+    if options.service:
+        from market_data_service import MarketDataServer
+        server = MarketDataServer(os.path.join(scratch, "market_data.sock"))
+        await server.start()
+        market_data.MARKET_DATA_SOCKET = server.path
+
+    names = list(SCENARIOS) if options.bot == "all" else [options.bot]
+    results = {}
+    for name in names:
+        module = __import__(name)
+        if options.digest and hasattr(module, "market_digest"):
+            module.market_digest.universe = sorted(SYMBOLS)
+            await module.market_digest.build()
+        if options.stream and hasattr(module, "quotes"):
+            # The feed the bot (or, with --service, the service) answers
+            # market_data.get_live_* from
+            import quote_stream
+            quotes = quote_stream.QuoteStream(lambda: quote_stream.SimulatedFeed(interval=0.05, seed=options.seed))
+            market_data.use_quote_stream(quotes)
+            quotes.subscribe(SYMBOLS)
+            quotes.start()
+            await asyncio.sleep(0.2)  # first ticks
+        results[name] = await run_bot(name, module, options, rng)
+
+    baseline = None
+    if options.baseline:
+        with open(options.baseline, "r") as f:
+            baseline = json.load(f)
+    for name, result in results.items():
+        report(name, result, baseline)
+    print(f"\nupstream calls served by the fixture: {fixture.calls}  (scratch dir: {scratch})")
+
+    if server is not None:
+        await server.stop()
+    if options.json:
+        with open(os.path.join(ROOT, options.json) if not os.path.isabs(options.json) else options.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bot", default="all", choices=["all", *SCENARIOS])
+    parser.add_argument("--commands", type=int, default=5000, help="commands per bot")
+    parser.add_argument("--concurrency", type=int, default=50, help="commands in flight at once")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated upstream latency (s)")
+    parser.add_argument("--cold", action="store_true", help="expire every cache entry at once")
+    parser.add_argument("--service", action="store_true", help="go through a local market_data_service")
+    parser.add_argument("--digest", action="store_true", help="build the nightly digest for every symbol first")
+    parser.add_argument("--stream", action="store_true", help="serve quotes from a simulated stream")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare with results saved by --json")
+    parser.add_argument("--verbose", action="store_true", help="keep the bots' logging")
+    options = parser.parse_args()
+    # As stockbot2 does: fork the analysis pool (charts) before any threads start
+    import analysis
+    import charts  # imports matplotlib, so the workers inherit it
+    analysis.start()
+    asyncio.run(main(options))
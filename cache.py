@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+# Every cache registers itself here so its counters can be reported in one place
+caches = {}
+
+
+class TTLCache:
+    """In-process LRU cache with per-entry expiry and single-flight loading.
+
+    ``ttl`` is either a number of seconds or a zero-argument callable returning
+    one, so the lifetime can change with the time of day. Expired entries stay
+    until they are replaced or pushed out by the LRU limit, so ``get_stale()``
+    can still serve them while the upstream is unavailable.
+    """
+
+    def __init__(self, name, ttl, maxsize=1024):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (expires_at, value, stored_at)
+        self._inflight = {}  # key -> asyncio.Task loading that key
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        caches[name] = self
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def _ttl(self):
+        return self.ttl() if callable(self.ttl) else self.ttl
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def get_stale(self, key):
+        """``(value, age_seconds)`` for ``key`` even if it has expired, or ``(None, None)``."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None, None
+        _, value, stored_at = entry
+        return value, time.monotonic() - stored_at
+
+    def set(self, key, value, ttl=None):
+        ttl = self._ttl() if ttl is None else ttl
+        now = time.monotonic()
+        self._data[key] = (now + ttl, value, now)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_fetch(self, key, fetch):
+        """Return the cached value for ``key`` or load it with ``await fetch()``.
+
+        Concurrent misses for the same key all wait on one load.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, fetch))
+            self._inflight[key] = task
+        # shield: one caller giving up must not cancel the load for the others
+        return await asyncio.shield(task)
+
+    async def get_many_or_fetch(self, keys, fetch_many):
+        """Batch version of get_or_fetch.
+
+        Keys that are cached or already loading are served from there; the rest
+        are loaded together with one ``await fetch_many(missing_keys)``, which
+        returns a dict. Keys that could not be loaded come back as None.
+        """
+        results = {}
+        waits = {}
+        missing = []
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                results[key] = value
+            elif key in self._inflight:
+                self.coalesced += 1
+                waits[key] = self._inflight[key]
+            else:
+                self.misses += 1
+                missing.append(key)
+
+        if missing:
+            batch = asyncio.ensure_future(self._load_many(missing, fetch_many))
+            for key in missing:
+                task = asyncio.ensure_future(self._pick(batch, key))
+                self._inflight[key] = waits[key] = task
+
+        if waits:
+            loaded = await asyncio.gather(
+                *(asyncio.shield(task) for task in waits.values()),
+                return_exceptions=True,
+            )
+            failed = []
+            for key, value in zip(waits, loaded):
+                if isinstance(value, Exception):
+                    failed.append((key, value))
+                    value = None
+                results[key] = value
+            if failed:
+                # One line per call, not per key: a failed batch fails every key in it
+                key, error = failed[0]
+                logging.warning(f"[cache] {self.name}: could not load {len(failed)} key(s) ({key}: {error})")
+        return {key: results.get(key) for key in keys}
+
+    async def _load_many(self, keys, fetch_many):
+        values = await fetch_many(keys)
+        for key, value in values.items():
+            if value is not None:
+                self.set(key, value)
+        return values
+
+    async def _pick(self, batch, key):
+        try:
+            return (await batch).get(key)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _load(self, key, fetch):
+        try:
+            value = await fetch()
+            if value is not None:
+                self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+class PersistentTTLCache(TTLCache):
+    """TTLCache that snapshots its entries to a JSON file.
+
+    Expiry is stored as wall-clock time so entries survive a restart. Values
+    must be JSON-serialisable. Snapshots are written at most once per
+    ``save_interval`` seconds and replace the file atomically. Inside an event
+    loop the file is written from a background task on the default executor,
+    so ``set()`` never blocks the loop on serialising and writing it.
+    """
+
+    def __init__(self, name, ttl, path, maxsize=1024, save_interval=60):
+        super().__init__(name, ttl, maxsize)
+        self.path = path
+        self.save_interval = save_interval
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._flush = None  # background save in progress
+        self.load()
+
+    def set(self, key, value, ttl=None):
+        super().set(key, value, ttl)
+        self._dirty = True
+        if self._flush is None and time.monotonic() - self._last_save >= self.save_interval:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.save()
+            else:
+                self._flush = loop.create_task(self._save_in_background())
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"[cache] Could not load {self.path}: {e}")
+            return
+        now = time.time()
+        for key, (expires_at, value) in entries.items():
+            if expires_at > now:
+                super().set(key, value, ttl=expires_at - now)
+
+    def _snapshot(self):
+        # Taken on the loop; only the copy is handed to the writer thread
+        self._last_save = time.monotonic()
+        self._dirty = False  # any later set() marks it dirty again
+        offset = time.time() - time.monotonic()
+        return {
+            key: (expires_at + offset, value)
+            for key, (expires_at, value, _) in self._data.items()
+        }
+
+    def _write(self, entries):
+        # Several bots (and, at exit, a background save and save()) may write
+        # the same file; each writer gets its own temp file, and the last
+        # os.replace wins with a complete snapshot
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(entries, f, default=str)
+            os.replace(tmp, self.path)
+        except (OSError, TypeError, ValueError) as e:
+            self._dirty = True  # try again next time
+            logging.warning(f"[cache] Could not save {self.path}: {e}")
+
+    async def _save_in_background(self):
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, self._snapshot())
+        finally:
+            self._flush = None
+
+    def save(self):
+        if not self._dirty:
+            self._last_save = time.monotonic()
+            return
+        self._write(self._snapshot())
@@ -0,0 +1,137 @@
+import os
+import asyncio
+import hashlib
+import logging
+
+import numpy as np
+from matplotlib.figure import Figure  # drawn without pyplot, so no GUI backend or global state
+
+import analysis
+import indicators
+
+# !chart renders a PNG from the stored daily history on the analysis process
+# pool. Finished images are content addressed: the file name is a hash of
+# everything the picture depends on (symbol, range, last bar), so a repeated
+# request is a file upload and a new bar simply produces a new file.
+#
+# matplotlib is imported here, before analysis.start() forks the workers, so
+# they inherit it instead of importing it on their first chart.
+
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", "chart_cache")
+CHART_CACHE_MAX = int(os.getenv("CHART_CACHE_MAX", "500"))  # files kept on disk
+CHART_TIMEOUT = float(os.getenv("CHART_TIMEOUT", "20"))
+CHART_VERSION = "1"  # bump when the drawing changes, so old images are not reused
+
+# Range -> (trading days shown, moving averages overlaid)
+RANGES = {
+    "1mo": (21, (20, 50)),
+    "3mo": (63, (20, 50)),
+    "6mo": (126, (50, 200)),
+    "1y": (252, (50, 200)),
+}
+DEFAULT_RANGE = "6mo"
+CANDLE_MAX_BARS = 70  # longer ranges are drawn as a line
+
+stats = {"rendered": 0, "disk_hits": 0}
+
+# Renders in progress, so a burst of the same request renders once;
+# finished images are found on disk
+_inflight = {}  # key -> task rendering it
+
+
+def chart_key(symbol, period, last_date, last_close):
+    raw = f"{CHART_VERSION}|{symbol}|{period}|{last_date}|{last_close!r}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+# ----- Worker side -----
+
+def _render(path, symbol, period, dates, open_, high, low, close):
+    bars, averages = RANGES[period]
+    shown = slice(-bars, None)
+    x = np.arange(close[shown].size)
+
+    fig = Figure(figsize=(8, 4.2), dpi=100)
+    ax = fig.add_subplot()
+    if x.size <= CANDLE_MAX_BARS:
+        o, h, l, c = open_[shown], high[shown], low[shown], close[shown]
+        up = c >= o
+        for mask, color in ((up, "#26a69a"), (~up, "#ef5350")):
+            ax.vlines(x[mask], l[mask], h[mask], color=color, linewidth=0.8)
+            ax.bar(x[mask], np.abs(c - o)[mask], bottom=np.minimum(o, c)[mask], width=0.6, color=color)
+    else:
+        ax.plot(x, close[shown], color="#1e88e5", linewidth=1.4, label="Close")
+
+    for window, color in zip(averages, ("#ff9800", "#8e24aa")):
+        # Averaged over the whole history, so the line starts at the left edge
+        # whenever there are enough earlier bars
+        ma = np.concatenate((np.full(window - 1, np.nan), indicators.sma_series(close, window)))[-close.size:]
+        if not np.isnan(ma[shown]).all():
+            ax.plot(x, ma[shown], color=color, linewidth=1.1, label=f"MA{window}")
+
+    labels = dates[shown]
+    ticks = np.linspace(0, x.size - 1, min(6, x.size)).round().astype(int)
+    ax.set_xticks(ticks, [str(labels[i]) for i in ticks])
+    ax.set_title(f"{symbol} · {period}")
+    ax.grid(alpha=0.3)
+    ax.legend(loc="upper left", fontsize=8)
+    fig.tight_layout()
+
+    # Write to a temporary name first so a half-written file is never served
+    partial = f"{path}.{os.getpid()}.tmp"
+    fig.savefig(partial, format="png")
+    os.replace(partial, path)
+    return path
+
+
+# ----- Main-process side -----
+
+def _prune():
+    entries = [e for e in os.scandir(CHART_CACHE_DIR) if e.name.endswith(".png")]
+    if len(entries) <= CHART_CACHE_MAX:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[:len(entries) - CHART_CACHE_MAX]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+async def chart(symbol, history, period=DEFAULT_RANGE):
+    """Path of a PNG chart of ``history`` (a daily OHLC frame) for ``period``.
+
+    Served from the on-disk cache when the same chart was rendered before.
+    """
+    close = history["Close"].dropna()
+    if close.empty:
+        raise ValueError(f"no history to chart for {symbol}")
+    key = chart_key(symbol, period, close.index[-1].strftime("%Y-%m-%d"), float(close.iloc[-1]))
+    # Absolute: the workers keep the working directory they were forked in
+    path = os.path.abspath(os.path.join(CHART_CACHE_DIR, f"{key}.png"))
+    if os.path.exists(path):
+        stats["disk_hits"] += 1
+        os.utime(path)  # recently used: pruned last
+        return path
+
+    async def render():
+        os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+        frame = history[["Open", "High", "Low", "Close"]].dropna()
+        dates = frame.index.strftime("%b %d").to_numpy()
+        result = await analysis.submit(
+            _render, path, symbol, period, dates,
+            *(frame[col].to_numpy(dtype=np.float64) for col in ("Open", "High", "Low", "Close")),
+            timeout=CHART_TIMEOUT,
+        )
+        stats["rendered"] += 1
+        try:
+            _prune()
+        except OSError as e:
+            logging.warning(f"[charts] Could not prune {CHART_CACHE_DIR}: {e}")
+        return result
+
+    task = _inflight.get(key)
+    if task is None:
+        task = _inflight[key] = asyncio.ensure_future(render())
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
@@ -0,0 +1,272 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import datetime
+
+import numpy as np
+
+import market_data
+import metrics
+
+# The nightly digest: after the close, RSI and the 50/200-day moving averages
+# for a fixed universe of popular symbols are computed in one vectorised pass
+# and kept in a small table that !action, !ma and !rsi answer from. Symbols
+# outside the universe (or a digest older than the last close) fall back to
+# the live computation.
+
+DIGEST_DB_PATH = os.getenv("DIGEST_DB_PATH", "digest.db")
+# Universe: DIGEST_UNIVERSE (comma separated) or a file with one symbol per line
+DIGEST_UNIVERSE = os.getenv("DIGEST_UNIVERSE", "")
+DIGEST_UNIVERSE_FILE = os.getenv("DIGEST_UNIVERSE_FILE", "universe.txt")
+DIGEST_RUN_AT = datetime.time.fromisoformat(os.getenv("DIGEST_RUN_AT", "16:30"))  # market time
+DIGEST_BATCH = int(os.getenv("DIGEST_BATCH", "25"))  # symbols per get_daily_histories call
+
+LOOKUPS = metrics.Counter(
+    "bot_digest_lookups_total", "Digest lookups by result (hit, stale, miss)", labels=("result",)
+)
+
+RSI_PERIOD = 14
+MA_FAST = 50
+MA_SLOW = 200
+FIELDS = ("price", "rsi", "ma_fast", "ma_slow")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digest (
+    symbol   TEXT PRIMARY KEY,
+    as_of    TEXT NOT NULL,
+    price    REAL,
+    rsi      REAL,
+    ma_fast  REAL,
+    ma_slow  REAL,
+    built_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+
+def load_universe():
+    if DIGEST_UNIVERSE:
+        symbols = DIGEST_UNIVERSE.split(",")
+    elif os.path.exists(DIGEST_UNIVERSE_FILE):
+        with open(DIGEST_UNIVERSE_FILE, "r") as f:
+            symbols = [line.split("#")[0] for line in f]
+    else:
+        symbols = []
+    return sorted({s.strip().upper() for s in symbols if s.strip()})
+
+
+def last_close(now=None):
+    """The most recent weekday close at or before ``now`` (holidays not modelled)."""
+    now = (now or datetime.datetime.now(market_data.MARKET_TZ)).astimezone(market_data.MARKET_TZ)
+    close = datetime.datetime.combine(now.date(), market_data.MARKET_CLOSE, market_data.MARKET_TZ)
+    if close > now:
+        close -= datetime.timedelta(days=1)
+    while close.weekday() >= 5:
+        close -= datetime.timedelta(days=1)
+    return close
+
+
+def next_run(now=None, run_at=DIGEST_RUN_AT):
+    """The next weekday at ``run_at`` market time after ``now``."""
+    now = (now or datetime.datetime.now(market_data.MARKET_TZ)).astimezone(market_data.MARKET_TZ)
+    run = datetime.datetime.combine(now.date(), run_at, market_data.MARKET_TZ)
+    if run <= now:
+        run += datetime.timedelta(days=1)
+    while run.weekday() >= 5:
+        run += datetime.timedelta(days=1)
+    return run
+
+
+# ----- Vectorised pass -----
+
+def _matrix(closes):
+    # One row per symbol, closes right-aligned (latest in the last column) and
+    # NaN-padded on the left, plus the number of real values in each row.
+    # Gaps are dropped first, as indicators.compute does.
+    series = [c[~np.isnan(c)] for c in (np.asarray(c, dtype=np.float64) for c in closes)]
+    lengths = np.array([s.size for s in series])
+    matrix = np.full((len(series), max(lengths.max(initial=0), 1)), np.nan)
+    for row, values in enumerate(series):
+        if values.size:
+            matrix[row, -values.size:] = values
+    return matrix, lengths
+
+
+def _sma(matrix, lengths, window):
+    if matrix.shape[1] < window:
+        return np.full(matrix.shape[0], np.nan)
+    return np.where(lengths >= window, matrix[:, -window:].mean(axis=1), np.nan)
+
+
+def _wilder_last(values, first, period):
+    # indicators._wilder_last for every row at once. Row i's values start at
+    # column first[i]; the seed is the mean of its first `period` values and
+    # the decay weights only depend on the distance from the last column.
+    alpha = 1.0 / period
+    rows, cols = values.shape
+    csum = np.concatenate((np.zeros((rows, 1)), np.cumsum(values, axis=1)), axis=1)
+    r = np.arange(rows)
+    seed_end = np.minimum(first + period, cols)
+    seed = (csum[r, seed_end] - csum[r, first]) / period
+    rest = cols - seed_end  # smoothed values after the seed
+    decay = (1.0 - alpha) ** np.arange(cols - 1, -1, -1)
+    after_seed = np.arange(cols) >= seed_end[:, None]
+    return seed * (1.0 - alpha) ** rest + alpha * (values * decay * after_seed).sum(axis=1)
+
+
+def _rsi(matrix, lengths, period):
+    delta = np.nan_to_num(np.diff(matrix, axis=1))
+    if delta.shape[1] < period:
+        return np.full(matrix.shape[0], np.nan)
+    first = delta.shape[1] - np.maximum(lengths - 1, 0)  # first real change per row
+    gain = _wilder_last(np.clip(delta, 0.0, None), first, period)
+    loss = _wilder_last(np.clip(-delta, 0.0, None), first, period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(loss == 0, np.where(gain > 0, 100.0, 50.0), 100.0 - 100.0 / (1.0 + gain / loss))
+    return np.where(lengths > period, rsi, np.nan)
+
+
+def compute(closes, rsi_period=RSI_PERIOD, fast=MA_FAST, slow=MA_SLOW):
+    """Price, RSI and moving averages for many series at once.
+
+    ``closes`` is a list of 1-D arrays (oldest first). Returns an array with
+    one row per series and a column per FIELDS entry; values that need more
+    history than a series has are NaN.
+    """
+    matrix, lengths = _matrix(closes)
+    price = np.where(lengths > 0, matrix[:, -1], np.nan)
+    rsi = _rsi(matrix, lengths, rsi_period)
+    ma_fast = _sma(matrix, lengths, fast)
+    ma_slow = _sma(matrix, lengths, slow)
+    return np.column_stack([price, rsi, ma_fast, ma_slow])
+
+
+# ----- Table -----
+
+class Digest:
+    """The precomputed table plus the task that rebuilds it every evening.
+
+    Only one process builds (``builder=True``); others reload the table from
+    the database every ``reload_interval`` seconds.
+    """
+
+    def __init__(self, path=DIGEST_DB_PATH, universe=None, builder=True,
+                 batch_size=DIGEST_BATCH, reload_interval=600, retry_interval=900):
+        self.path = path
+        self.universe = load_universe() if universe is None else universe
+        self.builder = builder
+        self.batch_size = batch_size
+        self.reload_interval = reload_interval
+        self.retry_interval = retry_interval
+        self.built_at = None  # wall-clock time of the build currently loaded
+        self.as_of = {}  # symbol -> date of the last bar used
+        self._rows = {}  # symbol -> row of self._values
+        self._values = np.empty((0, len(FIELDS)))
+        self._task = None
+        self._db = sqlite3.connect(self.path, timeout=30)
+        with self._db:
+            self._db.execute(_SCHEMA)
+        self.load()
+
+    def load(self):
+        with self._db:
+            rows = self._db.execute(f"SELECT symbol, as_of, built_at, {', '.join(FIELDS)} FROM digest").fetchall()
+        self._install(
+            [r[0] for r in rows], [r[1] for r in rows],
+            np.array([r[3:] for r in rows], dtype=np.float64).reshape(-1, len(FIELDS)),
+            min((r[2] for r in rows), default=None),
+        )
+
+    def _install(self, symbols, as_of, values, built_at):
+        self._rows = {symbol: i for i, symbol in enumerate(symbols)}
+        self.as_of = dict(zip(symbols, as_of))
+        self._values = values
+        self.built_at = built_at
+
+    def fresh(self, now=None):
+        """True when the loaded table was built after the last close."""
+        return self.built_at is not None and self.built_at >= last_close(now).timestamp()
+
+    def get(self, symbol):
+        """``{field: value or None}`` for ``symbol``, or None if not covered or stale."""
+        row = self._rows.get(symbol)
+        if row is None or not self.fresh():
+            LOOKUPS.inc("miss" if row is None else "stale")
+            return None
+        LOOKUPS.inc("hit")
+        values = {f: (None if np.isnan(v) else float(v)) for f, v in zip(FIELDS, self._values[row])}
+        values["as_of"] = self.as_of[symbol]
+        return values
+
+    def __contains__(self, symbol):
+        return symbol in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    async def build(self):
+        started = time.perf_counter()
+        # Only bars of completed sessions: built during market hours, the table
+        # would otherwise hold today's partial bar and pass fresh() as the close
+        cutoff = last_close().date().isoformat()
+        histories = {}
+        for i in range(0, len(self.universe), self.batch_size):
+            batch = self.universe[i:i + self.batch_size]
+            loaded = await market_data.get_daily_histories(batch)
+            for symbol, history in loaded.items():
+                if history is not None:
+                    history = history.loc[:cutoff]
+                    if not history.empty:
+                        histories[symbol] = history
+        if not histories:
+            raise RuntimeError(f"no history for any of the {len(self.universe)} symbols")
+
+        symbols = list(histories)
+        values = compute([histories[s]["Close"].to_numpy() for s in symbols])
+        as_of = [histories[s].index[-1].strftime("%Y-%m-%d") for s in symbols]
+        built_at = time.time()
+        rows = [
+            (s, d, *(None if np.isnan(v) else float(v) for v in row), built_at)
+            for s, d, row in zip(symbols, as_of, values)
+        ]
+        with self._db:
+            self._db.execute("DELETE FROM digest")
+            self._db.executemany(
+                f"INSERT INTO digest (symbol, as_of, {', '.join(FIELDS)}, built_at) "
+                f"VALUES ({', '.join('?' * (len(FIELDS) + 3))})",
+                rows,
+            )
+        self._install(symbols, as_of, values, built_at)
+        logging.info(
+            f"[digest] Built {len(symbols)}/{len(self.universe)} symbols "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            if not self.builder:
+                await asyncio.sleep(self.reload_interval)
+                try:
+                    self.load()
+                except Exception as e:
+                    logging.warning(f"[digest] Reload failed: {e}")
+                continue
+            if not self.universe:
+                return
+            if self.fresh():
+                now = datetime.datetime.now(market_data.MARKET_TZ)
+                await asyncio.sleep((next_run(now) - now).total_seconds())
+            try:
+                await self.build()
+            except Exception as e:
+                logging.warning(f"[digest] Build failed: {e}")
+                await asyncio.sleep(self.retry_interval)
@@ -0,0 +1,123 @@
+import time
+import asyncio
+import logging
+
+
+class CircuitOpen(Exception):
+    """The upstream is rate limiting us and calls are being held back."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"upstream is rate limiting; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class Governor:
+    """Token bucket, adaptive backoff and circuit breaker for one upstream.
+
+    ``acquire()`` waits for a token; tokens refill at ``rate`` per second up to
+    ``burst``. The caller reports the outcome of each call:
+
+    - ``rate_limited()`` halves the rate (down to ``min_rate``) and pauses the
+      bucket for a backoff that doubles on every consecutive 429, up to
+      ``max_backoff``. After ``threshold`` consecutive 429s the circuit opens:
+      ``acquire()`` raises CircuitOpen until the backoff has passed, then lets
+      a single probe call through (half-open).
+    - ``succeeded()`` closes the circuit, resets the backoff and wins back a
+      tenth of the configured rate per call (additive increase).
+
+    Runs on one event loop; nothing here is thread-safe.
+    """
+
+    def __init__(self, rate=2.0, burst=10, min_rate=0.1, base_backoff=5.0, max_backoff=300.0, threshold=3):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.threshold = threshold
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()  # FIFO: waiters get tokens in arrival order
+        self._paused_until = 0.0
+        self._backoff = base_backoff
+        self._strikes = 0  # consecutive rate-limited calls
+        self._open_until = None  # set while the circuit is open
+        self._probing = False
+
+    @property
+    def state(self):
+        if self._open_until is None:
+            return "closed"
+        return "half-open" if time.monotonic() >= self._open_until else "open"
+
+    def throttled(self):
+        """True while backing off or with the circuit open."""
+        return self._open_until is not None or time.monotonic() < self._paused_until
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait for a token; returns True if this caller is the half-open probe.
+
+        Raises CircuitOpen while the circuit is open, including for callers
+        that were already waiting when it opened. Only a caller that got a
+        token reports back (``succeeded``/``failed``/``rate_limited``),
+        passing on what this returned.
+        """
+        probe = False
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    if self._open_until is not None and not probe:
+                        if now < self._open_until or self._probing:
+                            raise CircuitOpen(max(self._open_until - now, 0.0))
+                        self._probing = probe = True  # half-open: this caller is the probe
+                    if now < self._paused_until:
+                        await asyncio.sleep(self._paused_until - now)
+                        continue
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return probe
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+        except BaseException:
+            if probe:
+                self._probing = False  # gave up before sending; let the next caller probe
+            raise
+
+    def succeeded(self):
+        if self._open_until is not None:
+            logging.info("[governor] Upstream recovered; circuit closed")
+        self._open_until = None
+        self._probing = False
+        self._strikes = 0
+        self._backoff = self.base_backoff
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def failed(self, probe=False):
+        """A call failed for a reason other than rate limiting."""
+        if probe:
+            self._probing = False  # let the next caller probe
+
+    def rate_limited(self, probe=False):
+        now = time.monotonic()
+        if now < self._paused_until and not probe:
+            return  # sent before the current pause began; already accounted for
+        self._strikes += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._paused_until = now + self._backoff
+        self._tokens = 0.0
+        if self._strikes >= self.threshold or probe:
+            self._open_until = now + self._backoff
+            logging.warning(
+                f"[governor] Circuit open for {self._backoff:.0f}s after {self._strikes} rate-limited call(s)"
+            )
+        else:
+            logging.warning(f"[governor] Rate limited; pausing {self._backoff:.0f}s at {self.rate:.2f} req/s")
+        if probe:
+            self._probing = False
+        self._backoff = min(self.max_backoff, self._backoff * 2)
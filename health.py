@@ -0,0 +1,114 @@
+import os
+import math
+import time
+import logging
+
+import discord
+from aiohttp import web
+
+import metrics
+
+# Asyncio-native replacement for keep_alive.py: an aiohttp server (aiohttp is
+# already a discord.py dependency) running on the bot's own event loop.
+#
+#   /         -> "I'm alive!" (what UptimeRobot pings)
+#   /healthz  -> liveness: the event loop is serving requests
+#   /readyz   -> readiness: 200 only while the gateway is connected and healthy
+#   /metrics  -> Prometheus metrics
+#
+# Processes without a gateway connection (market_data_service.py) serve only
+# /healthz and /metrics, via start_metrics_server.
+
+DEFAULT_PORT = int(os.getenv("HEALTH_PORT", os.getenv("PORT", "8080")))
+MAX_LATENCY = float(os.getenv("HEALTH_MAX_LATENCY", "5"))  # seconds
+MAX_ACK_AGE = float(os.getenv("HEALTH_MAX_ACK_AGE", "90"))  # seconds since last heartbeat ACK
+
+
+def _shard_state(shard_id, ws):
+    # The heartbeat thread is internal to discord.py, so read it defensively
+    keep_alive = getattr(ws, "_keep_alive", None) if ws else None
+    last_ack = getattr(keep_alive, "_last_ack", None)
+    latency = ws.latency if ws else float("nan")
+    return {
+        "shard_id": shard_id,
+        "connected": ws is not None and ws.open,
+        "latency": None if math.isnan(latency) or math.isinf(latency) else round(latency, 4),
+        "last_heartbeat_ack_age": None if last_ack is None else round(time.perf_counter() - last_ack, 1),
+    }
+
+
+def gateway_state(bot):
+    if isinstance(bot, discord.AutoShardedClient):
+        shards = [
+            _shard_state(shard_id, getattr(info, "_parent", None) and info._parent.ws)
+            for shard_id, info in bot.shards.items()
+        ]
+    else:
+        shards = [_shard_state(bot.shard_id or 0, bot.ws)]
+
+    def healthy(shard):
+        return (
+            shard["connected"]
+            and shard["latency"] is not None
+            and shard["latency"] <= MAX_LATENCY
+            and (shard["last_heartbeat_ack_age"] or 0) <= MAX_ACK_AGE
+        )
+
+    ready = bot.is_ready() and not bot.is_closed() and bool(shards) and all(map(healthy, shards))
+    return {"ready": ready, "user": str(bot.user) if bot.user else None, "shards": shards}
+
+
+class HealthServer:
+    def __init__(self, bot, host="0.0.0.0", port=DEFAULT_PORT):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self._runner = None
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get("/healthz", self.healthz),
+            web.get("/metrics", self.metrics),
+        ])
+        if bot is not None:
+            self.app.add_routes([
+                web.get("/", self.home),
+                web.get("/readyz", self.readyz),
+            ])
+
+    async def home(self, request):
+        return web.Response(text="I'm alive!")
+
+    async def healthz(self, request):
+        return web.json_response({"alive": True})
+
+    async def readyz(self, request):
+        state = gateway_state(self.bot)
+        return web.json_response(state, status=200 if state["ready"] else 503)
+
+    async def metrics(self, request):
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logging.info(f"[health] Listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def start_health_server(bot, port=DEFAULT_PORT):
+    """Drop-in for keep_alive(): call from ``setup_hook`` so it runs on the bot's loop."""
+    server = HealthServer(bot, port=port)
+    await server.start()
+    return server
+
+
+async def start_metrics_server(port):
+    """/healthz and /metrics only, for processes that are not a bot."""
+    server = HealthServer(None, port=port)
+    await server.start()
+    return server
@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+
+import pandas as pd
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_bars (
+    symbol TEXT NOT NULL,
+    date   TEXT NOT NULL,
+    open   REAL,
+    high   REAL,
+    low    REAL,
+    close  REAL,
+    volume REAL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID
+"""
+
+
+class HistoryStore:
+    """Local SQLite store of daily OHLCV bars, one row per (symbol, date).
+
+    Called from the market-data worker threads, so each thread gets its own
+    connection. The database runs in WAL mode so readers never block the
+    writer appending new bars.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def last_date(self, symbol):
+        row = self._conn().execute(
+            "SELECT MAX(date) FROM daily_bars WHERE symbol = ?", (symbol,)
+        ).fetchone()
+        return row[0]
+
+    def reference_bar(self, symbol):
+        """``(date, close)`` of the newest bar known to be final, or None.
+
+        That is the bar before the last one, since the last may have been
+        stored mid-session; with a single bar stored it is that bar.
+        """
+        rows = self._conn().execute(
+            "SELECT date, close FROM daily_bars WHERE symbol = ? ORDER BY date DESC LIMIT 2", (symbol,)
+        ).fetchall()
+        return rows[-1] if rows else None
+
+    def delete(self, symbol):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM daily_bars WHERE symbol = ?", (symbol,))
+
+    def upsert(self, symbol, frame):
+        """Insert or overwrite the bars in ``frame`` (a yfinance history frame)."""
+        if frame is None or frame.empty:
+            return 0
+        rows = [
+            (
+                symbol,
+                index.strftime("%Y-%m-%d"),
+                *(None if pd.isna(row[col]) else float(row[col]) for col in COLUMNS),
+            )
+            for index, row in frame[COLUMNS].iterrows()
+        ]
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_bars VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def read(self, symbol, start=None):
+        """Return the stored bars for ``symbol`` from ``start`` (YYYY-MM-DD) on."""
+        query = "SELECT date, open, high, low, close, volume FROM daily_bars WHERE symbol = ?"
+        params = [symbol]
+        if start:
+            query += " AND date >= ?"
+            params.append(start)
+        query += " ORDER BY date"
+        rows = self._conn().execute(query, params).fetchall()
+        frame = pd.DataFrame(rows, columns=["Date"] + COLUMNS)
+        frame.index = pd.to_datetime(frame.pop("Date"))
+        return frame
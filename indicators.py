@@ -0,0 +1,161 @@
+from collections import deque
+
+import numpy as np
+
+# Technical indicators over a 1-D array of closing prices (oldest first).
+# The *_last helpers compute only the latest value in O(n) without building
+# intermediate Series; the *State classes carry the same indicators forward one
+# price at a time for code that sees a stream of ticks.
+
+
+def _as_array(close):
+    return np.asarray(close, dtype=np.float64)
+
+
+def _wilder_last(values, period):
+    # Wilder smoothing is an EMA with alpha = 1/period, seeded with the simple
+    # mean of the first `period` values. Unrolled, the last value is
+    #   seed * (1-a)^m + a * sum(values[period + i] * (1-a)^(m-1-i))
+    # with m = len(values) - period, which is one vectorised dot product.
+    alpha = 1.0 / period
+    seed = values[:period].mean()
+    rest = values[period:]
+    if rest.size == 0:
+        return seed
+    decay = (1.0 - alpha) ** np.arange(rest.size - 1, -1, -1)
+    return seed * (1.0 - alpha) ** rest.size + alpha * np.dot(rest, decay)
+
+
+def _rsi_from(avg_gain, avg_loss):
+    if avg_loss == 0:
+        return 100.0 if avg_gain > 0 else 50.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+def rsi(close, period=14):
+    """Latest Wilder RSI, or None when there are not enough prices."""
+    close = _as_array(close)
+    if close.size <= period:
+        return None
+    delta = np.diff(close)
+    gain = np.clip(delta, 0.0, None)
+    loss = np.clip(-delta, 0.0, None)
+    return float(_rsi_from(_wilder_last(gain, period), _wilder_last(loss, period)))
+
+
+def sma(close, window):
+    """Latest simple moving average, or None when there are not enough prices."""
+    close = _as_array(close)
+    if close.size < window:
+        return None
+    return float(close[-window:].mean())
+
+
+def sma_series(close, window):
+    """Every full-window simple moving average, via one cumulative sum."""
+    close = _as_array(close)
+    if close.size < window:
+        return np.empty(0)
+    csum = np.cumsum(np.concatenate(([0.0], close)))
+    return (csum[window:] - csum[:-window]) / window
+
+
+def ema(close, span):
+    """Latest exponential moving average (alpha = 2 / (span + 1)), seeded with the SMA."""
+    close = _as_array(close)
+    if close.size < span:
+        return None
+    alpha = 2.0 / (span + 1)
+    seed = close[:span].mean()
+    rest = close[span:]
+    decay = (1.0 - alpha) ** np.arange(rest.size - 1, -1, -1)
+    return float(seed * (1.0 - alpha) ** rest.size + alpha * np.dot(rest, decay))
+
+
+def compute(close, rsi_period=14, fast=50, slow=200):
+    """Price, RSI and the fast/slow moving averages from one array.
+
+    Missing values (not enough history) come back as None.
+    """
+    close = _as_array(close)
+    close = close[~np.isnan(close)]
+    return {
+        "price": float(close[-1]) if close.size else None,
+        "rsi": rsi(close, rsi_period),
+        "ma_fast": sma(close, fast),
+        "ma_slow": sma(close, slow),
+    }
+
+
+# ----- Incremental state -----
+
+class SMAState:
+    """Simple moving average maintained with a running sum."""
+
+    def __init__(self, window):
+        self.window = window
+        self._values = deque(maxlen=window)
+        self._sum = 0.0
+
+    def update(self, price):
+        if len(self._values) == self.window:
+            self._sum -= self._values[0]
+        self._values.append(price)
+        self._sum += price
+        return self.value
+
+    @property
+    def value(self):
+        if len(self._values) < self.window:
+            return None
+        return self._sum / self.window
+
+
+class EMAState:
+    """Exponential moving average, seeded with the SMA of the first ``span`` prices."""
+
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self._seed = SMAState(span)
+        self.value = None
+
+    def update(self, price):
+        if self.value is None:
+            self.value = self._seed.update(price)
+        else:
+            self.value += self.alpha * (price - self.value)
+        return self.value
+
+
+class RSIState:
+    """Wilder RSI updated one closing price at a time."""
+
+    def __init__(self, period=14):
+        self.period = period
+        self._prev = None
+        self._count = 0
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+
+    def update(self, price):
+        if self._prev is not None:
+            change = price - self._prev
+            gain = max(change, 0.0)
+            loss = max(-change, 0.0)
+            self._count += 1
+            if self._count <= self.period:
+                # Seed phase: plain average of the first `period` changes
+                self._avg_gain += gain / self.period
+                self._avg_loss += loss / self.period
+            else:
+                self._avg_gain += (gain - self._avg_gain) / self.period
+                self._avg_loss += (loss - self._avg_loss) / self.period
+        self._prev = price
+        return self.value
+
+    @property
+    def value(self):
+        if self._count < self.period:
+            return None
+        return _rsi_from(self._avg_gain, self._avg_loss)
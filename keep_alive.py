@@ -1,5 +1,6 @@
-from flask import Flask
+from flask import Flask, Response
 from threading import Thread
+import metrics
 
 app = Flask('')
 
@@ -7,6 +8,10 @@ app = Flask('')
 def home():
     return "I'm alive!"
 
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 def run():
     app.run(host='0.0.0.0', port=8080)
 
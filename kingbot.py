@@ -1,28 +1,37 @@
 ### This is a discord bot I created with the help of chatgpt in 1 hour for my King Discord Server. Check out the video here: https://www.youtube.com/watch?v=b8xLcuNsK88
 
 import os
-import json
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
-import yfinance as yf  # for stock info
+import market_data
+import metrics
+import stale_notice
+from health import start_health_server
 from discord.ui import Button, View
-import random
+import atexit
+from balance_store import BalanceStore
+from ledger import Ledger, InsufficientFunds
+from leaderboard import Leaderboard
+from meme_store import MemeStore
+from routing import ChannelRouter, WrongChannel
+import logging
 
 load_dotenv()
 TOKEN = os.getenv('DISCORD_TOKEN')
+# Health and /metrics endpoints; its own port so it can share a host with the other bots
+HEALTH_PORT = int(os.getenv('KINGBOT_HEALTH_PORT', '8081'))
 
 intents = discord.Intents.default()
 intents.message_content = True  # Needed to read message content for commands
 
 bot = commands.Bot(command_prefix='!', intents=intents, description="Community & Market Bot")
+metrics.instrument_bot(bot, "kingbot")  # command latency, gateway latency, loop lag
+stale_notice.install(bot)  # flag replies served from stale cache while rate limited
 
 # ----- NEW MEMBER -----
 @bot.command(name='welcome')
 async def welcome_committee(ctx):
-    if ctx.channel.name != '🆕welcome-committee':
-        return  # Only allow this command in the welcome committee channel
-
     welcome_message = """
     **👋 Welcome to the Welcome Committee!**
 
@@ -62,11 +71,6 @@ async def rules(ctx):
 # ----- INFORMATION COMMANDS -----
 @bot.command(name='newvideo')
 async def announce_new_video(ctx, url: str, *, description: str = None):
-    # Only allow in the #new-videos channel
-    if ctx.channel.name != '‼️new-videos':
-        await ctx.send(f"Please use this command in the #new-videos channel, {ctx.author.mention}.")
-        return
-
     description_text = description if description else "Check out this new video!"
 
     embed = discord.Embed(
@@ -97,12 +101,14 @@ async def user(ctx, member: discord.Member = None):
 
 # Define the stockbot channel name
 STOCKBOT_CHANNEL = "🤖stockbot"
+WELCOME_COMMITTEE_CHANNEL = "🆕welcome-committee"
+NEW_VIDEOS_CHANNEL = "‼️new-videos"
+MEMES_CHANNEL = "🤣memes"
+ANNOUNCEMENTS_CHANNEL = "announcements"
 
 # ----- STOCKS COMMANDS -----
 @bot.group(name='stocks', invoke_without_command=True)
 async def stocks(ctx):
-    if ctx.channel.name != STOCKBOT_CHANNEL:
-        return  # Ignore if not in stockbot channel
     help_msg = (
         "Stocks commands:\n"
         "`!stocks price <ticker>` - Current stock price\n"
@@ -115,14 +121,11 @@ async def stocks(ctx):
 
 @stocks.command()
 async def price(ctx, ticker: str):
-    if ctx.channel.name != STOCKBOT_CHANNEL:
-        return
     ticker = ticker.upper()
     try:
-        stock = yf.Ticker(ticker)
-        price = stock.info.get('regularMarketPrice')
+        price = await market_data.get_price(ticker)
         if price:
-            await ctx.send(f"The current price of {ticker} is **${price}**")
+            await ctx.send(f"The current price of {ticker} is **${price:,.2f}**")
         else:
             await ctx.send(f"Price info not available for {ticker}")
     except Exception:
@@ -130,12 +133,10 @@ async def price(ctx, ticker: str):
 
 @stocks.command()
 async def summary(ctx, ticker: str):
-    if ctx.channel.name != STOCKBOT_CHANNEL:
-        return
     ticker = ticker.upper()
     try:
-        stock = yf.Ticker(ticker)
-        summary = stock.info.get('longBusinessSummary')
+        info = await market_data.get_info(ticker)
+        summary = info.get('longBusinessSummary')
         if summary:
             await ctx.send(f"**{ticker} Summary:**\n{summary[:500]}...")
         else:
@@ -145,12 +146,9 @@ async def summary(ctx, ticker: str):
 
 @stocks.command()
 async def stats(ctx, ticker: str):
-    if ctx.channel.name != STOCKBOT_CHANNEL:
-        return
     ticker = ticker.upper()
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
+        info = await market_data.get_info(ticker)
         stats_msg = (
             f"**{ticker} Key Stats:**\n"
             f"Market Cap: {info.get('marketCap', 'N/A')}\n"
@@ -166,14 +164,9 @@ async def stats(ctx, ticker: str):
 
 @stocks.command()
 async def history(ctx, ticker: str, days: int = 5):
-    if ctx.channel.name != STOCKBOT_CHANNEL:
-        return
     ticker = ticker.upper()
     try:
-        end = datetime.now()
-        start = end - timedelta(days=days*2)
-        stock = yf.Ticker(ticker)
-        hist = stock.history(start=start, end=end)
+        hist = await market_data.get_daily_history(ticker)
         if hist.empty:
             await ctx.send(f"No historical data found for {ticker}")
             return
@@ -193,121 +186,82 @@ async def history(ctx, ticker: str, days: int = 5):
 
 @stocks.command()
 async def news(ctx, ticker: str):
-    if ctx.channel.name != STOCKBOT_CHANNEL:
-        return
     ticker = ticker.upper()
     try:
-        stock = yf.Ticker(ticker)
-        news_items = stock.news
+        news_items = await market_data.get_news(ticker)
         if not news_items:
             await ctx.send(f"No recent news found for {ticker}")
             return
         
         msg = f"**Latest News for {ticker}:**\n"
         for item in news_items[:3]:
-            title = item.get('title')
-            link = item.get('link')
-            if title and link:
-                msg += f"- [{title}]({link})\n"
+            msg += f"- [{item['title']}]({item['url']})\n"
         await ctx.send(msg)
     except Exception:
         await ctx.send(f"Could not retrieve news for {ticker}")
 
-MEMES_FILE = "memes.json"
+MEMES_LOG = "memes.jsonl"
+MEMES_FILE = "memes.json"  # old storage, imported into MEMES_LOG on first start
 
 # Default memes (preset)
 default_memes = [
     "https://i.imgur.com/W3b7QZQ.jpg",
 ]
 
-# Load user memes from file
-def load_memes():
-    if os.path.exists(MEMES_FILE):
-        with open(MEMES_FILE, "r") as f:
-            return json.load(f)
-    else:
-        return []
-
-# Save user memes to file
-def save_memes(memes_list):
-    with open(MEMES_FILE, "w") as f:
-        json.dump(memes_list, f)
-
-user_memes = load_memes()
+# Submitted memes: append-only log, duplicates rejected
+memes = MemeStore(MEMES_LOG, defaults=default_memes, legacy_json=MEMES_FILE)
 
 @bot.command(name="resetmemes")
 @commands.has_permissions(administrator=True)  # Only admins can reset
 async def reset_memes(ctx):
-    global user_memes
-    user_memes = []
-    save_memes(user_memes)
+    memes.reset()
     await ctx.send("✅ Memes have been reset to default!")
 
 
 @bot.command(name="submitmeme")
 async def submit_meme(ctx, *, meme: str):
-    if ctx.channel.name != "🤣memes":
-        return  # Only allow submissions in memes channel
-
-    # Add to user memes and save
-    user_memes.append(meme)
-    save_memes(user_memes)
+    if not memes.add(meme.strip()):
+        await ctx.send(f"That meme has already been submitted, {ctx.author.mention}! Try another one.")
+        return
     await ctx.send(f"Thanks for submitting your meme, {ctx.author.mention}! 🎉")
 
 @bot.command(name="again")
 async def again(ctx):
-    if ctx.channel.name != "🤣memes":
-        return  # Only respond in memes channel
-
-    all_memes = default_memes + user_memes
-    if not all_memes:
+    meme = memes.random()
+    if meme is None:
         await ctx.send("No memes available yet! Submit some with `!submitmeme <url or text>`.")
         return
 
-    meme = random.choice(all_memes)
     await ctx.send(meme)
 
 
-CROWNS_FILE = "crowns.json"
+CROWNS_DB = "crowns.db"
+CROWNS_FILE = "crowns.json"  # old storage, imported into CROWNS_DB on first start
 
-def save_crowns():
-    with open(CROWNS_FILE, "w") as f:
-        json.dump(user_crowns, f)
-
-def load_crowns():
-    global user_crowns
-    if os.path.exists(CROWNS_FILE):
-        with open(CROWNS_FILE, "r") as f:
-            user_crowns = json.load(f)
-            # keys in JSON are strings, convert to int keys
-            user_crowns = {int(k): v for k, v in user_crowns.items()}
-            save_crowns()
-    else:
-        user_crowns = {}
+# user_id -> crowns. Lives in memory; changes are flushed to SQLite every few
+# seconds by a background task (started in setup_hook) and once more on exit.
+user_crowns = BalanceStore(CROWNS_DB, table="crowns", legacy_json=CROWNS_FILE)
+atexit.register(user_crowns.flush)
+crown_ledger = Ledger(user_crowns)  # all balance changes go through here
+crown_board = Leaderboard(user_crowns.items())  # kept in sync on every change
+crown_ledger.subscribe(crown_board.update)
 
 DAILY_REWARD_CHANNEL = "🥇daily-reward"
-user_crowns = {}  # Simple in-memory dict: user_id -> crowns
 user_first_try_done = set()  # Track users who have already had their guaranteed win
 
 @bot.group(name='games', invoke_without_command=True)
 async def games(ctx):
-    if ctx.channel.name != DAILY_REWARD_CHANNEL:
-        return  # Only respond in daily-reward channel
     await ctx.send("Games commands: !games guess")
 
 @games.command()
 async def guess(ctx, guess: int = None):
-    if ctx.channel.name != DAILY_REWARD_CHANNEL:
-        return
-
     user_id = ctx.author.id
 
     # Check if user already played (first_try_done means played)
     if user_id not in user_first_try_done:
         # First time playing, give 100 crowns just for playing
-        user_crowns[user_id] = user_crowns.get(user_id, 0) + 100
-        save_crowns()
-        await ctx.send(f"{ctx.author.mention}, you earned **100 crowns** just for playing! Your total crowns: **{user_crowns[user_id]}**")
+        total = crown_ledger.credit(user_id, 100)
+        await ctx.send(f"{ctx.author.mention}, you earned **100 crowns** just for playing! Your total crowns: **{total}**")
     else:
         # Already played, no playing bonus
         await ctx.send(f"{ctx.author.mention}, you have already played today! No bonus crowns.")
@@ -321,25 +275,20 @@ async def guess(ctx, guess: int = None):
     # First guess is always correct and gives 1000 crowns
     if user_id not in user_first_try_done and guess == number:
         user_first_try_done.add(user_id)
-        user_crowns[user_id] += 1000
-        save_crowns()
-        await ctx.send(f"🎉 Correct! You guessed it on your first try! You earned **1000 crowns**! Your total crowns: **{user_crowns[user_id]}**")
+        total = crown_ledger.credit(user_id, 1000)
+        await ctx.send(f"🎉 Correct! You guessed it on your first try! You earned **1000 crowns**! Your total crowns: **{total}**")
         return
 
     # If user has already played before, just check guess normally
     if guess == number:
-        user_crowns[user_id] += 1000
-        save_crowns()
-        await ctx.send(f"🎉 Correct! You earned **1000 crowns**! Your total crowns: **{user_crowns[user_id]}**")
+        total = crown_ledger.credit(user_id, 1000)
+        await ctx.send(f"🎉 Correct! You earned **1000 crowns**! Your total crowns: **{total}**")
     else:
         await ctx.send(f"❌ Nope, the number was {number}. Try again later!")
 
 
 ###----Market Commands---###
 
-# Assuming you have this from your previous code
-user_crowns = {}  # user_id -> crowns dictionary
-
 # Store items example
 store_items = {
     "Peasant's Hat": 300,
@@ -374,26 +323,28 @@ class StoreButton(Button):
 
     async def callback(self, interaction: discord.Interaction):
         user_id = interaction.user.id
-        balance = user_crowns.get(user_id, 0)
-
-        if balance >= self.price:
-            user_crowns[user_id] = balance - self.price
-            await interaction.response.send_message(
-                f"🎉 You bought **{self.item_name}** for {self.price} crowns! "
-                f"Remaining balance: {user_crowns[user_id]} crowns.",
-                ephemeral=True
-            )
-        else:
+        # Check and debit happen together, before any await, so two fast
+        # clicks can't both spend the same crowns
+        try:
+            remaining = crown_ledger.debit(user_id, self.price)
+        except InsufficientFunds as e:
             await interaction.response.send_message(
                 f"❌ You don't have enough crowns to buy **{self.item_name}**. "
-                f"Your balance: {balance} crowns.",
+                f"Your balance: {e.balance} crowns.",
                 ephemeral=True
             )
+            return
+
+        await interaction.response.send_message(
+            f"🎉 You bought **{self.item_name}** for {self.price} crowns! "
+            f"Remaining balance: {remaining} crowns.",
+            ephemeral=True
+        )
 
 @bot.command(name="store")
 async def store(ctx):
     user_id = ctx.author.id
-    balance = user_crowns.get(user_id, 0)
+    balance = crown_ledger.balance(user_id)
     description = "\n".join([f"**{item}** — {price} crowns" for item, price in store_items.items()])
 
     embed = discord.Embed(
@@ -406,19 +357,72 @@ async def store(ctx):
 @bot.command(name="balance")
 async def balance(ctx):
     user_id = ctx.author.id
-    balance = user_crowns.get(user_id, 0)
+    balance = crown_ledger.balance(user_id)
     await ctx.send(f"{ctx.author.mention}, you have **{balance} crowns**.")
 
+@bot.command(name="leaderboard", aliases=["top"])
+async def leaderboard(ctx):
+    top = crown_board.top(10)
+    if not top:
+        await ctx.send("Nobody has any crowns yet! Play `!games guess` to earn some.")
+        return
+    lines = [f"**{i}.** <@{user_id}> — {crowns} crowns" for i, (user_id, crowns) in enumerate(top, 1)]
+    embed = discord.Embed(title="👑 Crown Leaderboard", description="\n".join(lines), color=discord.Color.gold())
+    await ctx.send(embed=embed)
+
+@bot.command(name="rank")
+async def rank(ctx, member: discord.Member = None):
+    member = member or ctx.author
+    position = crown_board.rank(member.id)
+    if position is None:
+        await ctx.send(f"{member.mention} isn't on the leaderboard yet.")
+        return
+    await ctx.send(
+        f"{member.mention} is ranked **#{position}** of {len(crown_board)} "
+        f"with **{crown_ledger.balance(member.id)} crowns**."
+    )
+
+
+# ----- CHANNEL ROUTING -----
+# Each command (and its subcommands) only runs in its channel. Checked once,
+# globally, before the command is invoked; names are resolved to IDs per guild
+# and cached until that guild's channels change.
+router = ChannelRouter(
+    bot,
+    routes={
+        "welcome": WELCOME_COMMITTEE_CHANNEL,
+        "newvideo": NEW_VIDEOS_CHANNEL,
+        "stocks": STOCKBOT_CHANNEL,
+        "submitmeme": MEMES_CHANNEL,
+        "again": MEMES_CHANNEL,
+        "games": DAILY_REWARD_CHANNEL,
+    },
+    notices={
+        "newvideo": "Please use this command in the #new-videos channel, {mention}.",
+    },
+)
+
+@bot.event
+async def on_command_error(ctx, error):
+    if isinstance(error, WrongChannel):
+        if error.notice:
+            await ctx.send(error.notice.format(mention=ctx.author.mention))
+        return  # Otherwise ignore commands used in the wrong channel
+    # Anything else: log it like discord.py's default handler does
+    logging.error(f"Ignoring exception in command {ctx.command}", exc_info=error)
 
 # ----- EVENT: Welcome new members -----
 @bot.event
 async def on_member_join(member):
-    channel = discord.utils.get(member.guild.text_channels, name='announcements')
+    channel = router.get_channel(member.guild, ANNOUNCEMENTS_CHANNEL)
     if channel:
         await channel.send(f"Welcome {member.mention} to the server! 🎉")
 
-#
-load_crowns()
+@bot.event
+async def setup_hook():
+    await start_health_server(bot, port=HEALTH_PORT)
+    user_crowns.start()
 
 # Run the bot
-bot.run(TOKEN)
+if __name__ == "__main__":
+    bot.run(TOKEN)
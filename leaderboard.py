@@ -0,0 +1,44 @@
+from itertools import islice
+
+from sortedcontainers import SortedList
+
+
+class Leaderboard:
+    """Users ordered by score, kept up to date one balance change at a time.
+
+    Backed by a SortedList of ``(-score, user_id)``, so an update, the top N
+    and a user's rank are all O(log n) instead of sorting every balance on
+    each request.
+    """
+
+    def __init__(self, scores=()):
+        self._scores = dict(scores)
+        self._ranked = SortedList((-score, user_id) for user_id, score in self._scores.items())
+
+    def __len__(self):
+        return len(self._scores)
+
+    def update(self, user_id, score):
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._ranked.remove((-old, user_id))
+        self._scores[user_id] = score
+        self._ranked.add((-score, user_id))
+
+    def remove(self, user_id):
+        old = self._scores.pop(user_id, None)
+        if old is not None:
+            self._ranked.remove((-old, user_id))
+
+    def top(self, n=10):
+        """``[(user_id, score), ...]`` for the best ``n`` users."""
+        return [(user_id, -neg) for neg, user_id in islice(self._ranked, n)]
+
+    def rank(self, user_id):
+        """1-based rank of ``user_id`` (ties share a rank), or None if unranked."""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return self._ranked.bisect_left((-score,)) + 1
@@ -0,0 +1,79 @@
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+
+
+class InsufficientFunds(Exception):
+    def __init__(self, user_id, balance, amount):
+        super().__init__(f"user {user_id} has {balance}, needs {amount}")
+        self.user_id = user_id
+        self.balance = balance
+        self.amount = amount
+
+
+class Ledger:
+    """Balance transactions on top of a dict-like store (e.g. BalanceStore).
+
+    ``credit``/``debit``/``transfer`` check and update a balance with no await
+    in between, so on the single event loop they cannot interleave with each
+    other. Anything that has to await while money is on the line (a Discord
+    API call) goes through ``purchase()``, which debits first, holds a per-user
+    lock, and refunds if the body fails.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._locks = weakref.WeakValueDictionary()  # user_id -> asyncio.Lock
+        self._listeners = []  # called as listener(user_id, new_balance)
+
+    def balance(self, user_id):
+        return self.store.get(user_id, 0)
+
+    def subscribe(self, listener):
+        """Call ``listener(user_id, new_balance)`` after every balance change."""
+        self._listeners.append(listener)
+
+    def _set(self, user_id, value):
+        self.store[user_id] = value
+        for listener in self._listeners:
+            listener(user_id, value)
+
+    def credit(self, user_id, amount):
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        value = self.balance(user_id) + amount
+        self._set(user_id, value)
+        return value
+
+    def debit(self, user_id, amount):
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        balance = self.balance(user_id)
+        if balance < amount:
+            raise InsufficientFunds(user_id, balance, amount)
+        self._set(user_id, balance - amount)
+        return balance - amount
+
+    def transfer(self, from_id, to_id, amount):
+        self.debit(from_id, amount)
+        return self.credit(to_id, amount)
+
+    def lock(self, user_id):
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def purchase(self, user_id, amount):
+        """Debit ``amount`` up front; refund it if the ``async with`` body raises.
+
+        Raises InsufficientFunds before the body runs when the user can't pay.
+        """
+        async with self.lock(user_id):
+            remaining = self.debit(user_id, amount)
+            try:
+                yield remaining
+            except BaseException:
+                self.credit(user_id, amount)
+                raise
@@ -0,0 +1,599 @@
+import os
+import atexit
+import asyncio
+import logging
+import time
+import threading
+import datetime
+import functools
+import contextvars
+from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor
+
+import yfinance as yf
+from yfinance.exceptions import YFRateLimitError
+
+# yfinance logs most request errors and returns an empty frame or dict; make it
+# raise instead so run_blocking reports them to the governor as failures
+yf.config.debug.hide_exceptions = False
+
+from cache import TTLCache, PersistentTTLCache
+from governor import Governor, CircuitOpen
+from history_store import HistoryStore
+import metrics
+
+# yfinance is fully blocking, so every upstream call goes through a small
+# thread pool instead of running on the discord.py event loop.
+MAX_WORKERS = int(os.getenv("MARKET_DATA_WORKERS", "8"))
+MAX_PENDING = int(os.getenv("MARKET_DATA_MAX_PENDING", "64"))  # running + queued
+DEFAULT_TIMEOUT = float(os.getenv("MARKET_DATA_TIMEOUT", "10"))
+
+# Every upstream call first takes a token from one governor: YF_RATE calls per
+# second with bursts of YF_BURST, slowed down and eventually cut off (circuit
+# open, cached values served stale) while Yahoo answers with 429s
+YF_RATE = float(os.getenv("YF_RATE", "2"))
+YF_BURST = int(os.getenv("YF_BURST", "10"))
+YF_MAX_BACKOFF = float(os.getenv("YF_MAX_BACKOFF", "300"))
+
+# Quote cache: short TTL while the US market is open, longer once it closes
+QUOTE_TTL_OPEN = float(os.getenv("QUOTE_TTL_OPEN", "15"))
+QUOTE_TTL_CLOSED = float(os.getenv("QUOTE_TTL_CLOSED", "300"))
+QUOTE_CACHE_SIZE = int(os.getenv("QUOTE_CACHE_SIZE", "2048"))
+
+# Ticker.info is the slowest endpoint and changes slowly, so it is kept for
+# hours and optionally snapshotted to disk (set INFO_CACHE_PATH="" to disable)
+INFO_TTL = float(os.getenv("INFO_TTL", str(6 * 3600)))
+INFO_CACHE_SIZE = int(os.getenv("INFO_CACHE_SIZE", "512"))
+INFO_CACHE_PATH = os.getenv("INFO_CACHE_PATH", "info_cache.json")
+
+# Daily bars live in a local SQLite store; each symbol is topped up with only
+# the bars after its last stored date, at most once per HISTORY_TTL seconds
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "history.db")
+HISTORY_TTL = float(os.getenv("HISTORY_TTL", "300"))
+HISTORY_BACKFILL = os.getenv("HISTORY_BACKFILL", "1y")
+HISTORY_LOOKBACK_DAYS = int(os.getenv("HISTORY_LOOKBACK_DAYS", "366"))
+# Yahoo's daily bars are split and dividend adjusted, so a top-up that finds an
+# already stored close moved by more than this (relative) means every stored
+# bar is on the old scale: the symbol is dropped and backfilled again
+HISTORY_RESCALE_TOLERANCE = float(os.getenv("HISTORY_RESCALE_TOLERANCE", "0.005"))
+# Headlines change slowly; news.NewsFeed keeps popular symbols warm
+NEWS_TTL = float(os.getenv("NEWS_TTL", "600"))
+NEWS_CACHE_SIZE = int(os.getenv("NEWS_CACHE_SIZE", "512"))
+
+# yfinance has no batch quote or history call (yf.download just loops over
+# Ticker.history), so bulk lookups make one upstream request per symbol, at
+# most MARKET_DATA_FANOUT of them at a time, each with its own timeout
+FANOUT = int(os.getenv("MARKET_DATA_FANOUT", str(MAX_WORKERS)))
+# How long a service client waits for a whole bulk history call (the nightly digest)
+HISTORY_BATCH_TIMEOUT = float(os.getenv("HISTORY_BATCH_TIMEOUT", "60"))
+
+# In the sharded deployment (shards.py) every bot process forwards its calls to
+# one market_data_service process over this Unix socket, so the caches and the
+# upstream request budget are shared instead of multiplied per process
+MARKET_DATA_SOCKET = os.getenv("MARKET_DATA_SOCKET", "")
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = datetime.time(9, 30)
+MARKET_CLOSE = datetime.time(16, 0)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="market-data")
+_lock = threading.Lock()
+_pending = 0
+
+# Simple counters, read by whoever wants to report on them
+stats = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "timed_out": 0,
+    "rejected": 0,
+    "throttled": 0,
+}
+
+
+class MarketDataError(Exception):
+    pass
+
+
+class MarketDataBusy(MarketDataError):
+    """Too many fetches already queued; the call was rejected up front."""
+
+
+class MarketDataTimeout(MarketDataError):
+    """The fetch did not finish within its timeout."""
+
+
+class MarketDataUnavailable(MarketDataError):
+    """Yahoo is rate limiting us; the call was not sent (or was refused)."""
+
+
+class NoData(MarketDataError):
+    """Yahoo answered, but with nothing for the symbol (unknown, delisted, or throttled)."""
+
+
+def is_market_open(now=None):
+    # Regular NYSE/Nasdaq session; exchange holidays are not modelled
+    now = now or datetime.datetime.now(MARKET_TZ)
+    now = now.astimezone(MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def quote_ttl():
+    return QUOTE_TTL_OPEN if is_market_open() else QUOTE_TTL_CLOSED
+
+
+quote_cache = TTLCache("quotes", ttl=quote_ttl, maxsize=QUOTE_CACHE_SIZE)
+
+if INFO_CACHE_PATH:
+    info_cache = PersistentTTLCache(
+        "info", ttl=INFO_TTL, path=INFO_CACHE_PATH, maxsize=INFO_CACHE_SIZE
+    )
+    atexit.register(info_cache.save)
+else:
+    info_cache = TTLCache("info", ttl=INFO_TTL, maxsize=INFO_CACHE_SIZE)
+
+history_store = HistoryStore(HISTORY_DB_PATH)
+history_cache = TTLCache("history", ttl=HISTORY_TTL, maxsize=256)
+news_cache = TTLCache("news", ttl=NEWS_TTL, maxsize=NEWS_CACHE_SIZE)
+
+governor = Governor(rate=YF_RATE, burst=YF_BURST, max_backoff=YF_MAX_BACKOFF)
+
+# Streaming quotes (a quote_stream.QuoteStream) behind the get_live_* calls.
+# There is one feed per deployment, in the process that owns the market data:
+# the bot itself, or market_data_service when sharded.
+_quotes = None
+
+# Age of the oldest stale value handed to the current command. The variable
+# holds a mutable StaleMarker set up once per command (track_stale), so tasks
+# the command starts with asyncio.gather - which run in copies of its context -
+# record into the same object instead of into their own copy.
+_stale = contextvars.ContextVar("market_data_stale", default=None)
+
+
+class StaleMarker:
+    __slots__ = ("age",)
+
+    def __init__(self):
+        self.age = None
+
+
+def track_stale():
+    """Start a fresh StaleMarker for the current task and the tasks it spawns."""
+    marker = StaleMarker()
+    _stale.set(marker)
+    return marker
+
+
+def stale_age():
+    """Seconds since the oldest stale value served to this command was fetched, or None."""
+    marker = _stale.get()
+    return None if marker is None else marker.age
+
+
+def mark_stale(age):
+    marker = _stale.get() or track_stale()
+    marker.age = age if marker.age is None else max(marker.age, age)
+
+
+def pending():
+    return _pending
+
+
+metrics.Gauge(
+    "bot_market_data_calls", "Market-data pool calls by outcome",
+    labels=("outcome",), fn=lambda: {(k, ): v for k, v in stats.items()},
+)
+metrics.Gauge(
+    "bot_market_data_pending", "Market-data calls running or queued", fn=lambda: {(): _pending},
+)
+metrics.Gauge(
+    "bot_upstream_rate", "Current yfinance request rate allowed by the governor (per second)",
+    fn=lambda: {(): governor.rate},
+)
+metrics.Gauge(
+    "bot_upstream_circuit_open", "1 while the yfinance circuit breaker is open or half-open",
+    fn=lambda: {(): int(governor.state != "closed")},
+)
+
+
+def _call_name(func):
+    return getattr(func, "__name__", "call").removeprefix("_fetch_").lstrip("_")
+
+
+def _timed(func, args, queued_at):
+    # Runs on the worker thread, so this is the upstream time without queueing
+    started = time.perf_counter()
+    metrics.UPSTREAM_QUEUE_WAIT.observe(started - queued_at, _call_name(func))
+    try:
+        return func(*args)
+    except Exception as e:
+        metrics.UPSTREAM_ERRORS.inc(_call_name(func), type(e).__name__)
+        raise
+    finally:
+        metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - started, _call_name(func))
+
+
+def _is_rate_limit(error):
+    response = getattr(error, "response", None)
+    return (
+        isinstance(error, YFRateLimitError)
+        or getattr(response, "status_code", None) == 429
+        or "Too Many Requests" in str(error)
+    )
+
+
+def _release(_future):
+    # Runs on the worker thread once the call really finishes (or is cancelled
+    # while still queued), so a timed-out call keeps its slot until it is done.
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+async def run_blocking(func, *args, timeout=DEFAULT_TIMEOUT):
+    """Run a blocking upstream call on the market-data pool and await its result.
+
+    The call first waits (within ``timeout``) for a token from the governor.
+    """
+    global _pending
+    with _lock:
+        if _pending >= MAX_PENDING:
+            stats["rejected"] += 1
+            raise MarketDataBusy(f"market data queue is full ({_pending} pending)")
+        _pending += 1
+        stats["submitted"] += 1
+
+    queued_at = time.perf_counter()
+    probe = False
+    try:
+        probe = await asyncio.wait_for(governor.acquire(), timeout)
+        future = _executor.submit(_timed, func, args, queued_at)
+    except (CircuitOpen, asyncio.TimeoutError) as e:
+        # No token, so nothing was sent and there is no outcome to report
+        _release(None)
+        stats["throttled"] += 1
+        raise MarketDataUnavailable(str(e) or "rate limited: no request slot within the timeout") from None
+    except BaseException:
+        _release(None)
+        governor.failed(probe)
+        raise
+    future.add_done_callback(_release)
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except asyncio.TimeoutError:
+        governor.failed(probe)
+        stats["timed_out"] += 1
+        metrics.UPSTREAM_ERRORS.inc(_call_name(func), "Timeout")
+        name = getattr(func, "__name__", repr(func))
+        logging.warning(f"[market_data] {name}{args} timed out after {timeout}s")
+        raise MarketDataTimeout(f"{name} timed out after {timeout}s") from None
+    except asyncio.CancelledError:
+        governor.failed(probe)
+        raise
+    except Exception as e:
+        stats["failed"] += 1
+        if _is_rate_limit(e):
+            governor.rate_limited(probe)
+            raise MarketDataUnavailable(str(e)) from e
+        governor.failed(probe)
+        raise
+    governor.succeeded()
+    stats["completed"] += 1
+    return result
+
+
+# ----- Blocking fetchers (run on the pool) -----
+
+# Each fetcher makes a single upstream request, so the one governor token that
+# run_blocking takes for it is the whole cost; multi-step loads chain several
+# run_blocking calls instead. Empty answers raise NoData rather than returning
+# an empty frame, which would otherwise count as a success.
+
+def _last_close(symbol, frame):
+    close = frame["Close"].dropna() if "Close" in frame else frame
+    if close.empty:
+        raise NoData(f"no prices for {symbol}")
+    return float(close.iloc[-1])
+
+
+def _fetch_price(symbol):
+    price = yf.Ticker(symbol).fast_info.get("lastPrice")
+    return None if price is None else float(price)
+
+
+def _fetch_intraday_price(symbol):
+    return _last_close(symbol, yf.Ticker(symbol).history(period="1d", interval="1m"))
+
+
+def _fetch_close(symbol):
+    # The latest daily close is the current (delayed) price while the market is open
+    return _last_close(symbol, yf.Ticker(symbol).history(period="5d", interval="1d"))
+
+
+def _fetch_info(symbol):
+    return yf.Ticker(symbol).info
+
+
+def _fetch_history(symbol, period, interval):
+    return yf.Ticker(symbol).history(period=period, interval=interval)
+
+
+def _rescaled(frame, reference):
+    # True when `frame` (a fresh download) has the stored reference bar at a
+    # different close, i.e. Yahoo adjusted the history for a split or dividend
+    if reference is None or reference[1] is None or frame.empty:
+        return False
+    date, stored = reference
+    closes = frame["Close"][frame.index.strftime("%Y-%m-%d") == date].dropna()
+    return not closes.empty and abs(float(closes.iloc[0]) / stored - 1) > HISTORY_RESCALE_TOLERANCE
+
+
+def _stored_history(symbol):
+    start = datetime.date.today() - datetime.timedelta(days=HISTORY_LOOKBACK_DAYS)
+    return history_store.read(symbol, start.isoformat())
+
+
+def _top_up_history(symbol):
+    # The bars from the reference bar on, which also re-fetches the last stored
+    # day in case it was saved as a partial bar. None when the symbol needs a
+    # full backfill instead (nothing stored yet, or re-adjusted upstream).
+    reference = history_store.reference_bar(symbol)
+    if reference is None:
+        return None
+    frame = yf.Ticker(symbol).history(start=reference[0], interval="1d")
+    if frame.empty:
+        raise NoData(f"no daily bars for {symbol}")
+    if _rescaled(frame, reference):
+        logging.info(f"[market_data] {symbol} history was re-adjusted upstream; reloading it")
+        return None
+    history_store.upsert(symbol, frame)
+    return _stored_history(symbol)
+
+
+def _backfill_history(symbol):
+    frame = yf.Ticker(symbol).history(period=HISTORY_BACKFILL, interval="1d")
+    if frame.empty:
+        raise NoData(f"no daily bars for {symbol}")
+    history_store.delete(symbol)
+    history_store.upsert(symbol, frame)
+    return _stored_history(symbol)
+
+
+def _fetch_recommendations(symbol):
+    return yf.Ticker(symbol).recommendations
+
+
+def _news_item(raw):
+    # yfinance has returned two shapes: flat {"title", "link", "publisher",
+    # "providerPublishTime"} and, since late 2024, {"content": {"title",
+    # "canonicalUrl": {"url"}, "provider": {"displayName"}, "pubDate"}}
+    content = raw.get("content") or raw
+    url = (
+        (content.get("canonicalUrl") or {}).get("url")
+        or (content.get("clickThroughUrl") or {}).get("url")
+        or content.get("link")
+    )
+    title = content.get("title")
+    if not url or not title:
+        return None
+    published = content.get("providerPublishTime")
+    if published is None and content.get("pubDate"):
+        try:
+            published = datetime.datetime.fromisoformat(content["pubDate"].replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return {
+        "title": title,
+        "url": url,
+        "publisher": (content.get("provider") or {}).get("displayName") or content.get("publisher"),
+        "published": published,
+    }
+
+
+def _fetch_news(symbol):
+    # Normalised and de-duplicated by URL (syndicated stories repeat)
+    items = {}
+    for raw in yf.Ticker(symbol).news or []:
+        item = _news_item(raw)
+        if item is not None:
+            items.setdefault(item["url"], item)
+    return list(items.values())
+
+
+# ----- Async API used by the command handlers -----
+
+_remote = None
+
+
+def _remote_client():
+    global _remote
+    if _remote is None:
+        from market_data_service import MarketDataClient
+        _remote = MarketDataClient(MARKET_DATA_SOCKET)
+    return _remote
+
+
+def _shared(func):
+    """Send calls to the market-data service when MARKET_DATA_SOCKET is set.
+
+    The undecorated coroutine stays available as ``func.local``; that is what
+    the service itself runs.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not MARKET_DATA_SOCKET:
+            return await func(*args, **kwargs)
+        return await _remote_client().call(func.__name__, *args, **kwargs)
+
+    wrapper.local = func
+    return wrapper
+
+
+async def _fetch_each(name, load, symbols):
+    """``{symbol: await load(symbol)}``, FANOUT symbols at a time.
+
+    ``load`` goes through run_blocking, so every upstream request takes its
+    own governor token and timeout and a long list costs time, not timeouts.
+    Symbols that failed are left out; if every one failed, the first error is
+    raised instead. Several symbols all coming back empty is how a throttled
+    Yahoo looks, so that is reported to the governor as rate limiting.
+    """
+    limiter = asyncio.Semaphore(FANOUT)
+
+    async def one(symbol):
+        async with limiter:
+            return await load(symbol)
+
+    results = await asyncio.gather(*(one(symbol) for symbol in symbols), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors and len(errors) == len(results):
+        if len(results) > 1 and all(isinstance(e, NoData) for e in errors):
+            governor.rate_limited()
+            raise MarketDataUnavailable(f"no data for any of {len(results)} symbols") from errors[0]
+        raise errors[0]
+    if errors:
+        logging.warning(f"[market_data] {name} failed for {len(errors)}/{len(results)} symbols: {errors[0]}")
+    return {s: r for s, r in zip(symbols, results) if not isinstance(r, BaseException)}
+
+
+async def _load_price(symbol):
+    price = await run_blocking(_fetch_price, symbol)
+    if price is None:
+        price = await run_blocking(_fetch_intraday_price, symbol)
+    return price
+
+
+async def _load_close(symbol):
+    return await run_blocking(_fetch_close, symbol)
+
+
+async def _sync_history(symbol):
+    frame = await run_blocking(_top_up_history, symbol)
+    if frame is None:
+        frame = await run_blocking(_backfill_history, symbol)
+    return frame
+
+
+async def _cached(cache, key, fetch):
+    # get_or_fetch, falling back to the expired entry while we are rate limited
+    try:
+        return await cache.get_or_fetch(key, fetch)
+    except MarketDataUnavailable:
+        value, age = cache.get_stale(key)
+        if value is None:
+            raise
+        mark_stale(age)
+        return value
+
+
+@_shared
+async def get_price(symbol):
+    return await _cached(quote_cache, symbol, lambda: _load_price(symbol))
+
+
+@_shared
+async def get_prices(symbols):
+    """Prices for several symbols: cached ones for free, the rest fetched side by side.
+
+    Returns ``{symbol: price or None}`` in the order given. While rate limited,
+    symbols that could not be loaded fall back to their expired cached price.
+    """
+    prices = await quote_cache.get_many_or_fetch(
+        symbols, lambda missing: _fetch_each("prices", _load_close, missing)
+    )
+    if governor.throttled():
+        for symbol, price in prices.items():
+            if price is None:
+                price, age = quote_cache.get_stale(symbol)
+                if price is not None:
+                    prices[symbol] = price
+                    mark_stale(age)
+    return prices
+
+
+@_shared
+async def get_info(symbol):
+    # One shared snapshot for info/volume/rating/summary/action
+    return await _cached(info_cache, symbol, lambda: run_blocking(_fetch_info, symbol))
+
+
+@_shared
+async def get_history(symbol, period="1mo", interval="1d"):
+    return await run_blocking(_fetch_history, symbol, period, interval)
+
+
+@_shared
+async def get_daily_history(symbol):
+    """Daily OHLCV bars for roughly the last year, served from the local store."""
+    return await _cached(history_cache, symbol, lambda: _sync_history(symbol))
+
+
+@_shared
+async def get_daily_histories(symbols):
+    """get_daily_history for many symbols, the uncached ones topped up side by side.
+
+    Returns ``{symbol: frame or None}`` in the order given.
+    """
+    return await history_cache.get_many_or_fetch(
+        symbols, lambda missing: _fetch_each("daily histories", _sync_history, missing)
+    )
+
+
+@_shared
+async def get_recommendations(symbol):
+    return await run_blocking(_fetch_recommendations, symbol)
+
+
+@_shared
+async def get_news(symbol, refresh=False):
+    """Headlines for ``symbol`` as ``[{"title", "url", "publisher", "published"}]``.
+
+    ``refresh`` fetches even when the cached list is still fresh (prefetch).
+    """
+    if refresh:
+        items = await run_blocking(_fetch_news, symbol)
+        news_cache.set(symbol, items)
+        return items
+    return await _cached(news_cache, symbol, lambda: run_blocking(_fetch_news, symbol))
+
+
+def use_quote_stream(stream):
+    """Serve the get_live_* calls of this process from ``stream``."""
+    global _quotes
+    _quotes = stream
+
+
+@_shared
+async def get_live_price(symbol):
+    """get_price, answered from the quote stream when it has a recent tick."""
+    if _quotes is None or not _quotes.enabled:
+        return await get_price.local(symbol)
+    return await _quotes.get_price(symbol)
+
+
+@_shared
+async def get_live_prices(symbols):
+    """get_prices, answered from the quote stream where it can."""
+    if _quotes is None or not _quotes.enabled:
+        return await get_prices.local(symbols)
+    return await _quotes.get_prices(symbols)
+
+
+@_shared
+async def subscribe_live(symbols):
+    """Start streaming ``symbols`` ahead of their first request."""
+    if _quotes is not None:
+        _quotes.subscribe(symbols)
+
+
+@_shared
+async def get_session(symbol):
+    """Times and prices streamed for ``symbol``'s latest trading day, or None when streaming is off.
+
+    Also subscribes ``symbol``, so a first request starts collecting ticks.
+    """
+    if _quotes is None or not _quotes.enabled:
+        return None
+    session = _quotes.session(symbol)
+    _quotes.subscribe([symbol])
+    return session
@@ -0,0 +1,227 @@
+import os
+import pickle
+import signal
+import struct
+import asyncio
+import logging
+import itertools
+
+import market_data
+import quote_stream
+from health import start_metrics_server
+from market_data import MarketDataError, MarketDataBusy, MarketDataTimeout, MarketDataUnavailable
+
+# One process that owns the market-data caches and the yfinance thread pool,
+# shared by every bot process of a sharded deployment (see shards.py). Bot
+# processes talk to it over a Unix socket with length-prefixed pickle frames:
+#
+#   request:  (request_id, call, args, kwargs)
+#   response: (request_id, True, result, stale_age)  or  (request_id, False, (error_type, message), None)
+#
+# stale_age is set when the service answered from expired cache entries while
+# rate limited; the client marks its own task stale the same way.
+#
+# The socket is created owner-only (0600); only processes of the same user can
+# connect, which is what makes pickle acceptable here.
+
+SOCKET_PATH = os.getenv("MARKET_DATA_SOCKET") or "market_data.sock"
+CALLS = frozenset({
+    "get_price", "get_prices", "get_info", "get_history",
+    "get_daily_history", "get_daily_histories", "get_recommendations", "get_news",
+    "get_live_price", "get_live_prices", "subscribe_live", "get_session",
+})
+# Slack on top of the service's own upstream timeout before a client gives up
+CLIENT_TIMEOUT = market_data.DEFAULT_TIMEOUT + 5
+# /metrics (cache hits, upstream calls, governor state) for the whole
+# deployment's market data; 0 disables it
+METRICS_PORT = int(os.getenv("MARKET_DATA_METRICS_PORT", "9100"))
+# Bulk calls make one upstream request per symbol, so a client waits longer for them
+CALL_TIMEOUTS = {
+    name: market_data.HISTORY_BATCH_TIMEOUT + 5
+    for name in ("get_prices", "get_live_prices", "get_daily_histories")
+}
+
+_header = struct.Struct("!I")
+_errors = {
+    cls.__name__: cls
+    for cls in (MarketDataError, MarketDataBusy, MarketDataTimeout, MarketDataUnavailable)
+}
+
+
+async def _read_frame(reader):
+    (size,) = _header.unpack(await reader.readexactly(_header.size))
+    return pickle.loads(await reader.readexactly(size))
+
+
+def _frame(obj):
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    return _header.pack(len(data)) + data
+
+
+class MarketDataServer:
+    """Serves the market_data API to other processes.
+
+    Each request runs as its own task, so one slow symbol does not hold up the
+    rest of a connection, and all of them go through this process's caches:
+    N bot processes asking for the same quote cost one upstream fetch.
+    """
+
+    def __init__(self, path=SOCKET_PATH):
+        self.path = path
+        self._server = None
+        self._connections = {}  # handler task -> its writer
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left over from a previous run
+        old_umask = os.umask(0o177)
+        try:
+            self._server = await asyncio.start_unix_server(self._handle, self.path)
+        finally:
+            os.umask(old_umask)
+        logging.info(f"[market_data_service] Listening on {self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in self._connections.values():
+                writer.close()
+            # Closing the writers ends each handler's read loop; let them finish
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                request_id, call, args, kwargs = await _read_frame(reader)
+                task = asyncio.create_task(self._answer(writer, lock, request_id, call, args, kwargs))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # client went away
+        except Exception as e:
+            logging.warning(f"[market_data_service] Dropping connection: {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def _answer(self, writer, lock, request_id, call, args, kwargs):
+        market_data.track_stale()  # this request's own marker
+        try:
+            if call not in CALLS:
+                raise MarketDataError(f"unknown call {call!r}")
+            result = await getattr(market_data, call).local(*args, **kwargs)
+            frame = _frame((request_id, True, result, market_data.stale_age()))
+        except Exception as e:
+            frame = _frame((request_id, False, (type(e).__name__, str(e)), None))
+        async with lock:
+            try:
+                writer.write(frame)
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+
+class MarketDataClient:
+    """Calls a MarketDataServer; used by market_data when MARKET_DATA_SOCKET is set.
+
+    Requests are pipelined over one connection and matched to their responses
+    by id. The connection is opened on first use and re-opened after the
+    service restarts. Failures surface as MarketDataError (or its subclasses),
+    like local fetches do.
+    """
+
+    def __init__(self, path=SOCKET_PATH, timeout=CLIENT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._ids = itertools.count()
+        self._waiting = {}  # request_id -> Future
+        self._writer = None
+        self._reader_task = None
+        self._connect_lock = asyncio.Lock()
+
+    async def _connection(self):
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                try:
+                    reader, self._writer = await asyncio.open_unix_connection(self.path)
+                except OSError as e:
+                    raise MarketDataError(f"market data service unavailable: {e}") from None
+                self._reader_task = asyncio.create_task(self._read_responses(reader, self._writer))
+            return self._writer
+
+    async def _read_responses(self, reader, writer):
+        try:
+            while True:
+                request_id, ok, payload, stale = await _read_frame(reader)
+                future = self._waiting.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((ok, payload, stale))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logging.warning(f"[market_data_service] Bad response stream: {e}")
+        finally:
+            writer.close()
+            if self._writer is writer:  # not already replaced by a newer connection
+                self._writer = None
+                waiting, self._waiting = self._waiting, {}
+                for future in waiting.values():
+                    if not future.done():
+                        future.set_exception(MarketDataError("market data service disconnected"))
+
+    async def call(self, name, *args, **kwargs):
+        writer = await self._connection()
+        request_id = next(self._ids)
+        timeout = max(self.timeout, CALL_TIMEOUTS.get(name, 0))
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        try:
+            writer.write(_frame((request_id, name, args, kwargs)))
+            await writer.drain()
+            ok, payload, stale = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise MarketDataTimeout(f"{name} timed out after {timeout}s") from None
+        except ConnectionError as e:
+            raise MarketDataError(f"market data service unavailable: {e}") from None
+        finally:
+            self._waiting.pop(request_id, None)
+        if ok:
+            if stale is not None:
+                market_data.mark_stale(stale)
+            return payload
+        error, message = payload
+        raise _errors.get(error, MarketDataError)(message if error in _errors else f"{error}: {message}")
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO)
+    # Exit cleanly on SIGTERM too, so atexit still snapshots the info cache
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    # The deployment's only quote feed; bots read it through get_live_*
+    quotes = quote_stream.from_env()
+    market_data.use_quote_stream(quotes)
+    quotes.start()
+    server = MarketDataServer()
+    await server.start()
+    metrics_server = await start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+    await stop.wait()
+    quotes.stop()
+    await server.stop()
+    if metrics_server is not None:
+        await metrics_server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+import os
+import json
+import random
+from array import array
+
+
+class MemeStore:
+    """Append-only meme log: one JSON string per line in ``path``.
+
+    Keeps the byte offset of every line and a set of every meme seen, so a
+    submission is one appended line, a duplicate is rejected in O(1), and a
+    random pick reads a single line instead of building the whole list.
+    """
+
+    def __init__(self, path, defaults=(), legacy_json=None):
+        self.path = path
+        self.defaults = list(defaults)
+        self._offsets = array("q")
+        self._seen = set(self.defaults)
+        if legacy_json and not os.path.exists(path):
+            self._import_json(legacy_json)
+        self._load()
+
+    def _import_json(self, legacy_json):
+        # One-off migration from the old memes.json list
+        if not os.path.exists(legacy_json):
+            return
+        with open(legacy_json, "r") as f:
+            memes = json.load(f)
+        with open(self.path, "w") as f:
+            for meme in dict.fromkeys(memes):
+                f.write(json.dumps(meme) + "\n")
+        os.replace(legacy_json, legacy_json + ".migrated")
+
+    def _load(self):
+        with open(self.path, "ab+") as f:
+            f.seek(0)
+            offset = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A crash mid-append left half a line; drop it
+                    f.truncate(offset)
+                    break
+                self._offsets.append(offset)
+                self._seen.add(json.loads(line))
+                offset += len(line)
+
+    def __len__(self):
+        return len(self.defaults) + len(self._offsets)
+
+    def add(self, meme):
+        """Append ``meme``. Returns False if it was already submitted."""
+        if meme in self._seen:
+            return False
+        line = (json.dumps(meme) + "\n").encode()
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+        self._offsets.append(offset)
+        self._seen.add(meme)
+        return True
+
+    def random(self):
+        if not len(self):
+            return None
+        i = random.randrange(len(self))
+        if i < len(self.defaults):
+            return self.defaults[i]
+        with open(self.path, "rb") as f:
+            f.seek(self._offsets[i - len(self.defaults)])
+            return json.loads(f.readline())
+
+    def reset(self):
+        """Forget every submitted meme (the defaults stay)."""
+        open(self.path, "w").close()
+        self._offsets = array("q")
+        self._seen = set(self.defaults)
@@ -0,0 +1,250 @@
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+
+import cache
+
+# Minimal Prometheus-style metrics. Values are updated from the event loop and
+# the market-data threads and rendered from the keep-alive web server thread,
+# so every family guards its samples with a lock.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_registry = []
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _value(v):
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return "NaN"
+    if isinstance(v, float) and math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _quantile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _Family:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._samples = {}
+        _registry.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._samples[labelvalues] = self._samples.get(labelvalues, 0) + amount
+
+    def render(self):
+        with self._lock:
+            samples = list(self._samples.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, lv)} {_value(v)}" for lv, v in samples
+        ]
+
+
+class Gauge(_Family):
+    """A gauge that is either set directly or read from ``fn`` at render time.
+
+    ``fn`` returns ``{labelvalues_tuple: value}``.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._samples[labelvalues] = value
+
+    def render(self):
+        if self.fn is not None:
+            samples = list(self.fn().items())
+        else:
+            with self._lock:
+                samples = list(self._samples.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, lv)} {_value(v)}" for lv, v in samples
+        ]
+
+
+class Histogram(_Family):
+    """Cumulative-bucket histogram.
+
+    Alongside the buckets it keeps the last ``window`` observations per label
+    set and exports their p50/p95/p99 as ``<name>_recent`` (a summary), so the
+    tail latency is readable without a Prometheus server doing the maths.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, window=1024):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.window = window
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            sample = self._samples.get(labelvalues)
+            if sample is None:
+                sample = self._samples[labelvalues] = {
+                    "buckets": [0] * len(self.buckets),
+                    "sum": 0.0,
+                    "count": 0,
+                    "recent": deque(maxlen=self.window),
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample["buckets"][i] += 1
+                    break
+            sample["sum"] += value
+            sample["count"] += 1
+            sample["recent"].append(value)
+
+    def render(self):
+        with self._lock:
+            samples = [
+                (lv, list(s["buckets"]), s["sum"], s["count"], sorted(s["recent"]))
+                for lv, s in self._samples.items()
+            ]
+        lines = self.header()
+        summary = [
+            f"# HELP {self.name}_recent {self.help} (last {self.window} observations)",
+            f"# TYPE {self.name}_recent summary",
+        ]
+        for lv, buckets, total, count, recent in samples:
+            cumulative = 0
+            for bound, n in zip(self.buckets, buckets):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, lv, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, lv, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, lv)} {_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, lv)} {count}")
+            for q in QUANTILES:
+                summary.append(
+                    f"{self.name}_recent{_labels(self.labelnames, lv, [('quantile', q)])} {_value(_quantile(recent, q))}"
+                )
+        return lines + summary
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for family in list(_registry):
+        lines.extend(family.render())
+    return "\n".join(lines) + "\n"
+
+
+# ----- Bot instrumentation -----
+
+COMMANDS = Counter(
+    "bot_commands_total", "Commands invoked", labels=("bot", "command", "status")
+)
+COMMAND_LATENCY = Histogram(
+    "bot_command_duration_seconds", "Command handler latency", labels=("bot", "command")
+)
+UPSTREAM_LATENCY = Histogram(
+    "bot_upstream_fetch_seconds", "Upstream (yfinance) call latency", labels=("call",)
+)
+UPSTREAM_ERRORS = Counter(
+    "bot_upstream_errors_total", "Upstream (yfinance) call failures", labels=("call", "error")
+)
+UPSTREAM_QUEUE_WAIT = Histogram(
+    "bot_upstream_queue_wait_seconds",
+    "Time an upstream (yfinance) call waited for the rate limiter and a worker thread",
+    labels=("call",),
+)
+LOOP_LAG = Histogram(
+    "bot_event_loop_lag_seconds", "How late the event loop woke a sleeping task",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+Gauge(
+    "bot_cache_hit_ratio", "Fraction of cache lookups served without a new fetch",
+    labels=("cache",),
+    fn=lambda: {(name, ): c.stats()["hit_ratio"] for name, c in list(cache.caches.items())},
+)
+Gauge(
+    "bot_cache_entries", "Entries currently held per cache",
+    labels=("cache",),
+    fn=lambda: {(name, ): len(c) for name, c in list(cache.caches.items())},
+)
+
+_bots = {}  # name -> commands.Bot, for the gateway latency gauge
+Gauge(
+    "bot_gateway_latency_seconds", "Discord gateway heartbeat latency (bot.latency)",
+    labels=("bot",),
+    fn=lambda: {(name, ): bot.latency for name, bot in list(_bots.items())},
+)
+
+_loop_monitor = None
+
+
+async def _monitor_loop(interval):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+def start_loop_monitor(interval=0.5):
+    global _loop_monitor
+    if _loop_monitor is None or _loop_monitor.done():
+        _loop_monitor = asyncio.create_task(_monitor_loop(interval))
+
+
+def instrument_bot(bot, name):
+    """Time every command ``bot`` runs and report its gateway latency.
+
+    Wraps ``bot.invoke`` so the measurement covers checks, argument conversion
+    and the handler itself.
+    """
+    _bots[name] = bot
+    invoke = bot.invoke
+
+    async def timed_invoke(ctx):
+        started = time.perf_counter()
+        try:
+            await invoke(ctx)
+        finally:
+            if ctx.command is not None:
+                command = ctx.command.qualified_name
+                status = "error" if ctx.command_failed else "ok"
+                COMMANDS.inc(name, command, status)
+                COMMAND_LATENCY.observe(time.perf_counter() - started, name, command)
+
+    async def on_ready():
+        start_loop_monitor()
+
+    bot.invoke = timed_invoke
+    bot.add_listener(on_ready, "on_ready")
+    return bot
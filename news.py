@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+from collections import Counter
+
+import market_data
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS news_subscriptions (
+    channel_id INTEGER NOT NULL,
+    symbol     TEXT NOT NULL,
+    PRIMARY KEY (channel_id, symbol)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS news_subscriptions_symbol ON news_subscriptions (symbol);
+CREATE TABLE IF NOT EXISTS news_seen (
+    symbol  TEXT NOT NULL,
+    url     TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (symbol, url)
+) WITHOUT ROWID;
+"""
+
+
+class NewsFeed:
+    """Keeps headlines for popular symbols warm and posts new ones to subscribers.
+
+    Every ``interval`` seconds the most requested symbols (``top``, counted
+    with decay, so "popular" means recently popular) and every subscribed
+    symbol are re-fetched into market_data's news cache. For subscribed
+    symbols, headlines whose URL has not been seen before are handed to
+    ``send(channel_id, symbol, items)``. The first fetch after a subscription
+    only records what is there, so subscribing does not replay old news.
+
+    Subscriptions and the seen URLs live in SQLite, shared by every bot
+    process. Only the feed built with ``poster=True`` fetches the subscribed
+    symbols (bypassing the cache, to catch new headlines) and posts. Popular
+    symbols are prefetched through the cache, so with the shared
+    market_data_service several processes asking for one symbol cost one
+    upstream request per NEWS_TTL.
+    """
+
+    def __init__(self, path, send, interval=300, top=20, max_per_channel=10, seen_per_symbol=200, poster=True):
+        self.path = path
+        self.send = send
+        self.interval = interval
+        self.top = top
+        self.max_per_channel = max_per_channel
+        self.seen_per_symbol = seen_per_symbol
+        self.poster = poster
+        self.demand = Counter()  # symbol -> decayed request count
+        self._task = None
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def import_json(self, path):
+        """Merge a file from the old JSON store (channels and seen URLs), then set it aside."""
+        with open(path, "r") as f:
+            data = json.load(f)
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO news_subscriptions VALUES (?, ?)",
+                [(channel_id, symbol) for symbol, channels in data.get("channels", {}).items()
+                 for channel_id in channels],
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO news_seen VALUES (?, ?, ?)",
+                [(symbol, url, now + i * 1e-6) for symbol, urls in data.get("seen", {}).items()
+                 for i, url in enumerate(urls)],
+            )
+        os.replace(path, path + ".imported")
+        logging.info(f"[news] Imported subscriptions from {path}")
+
+    def requested(self, symbol):
+        self.demand[symbol] += 1
+
+    def subscriptions(self, channel_id):
+        rows = self._conn.execute(
+            "SELECT symbol FROM news_subscriptions WHERE channel_id = ? ORDER BY symbol", (channel_id,)
+        ).fetchall()
+        return [symbol for (symbol,) in rows]
+
+    def subscribed(self):
+        """Every symbol at least one channel follows."""
+        return sorted(symbol for (symbol,) in self._conn.execute("SELECT DISTINCT symbol FROM news_subscriptions"))
+
+    def channels(self, symbol):
+        rows = self._conn.execute("SELECT channel_id FROM news_subscriptions WHERE symbol = ?", (symbol,)).fetchall()
+        return [channel_id for (channel_id,) in rows]
+
+    def subscribe(self, channel_id, symbol):
+        """Returns False if already subscribed or the channel is at its limit."""
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO news_subscriptions (channel_id, symbol) "
+                "SELECT ?, ? WHERE (SELECT COUNT(*) FROM news_subscriptions WHERE channel_id = ?) < ?",
+                (channel_id, symbol, channel_id, self.max_per_channel),
+            )
+        return cursor.rowcount == 1
+
+    def unsubscribe(self, channel_id, symbol):
+        with self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM news_subscriptions WHERE channel_id = ? AND symbol = ?", (channel_id, symbol)
+            )
+            # Forget the seen URLs once no channel follows the symbol
+            self._conn.execute(
+                "DELETE FROM news_seen WHERE symbol = ? "
+                "AND NOT EXISTS (SELECT 1 FROM news_subscriptions WHERE symbol = ?)",
+                (symbol, symbol),
+            )
+        return cursor.rowcount == 1
+
+    def fresh_items(self, symbol, items):
+        """The items not seen before for ``symbol``, remembering them as seen."""
+        known = {url for (url,) in self._conn.execute("SELECT url FROM news_seen WHERE symbol = ?", (symbol,))}
+        new = [item for item in items if item["url"] not in known]
+        if not new:
+            return []
+        # Yahoo lists newest first; record them oldest first
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO news_seen VALUES (?, ?, ?)",
+                [(symbol, item["url"], now + i * 1e-6) for i, item in enumerate(reversed(new))],
+            )
+            self._conn.execute(
+                "DELETE FROM news_seen WHERE symbol = ? AND url NOT IN "
+                "(SELECT url FROM news_seen WHERE symbol = ? ORDER BY seen_at DESC LIMIT ?)",
+                (symbol, symbol, self.seen_per_symbol),
+            )
+        return new if known else []
+
+    async def refresh(self):
+        popular = [s for s, _ in self.demand.most_common(self.top)]
+        # Halve the counts every round, so old interest fades out
+        self.demand = Counter({s: n // 2 for s, n in self.demand.items() if n > 1})
+        subscribed = self.subscribed() if self.poster else []
+        for symbol in dict.fromkeys(subscribed + popular):
+            try:
+                items = await market_data.get_news(symbol, refresh=symbol in subscribed)
+            except Exception as e:
+                logging.warning(f"[news] Prefetch failed for {symbol}: {e}")
+                continue
+            if symbol not in subscribed:
+                continue
+            new = self.fresh_items(symbol, items)
+            if not new:
+                continue
+            for channel_id in self.channels(symbol):
+                try:
+                    await self.send(channel_id, symbol, new)
+                except Exception as e:
+                    logging.warning(f"[news] Could not post {symbol} news to {channel_id}: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.warning(f"[news] Refresh failed: {e}")
+            await asyncio.sleep(self.interval)
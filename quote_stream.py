@@ -0,0 +1,356 @@
+import os
+import json
+import time
+import zlib
+import base64
+import random
+import asyncio
+import logging
+import datetime
+from collections import OrderedDict
+
+import numpy as np
+
+import market_data
+import metrics
+
+# Streaming quotes: one background consumer keeps a ring buffer of recent
+# ticks per subscribed symbol, so !price is answered from memory and !spark
+# can draw the session without fetching anything. Symbols are subscribed on
+# first use and the least recently used ones are dropped past the cap.
+#
+# The stream runs in the process that owns the market data (see
+# market_data.use_quote_stream); bots reach it through market_data.get_live_*,
+# so a sharded deployment opens one feed, in market_data_service.
+#
+# QUOTE_STREAM selects the feed: "yahoo" (Yahoo's streamer websocket),
+# "sim" (a local random walk, for development and benchmarks) or "off".
+
+QUOTE_STREAM = os.getenv("QUOTE_STREAM", "yahoo").lower()
+STREAM_MAX_SYMBOLS = int(os.getenv("STREAM_MAX_SYMBOLS", "300"))
+STREAM_MAX_AGE = float(os.getenv("STREAM_MAX_AGE", "120"))  # older ticks fall back to polling
+STREAM_RESOLUTION = float(os.getenv("STREAM_RESOLUTION", "60"))  # seconds per ring slot
+STREAM_CAPACITY = int(os.getenv("STREAM_CAPACITY", "1024"))  # slots per symbol (~17 h at 60 s)
+
+YAHOO_STREAM_URL = "wss://streamer.finance.yahoo.com/?version=2"
+SPARK_BLOCKS = "▁▂▃▄▅▆▇█"
+
+stats = {"ticks": 0, "served": 0, "fallback": 0, "reconnects": 0}
+
+
+class TickRing:
+    """Fixed-size ring buffer of (time, price) for one symbol.
+
+    Ticks within the same ``resolution`` bucket share one slot (the latest
+    wins), so the buffer holds ``capacity`` buckets however busy the symbol is.
+    """
+
+    __slots__ = ("times", "prices", "resolution", "count")
+
+    def __init__(self, capacity=STREAM_CAPACITY, resolution=STREAM_RESOLUTION):
+        self.times = np.zeros(capacity)
+        self.prices = np.zeros(capacity)
+        self.resolution = resolution
+        self.count = 0  # slots ever written
+
+    def append(self, ts, price):
+        capacity = self.times.size
+        if self.count:
+            last = (self.count - 1) % capacity
+            if ts < self.times[last]:
+                return  # out of order
+            if ts // self.resolution == self.times[last] // self.resolution:
+                self.times[last] = ts
+                self.prices[last] = price
+                return
+        i = self.count % capacity
+        self.times[i] = ts
+        self.prices[i] = price
+        self.count += 1
+
+    def latest(self):
+        """``(time, price)`` of the newest tick, or None."""
+        if not self.count:
+            return None
+        i = (self.count - 1) % self.times.size
+        return float(self.times[i]), float(self.prices[i])
+
+    def since(self, ts):
+        """Times and prices from ``ts`` on, oldest first."""
+        n = min(self.count, self.times.size)
+        order = (np.arange(self.count - n, self.count)) % self.times.size
+        times, prices = self.times[order], self.prices[order]
+        keep = times >= ts
+        return times[keep], prices[keep]
+
+
+# ----- Feeds -----
+
+class YahooFeed:
+    """Yahoo's streamer websocket (what yfinance.AsyncWebSocket talks to).
+
+    Messages are base64 protobufs, decoded with yfinance's PricingData.
+    Subscriptions are re-sent every 15 seconds, which Yahoo expects as a
+    heartbeat; if that fails the socket is closed. Reconnecting is left to
+    QuoteStream.
+    """
+
+    heartbeat = 15
+
+    def __init__(self, url=YAHOO_STREAM_URL):
+        self.url = url
+        self.symbols = set()
+        self._ws = None
+        self._heartbeat_task = None
+
+    async def connect(self):
+        from websockets.asyncio.client import connect
+
+        self._ws = await connect(self.url)
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def _heartbeat(self):
+        try:
+            while True:
+                await asyncio.sleep(self.heartbeat)
+                if self.symbols:
+                    await self._ws.send(json.dumps({"subscribe": sorted(self.symbols)}))
+        except Exception as e:
+            # Without the heartbeat Yahoo goes quiet; close the socket so
+            # ticks() ends and QuoteStream reconnects
+            logging.warning(f"[quote_stream] Heartbeat failed: {e}; dropping the connection")
+            await self._ws.close()
+
+    async def subscribe(self, symbols):
+        self.symbols.update(symbols)
+        await self._ws.send(json.dumps({"subscribe": list(symbols)}))
+
+    async def unsubscribe(self, symbols):
+        self.symbols.difference_update(symbols)
+        await self._ws.send(json.dumps({"unsubscribe": list(symbols)}))
+
+    async def ticks(self):
+        from yfinance.pricing_pb2 import PricingData
+
+        async for raw in self._ws:
+            data = PricingData()
+            data.ParseFromString(base64.b64decode(json.loads(raw).get("message", "")))
+            if data.id and data.price:
+                yield data.id, (data.time / 1000) if data.time else time.time(), float(data.price)
+
+    async def close(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+
+
+class SimulatedFeed:
+    """Random-walk ticks for every subscribed symbol, every ``interval`` seconds.
+
+    Starting prices are seeded by the symbol (or taken from ``prices``), so
+    runs are repeatable.
+    """
+
+    def __init__(self, interval=1.0, prices=None, seed=None):
+        self.interval = interval
+        self.prices = dict(prices or {})
+        self.symbols = set()
+        self._rng = random.Random(seed)
+
+    async def connect(self):
+        pass
+
+    async def subscribe(self, symbols):
+        for symbol in symbols:
+            self.prices.setdefault(symbol, 50 + zlib.crc32(symbol.encode()) % 400)
+        self.symbols.update(symbols)
+
+    async def unsubscribe(self, symbols):
+        self.symbols.difference_update(symbols)
+
+    async def ticks(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.time()
+            for symbol in list(self.symbols):
+                self.prices[symbol] *= 1 + self._rng.gauss(0, 0.001)
+                yield symbol, now, self.prices[symbol]
+
+    async def close(self):
+        pass
+
+
+FEEDS = {"yahoo": YahooFeed, "sim": SimulatedFeed}
+
+
+# ----- Stream -----
+
+class QuoteStream:
+    """Background consumer of a quote feed with one TickRing per symbol.
+
+    ``feed_factory`` builds a fresh feed for every (re)connection; None
+    disables streaming and every lookup falls through to market_data.
+    """
+
+    def __init__(self, feed_factory=None, max_symbols=STREAM_MAX_SYMBOLS, max_age=STREAM_MAX_AGE,
+                 capacity=STREAM_CAPACITY, resolution=STREAM_RESOLUTION, max_backoff=60):
+        self.feed_factory = feed_factory
+        self.max_symbols = max_symbols
+        self.max_age = max_age
+        self.capacity = capacity
+        self.resolution = resolution
+        self.max_backoff = max_backoff
+        self.rings = OrderedDict()  # symbol -> TickRing, least recently used first
+        self._feed = None  # the connected feed, if any
+        self._task = None
+
+    @property
+    def enabled(self):
+        return self.feed_factory is not None
+
+    @property
+    def connected(self):
+        return self._feed is not None
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def subscribe(self, symbols):
+        """Start streaming ``symbols`` (and mark them recently used)."""
+        if not self.enabled:
+            return
+        new = []
+        for symbol in symbols:
+            if symbol in self.rings:
+                self.rings.move_to_end(symbol)
+            else:
+                self.rings[symbol] = TickRing(self.capacity, self.resolution)
+                new.append(symbol)
+        evicted = []
+        while len(self.rings) > self.max_symbols:
+            evicted.append(self.rings.popitem(last=False)[0])
+        if self._feed is not None and (new or evicted):
+            asyncio.create_task(self._update(self._feed, new, evicted))
+
+    async def _update(self, feed, new, evicted):
+        try:
+            if evicted:
+                await feed.unsubscribe(evicted)
+            if new:
+                await feed.subscribe(new)
+        except Exception as e:
+            # The connection is going away; _run resubscribes everything
+            logging.warning(f"[quote_stream] Subscription update failed: {e}")
+
+    def on_tick(self, symbol, ts, price):
+        ring = self.rings.get(symbol)
+        if ring is not None:
+            ring.append(ts, price)
+            stats["ticks"] += 1
+
+    def price(self, symbol, now=None):
+        """The streamed price of ``symbol`` if its last tick is recent enough, else None."""
+        ring = self.rings.get(symbol)
+        latest = ring.latest() if ring is not None else None
+        if latest is None or (now or time.time()) - latest[0] > self.max_age:
+            return None
+        return latest[1]
+
+    async def get_price(self, symbol):
+        """Like market_data.get_price, answering from the stream where it can."""
+        price = self.price(symbol)
+        self.subscribe([symbol])
+        if price is not None:
+            stats["served"] += 1
+            return price
+        stats["fallback"] += 1
+        # .local: this process owns the market data, so never forward
+        return await market_data.get_price.local(symbol)
+
+    async def get_prices(self, symbols):
+        """Like market_data.get_prices, answering from the stream where it can.
+
+        Symbols not streamed yet are fetched as before and subscribed, so the
+        next request for them is served from memory.
+        """
+        now = time.time()
+        prices = {symbol: self.price(symbol, now) for symbol in symbols}
+        missing = [s for s, p in prices.items() if p is None]
+        stats["served"] += len(symbols) - len(missing)
+        self.subscribe(symbols)
+        if missing:
+            stats["fallback"] += len(missing)
+            prices.update(await market_data.get_prices.local(missing))
+        return prices
+
+    def session(self, symbol):
+        """Times and prices of the latest trading day streamed for ``symbol``."""
+        ring = self.rings.get(symbol)
+        latest = ring.latest() if ring is not None else None
+        if latest is None:
+            return np.empty(0), np.empty(0)
+        day = datetime.datetime.fromtimestamp(latest[0], market_data.MARKET_TZ).date()
+        start = datetime.datetime.combine(day, datetime.time(), market_data.MARKET_TZ)
+        return ring.since(start.timestamp())
+
+    async def _run(self):
+        backoff = 1
+        while True:
+            feed = self.feed_factory()
+            try:
+                await feed.connect()
+                if self.rings:
+                    await feed.subscribe(list(self.rings))
+                self._feed = feed
+                logging.info(f"[quote_stream] Connected; streaming {len(self.rings)} symbol(s)")
+                async for symbol, ts, price in feed.ticks():
+                    self.on_tick(symbol, ts, price)
+                    backoff = 1
+                logging.warning("[quote_stream] Feed closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"[quote_stream] Feed failed: {e}; reconnecting in {backoff}s")
+            finally:
+                self._feed = None
+                try:
+                    await feed.close()
+                except Exception:
+                    pass
+            stats["reconnects"] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+
+def from_env():
+    """A QuoteStream for the feed named by QUOTE_STREAM ("off" disables it)."""
+    factory = FEEDS.get(QUOTE_STREAM)
+    if factory is None and QUOTE_STREAM != "off":
+        logging.warning(f"[quote_stream] Unknown QUOTE_STREAM={QUOTE_STREAM!r}; streaming disabled")
+    return QuoteStream(factory)
+
+
+def sparkline(prices, width=40):
+    """Block-character sparkline of ``prices``, squeezed to at most ``width`` points."""
+    prices = np.asarray(prices, dtype=np.float64)
+    if prices.size > width:
+        # Last price of each of `width` equal chunks
+        ends = np.linspace(0, prices.size, width + 1).astype(int)[1:] - 1
+        prices = prices[ends]
+    low, high = prices.min(), prices.max()
+    if high == low:
+        return SPARK_BLOCKS[len(SPARK_BLOCKS) // 2] * prices.size
+    levels = ((prices - low) / (high - low) * (len(SPARK_BLOCKS) - 1)).round().astype(int)
+    return "".join(SPARK_BLOCKS[i] for i in levels)
+
+
+metrics.Gauge(
+    "bot_quote_stream_events", "Quote stream counters (ticks, served, fallback, reconnects)",
+    labels=("event",), fn=lambda: {(k, ): v for k, v in stats.items()},
+)
@@ -0,0 +1,59 @@
+import discord
+from discord.ext import commands
+
+
+class WrongChannel(commands.CheckFailure):
+    """Raised by the routing check when a command is used outside its channel."""
+
+    def __init__(self, command, notice=None):
+        super().__init__(f"{command} is not allowed in this channel")
+        self.command = command
+        self.notice = notice
+
+
+class ChannelRouter:
+    """Per-guild channel routing, applied as one global check.
+
+    ``routes`` maps a top-level command name (its subcommands follow it) to
+    the channel it is allowed in, given either as a channel ID or as a channel
+    name. Names are resolved to IDs once per guild and cached until a channel
+    in that guild is created, renamed or deleted, so the check itself is a
+    couple of dict lookups and an int compare.
+
+    ``notices`` optionally maps a command name to a message the error handler
+    can show when the command is used in the wrong channel.
+    """
+
+    def __init__(self, bot, routes, notices=None):
+        self.routes = dict(routes)
+        self.notices = dict(notices or {})
+        self._ids = {}  # guild_id -> {channel name: channel_id or None}
+        bot.add_check(self.check)
+        for event in ("on_guild_channel_create", "on_guild_channel_delete", "on_guild_channel_update"):
+            bot.add_listener(self._invalidate, event)
+
+    def resolve(self, guild, channel):
+        """Channel ID for ``channel`` (an ID or a name) in ``guild``, or None."""
+        if isinstance(channel, int):
+            return channel
+        cached = self._ids.setdefault(guild.id, {})
+        if channel not in cached:
+            found = discord.utils.get(guild.text_channels, name=channel)
+            cached[channel] = found.id if found else None
+        return cached[channel]
+
+    def get_channel(self, guild, channel):
+        channel_id = self.resolve(guild, channel)
+        return guild.get_channel(channel_id) if channel_id else None
+
+    async def _invalidate(self, channel, after=None):
+        self._ids.pop(channel.guild.id, None)
+
+    async def check(self, ctx):
+        command = ctx.command.root_parent or ctx.command
+        required = self.routes.get(command.name)
+        if required is None:
+            return True
+        if ctx.guild is not None and ctx.channel.id == self.resolve(ctx.guild, required):
+            return True
+        raise WrongChannel(command.name, self.notices.get(command.name))
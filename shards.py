@@ -0,0 +1,118 @@
+"""Run stockbot2 as several processes that split the Discord gateway shards.
+
+    python shards.py --workers 4 [--shards 8]
+
+Starts one market_data_service process (the shared quote/info/history cache,
+and the only process that calls Yahoo), then ``--workers`` copies of
+stockbot2.py. Worker i owns shards i, i + workers, i + 2*workers, ... and
+serves its health endpoints on HEALTH_PORT + i; the service serves
+/metrics on MARKET_DATA_METRICS_PORT. Crashed processes are
+restarted; SIGINT/SIGTERM stops everything.
+
+Watchlists, alerts and news subscriptions are SQLite files shared by every
+worker, so they follow the user across guilds, DMs and a change of
+``--workers``. Worker 0 runs the jobs that must run once: the digest
+build, watchlist price refresh, alert checks and news posts.
+"""
+import os
+import sys
+import signal
+import asyncio
+import argparse
+import logging
+
+from dotenv import load_dotenv
+
+SOCKET_PATH = os.path.abspath(os.getenv("MARKET_DATA_SOCKET") or "market_data.sock")
+BASE_PORT = int(os.getenv("HEALTH_PORT", os.getenv("PORT", "8080")))
+# Discord allows one IDENTIFY per 5 seconds (max_concurrency 1); each worker
+# identifies its shards one after another, so stagger the workers to match
+IDENTIFY_INTERVAL = 5.5
+RESTART_DELAY = 5
+
+
+def shard_ids(worker, workers, shards):
+    return list(range(worker, shards, workers))
+
+
+async def supervise(name, args, env, stopping):
+    """Run ``args`` until ``stopping`` is set, restarting it whenever it exits."""
+    while not stopping.is_set():
+        process = await asyncio.create_subprocess_exec(sys.executable, *args, env=env)
+        logging.info(f"[shards] Started {name} (pid {process.pid})")
+        waiter = asyncio.create_task(process.wait())
+        stopper = asyncio.create_task(stopping.wait())
+        await asyncio.wait({waiter, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        if stopping.is_set():
+            if process.returncode is None:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(waiter, 15)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await waiter
+            return
+        stopper.cancel()
+        logging.warning(f"[shards] {name} exited with {process.returncode}; restarting in {RESTART_DELAY}s")
+        try:
+            await asyncio.wait_for(stopping.wait(), RESTART_DELAY)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def wait_for_socket(path, timeout=30):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not os.path.exists(path):
+        if loop.time() > deadline:
+            raise RuntimeError(f"market data service did not create {path}")
+        await asyncio.sleep(0.1)
+
+
+async def main(workers, shards):
+    workers = min(workers, shards)  # a worker with no shards would claim all of them
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, MARKET_DATA_SOCKET=SOCKET_PATH)
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)  # so wait_for_socket sees the new one
+
+    tasks = [asyncio.create_task(supervise(
+        "market data service", [os.path.join(here, "market_data_service.py")], env, stopping
+    ))]
+    await wait_for_socket(SOCKET_PATH)
+
+    for worker in range(workers):
+        ids = shard_ids(worker, workers, shards)
+        worker_env = dict(
+            env,
+            SHARD_COUNT=str(shards),
+            SHARD_IDS=",".join(map(str, ids)),
+            WORKER_ID=str(worker),
+            HEALTH_PORT=str(BASE_PORT + worker),
+        )
+        tasks.append(asyncio.create_task(supervise(
+            f"worker {worker} (shards {ids})", [os.path.join(here, "stockbot2.py")], worker_env, stopping
+        )))
+        try:
+            await asyncio.wait_for(stopping.wait(), IDENTIFY_INTERVAL * len(ids))
+        except asyncio.TimeoutError:
+            pass
+
+    await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="bot processes (default: CPU count)")
+    parser.add_argument("--shards", type=int, default=0, help="total shard count (default: one per worker)")
+    options = parser.parse_args()
+    if not os.getenv("DISCORD_TOKEN"):
+        raise RuntimeError("Set DISCORD_TOKEN as an environment variable!")
+    asyncio.run(main(options.workers, options.shards or options.workers))
@@ -0,0 +1,47 @@
+from discord.ext import commands
+
+import market_data
+
+
+def _ago(seconds):
+    if seconds < 90:
+        return f"{seconds:.0f}s"
+    if seconds < 90 * 60:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+class StaleNoticeContext(commands.Context):
+    """Context that flags replies built from stale market data.
+
+    While Yahoo is rate limiting us, market_data serves expired cache entries
+    and records their age in the command's StaleMarker; the first message the
+    command sends afterwards gets a one-line notice.
+    """
+
+    _stale_noted = False
+
+    def __init__(self, **attrs):
+        super().__init__(**attrs)
+        # Built in the task that runs the command, so the marker is shared
+        # with every task the command gathers
+        self.stale = market_data.track_stale()
+
+    async def send(self, content=None, **kwargs):
+        age = self.stale.age
+        if age is not None and not self._stale_noted:
+            self._stale_noted = True
+            note = f"⏳ Yahoo is rate limiting us — this uses cached data from {_ago(age)} ago."
+            content = note if content is None else f"{content}\n-# {note}"
+        return await super().send(content, **kwargs)
+
+
+def install(bot):
+    """Make ``bot`` build a StaleNoticeContext for every command."""
+    get_context = bot.get_context
+
+    async def get_context_with_notice(origin, *, cls=StaleNoticeContext):
+        return await get_context(origin, cls=cls)
+
+    bot.get_context = get_context_with_notice
+    return bot
@@ -1,7 +1,7 @@
 import os
 import discord
 from discord.ext import commands
-import yfinance as yf
+import market_data
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -23,17 +23,9 @@ async def price(ctx, symbol: str):
     symbol = symbol.upper().strip()
 
     try:
-        ticker = yf.Ticker(symbol)
-
-        # Prefer fast_info → lastPrice (changes quickly, ~15‑min delay for US stocks)
-        price = ticker.fast_info.get("lastPrice")
-        if price is None:
-            # Fallback: grab the most recent close from the 1‑minute candle
-            price = (
-                ticker.history(period="1d", interval="1m")["Close"]
-                .dropna()
-                .iloc[-1]
-            )
+        # Shared quote cache: fast_info → lastPrice, falling back to the latest
+        # 1‑minute candle (~15‑min delay for US stocks)
+        price = await market_data.get_price(symbol)
 
         await ctx.send(f"**{symbol}** → ${price:,.2f}")
     except Exception as e:
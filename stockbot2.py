@@ -1,15 +1,24 @@
 import os
+import glob
 import logging
 import discord
 from discord.ext import commands
 from discord.ext.commands import cooldown, BucketType
-import yfinance as yf
 from dotenv import load_dotenv
 import datetime
-from keep_alive import keep_alive
-
-# Replit stay awake
-keep_alive()
+import asyncio
+import market_data
+import metrics
+import stale_notice
+from health import start_health_server
+import indicators
+import analysis
+import charts
+from digest import Digest
+import quote_stream
+from news import NewsFeed
+from watchlists import WatchlistStore, WatchlistRefresher
+from alerts import AlertEngine, parse_condition
 
 # Load environment variables
 load_dotenv()
@@ -21,31 +30,227 @@ logging.basicConfig(level=logging.INFO)
 intents = discord.Intents.default()
 intents.message_content = True
 
+# Sharded deployment: shards.py runs several copies of this file, each owning
+# SHARD_IDS out of SHARD_COUNT shards and numbered WORKER_ID
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = [int(s) for s in os.getenv("SHARD_IDS", "").split(",") if s]
+WORKER_ID = os.getenv("WORKER_ID", "")
+# The one process that runs the shared background jobs (digest build, alert
+# checks, news posts); user state itself is in SQLite files every worker shares
+PRIMARY = WORKER_ID in ("", "0")
+
+def import_legacy(pattern, load):
+    # Per-worker files from before the shared stores ("alerts.w1.db", ...)
+    # are merged once by the primary process and renamed to *.imported
+    if PRIMARY:
+        for path in sorted(glob.glob(pattern)):
+            load(path)
+
 # Create the bot instance
-bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(
+        command_prefix="!", intents=intents, help_command=None,
+        shard_count=SHARD_COUNT, shard_ids=SHARD_IDS or None,
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
+metrics.instrument_bot(bot, "stockbot2")  # command latency, gateway latency, loop lag
+stale_notice.install(bot)  # flag replies served from stale cache while rate limited
+
+# Per-user watchlists, refreshed in the background by the primary process
+WATCHLISTS_DB = os.getenv("WATCHLISTS_DB", "watchlists.db")
+watchlists = WatchlistStore(WATCHLISTS_DB, max_symbols=int(os.getenv("MAX_WATCH_SYMBOLS", "25")))
+import_legacy("watchlists*.json", watchlists.import_json)
+watch_refresher = WatchlistRefresher(watchlists)
+
+# Price / RSI alerts, delivered by DM
+ALERTS_DB = os.getenv("ALERTS_DB", "alerts.db")
+
+async def send_alert(alert):
+    user = bot.get_user(alert.user_id) or await bot.fetch_user(alert.user_id)
+    value = f"${alert.fired_value:,.2f}" if alert.metric == "price" else f"{alert.fired_value:.2f}"
+    await user.send(f"🔔 Alert {alert.describe()} triggered — now at **{value}**.")
+
+alert_engine = AlertEngine(ALERTS_DB, send_alert, max_per_user=int(os.getenv("MAX_ALERTS_PER_USER", "25")))
+import_legacy("alerts.w*.db", alert_engine.import_db)
+
+# Nightly RSI / moving-average table for popular symbols; one file shared by
+# every worker, built by worker 0 only
+market_digest = Digest(builder=PRIMARY)
+
+# Headline prefetch for popular symbols and `!news subscribe` channel posts
+NEWS_DB = os.getenv("NEWS_DB", "news.db")
+
+def news_lines(items, limit=3):
+    return "".join(f"• [{item['title']}]({item['url']})\n" for item in items[:limit])
+
+async def send_news(channel_id, symbol, items):
+    channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+    await channel.send(f"🗞️ **New {symbol} headlines**\n" + news_lines(items, limit=5))
+
+news_feed = NewsFeed(NEWS_DB, send_news, interval=int(os.getenv("NEWS_PREFETCH_INTERVAL", "300")), poster=PRIMARY)
+import_legacy("news_subscriptions*.json", news_feed.import_json)
+
+# Streaming quotes for !price / !watchlist / !summary / !spark
+# (QUOTE_STREAM=yahoo|sim|off). When sharded, market_data_service runs the one
+# feed and the market_data.get_live_* calls go there.
+quotes = None
+if not market_data.MARKET_DATA_SOCKET:
+    quotes = quote_stream.from_env()
+    market_data.use_quote_stream(quotes)
+
+def digest_note(values):
+    return f"\n-# From the {values['as_of']} close"
 
 @bot.event
-async def on_ready():
-    print(f"✅  Logged in as {bot.user} (id={bot.user.id})")
+async def setup_hook():
+    # Replit stay awake + readiness probe, served from the bot's own loop
+    await start_health_server(bot)
+    if PRIMARY:
+        watch_refresher.start()
+        alert_engine.start()
+    market_digest.start()
+    if quotes is not None:
+        quotes.start()
+    try:
+        await market_data.subscribe_live(DEFAULT_WATCHLIST + sorted(watchlists.symbols()))
+    except Exception as e:
+        logging.warning(f"[quote_stream] Could not subscribe the watchlists: {e}")
+    news_feed.start()
 
-# Command: !price <TICKER>
+@bot.event
+async def on_ready():
+    shards = f" shards {sorted(bot.shards)}/{bot.shard_count}" if SHARD_COUNT else ""
+    print(f"✅  Logged in as {bot.user} (id={bot.user.id}){shards}")
+
+# Multi-symbol commands resolve at most this many symbols in one request
+MAX_BATCH_SYMBOLS = int(os.getenv("MAX_BATCH_SYMBOLS", "10"))
+DEFAULT_WATCHLIST = os.getenv(
+    "WATCHLIST", "SPY,QQQ,AAPL,MSFT,NVDA,AMZN,GOOGL,META,TSLA"
+).split(",")
+
+def parse_symbols(symbols):
+    # Upper-case and de-duplicate while keeping the order the user typed
+    seen = dict.fromkeys(s.upper().strip(" ,") for s in symbols)
+    return [s for s in seen if s][:MAX_BATCH_SYMBOLS]
+
+def quote_embed(title, prices, missing="⚠️ unavailable"):
+    lines = [
+        f"**{symbol}** → ${price:,.2f}" if price is not None else f"**{symbol}** → {missing}"
+        for symbol, price in prices.items()
+    ]
+    return discord.Embed(title=title, description="\n".join(lines), color=discord.Color.blue())
+
+# Command: !price <TICKER> [TICKER ...]
 @bot.command(name="price", aliases=["p"])
 @cooldown(rate=3, per=10, type=BucketType.user)
-async def price(ctx, symbol: str):
-    symbol = symbol.upper().strip()
+async def price(ctx, *symbols: str):
+    symbols = parse_symbols(symbols)
+    if not symbols:
+        await ctx.send("Usage: `!price <TICKER> [TICKER ...]`")
+        return
+    if len(symbols) == 1:
+        symbol = symbols[0]
+        try:
+            price = await market_data.get_live_price(symbol)
+            await ctx.send(f"**{symbol}** → ${price:,.2f}")
+        except Exception as e:
+            logging.warning(f"[price] Error for {symbol}: {e}")
+            await ctx.send(f"⚠️ Couldn’t fetch data for `{symbol}`.")
+        return
     try:
-        ticker = yf.Ticker(symbol)
-        price = ticker.fast_info.get("lastPrice")
-        if price is None:
-            price = (
-                ticker.history(period="1d", interval="1m")["Close"]
-                .dropna()
-                .iloc[-1]
-            )
-        await ctx.send(f"**{symbol}** → ${price:,.2f}")
+        prices = await market_data.get_live_prices(symbols)
+        await ctx.send(embed=quote_embed("💵 Prices", prices))
     except Exception as e:
-        logging.warning(f"[price] Error for {symbol}: {e}")
-        await ctx.send(f"⚠️ Couldn’t fetch data for `{symbol}`.")
+        logging.warning(f"[price] Error for {symbols}: {e}")
+        await ctx.send("⚠️ Couldn’t fetch prices right now.")
+
+# Command: !watchlist
+@bot.command(name="watchlist", aliases=["wl"])
+@cooldown(rate=3, per=10, type=BucketType.user)
+async def watchlist(ctx):
+    symbols = parse_symbols(DEFAULT_WATCHLIST)
+    try:
+        prices = await market_data.get_live_prices(symbols)
+        await ctx.send(embed=quote_embed("👀 Watchlist", prices))
+    except Exception as e:
+        logging.warning(f"[watchlist] Error: {e}")
+        await ctx.send("⚠️ Couldn’t fetch the watchlist right now.")
+
+# Command: !watch add/remove/list
+@bot.group(name="watch", invoke_without_command=True)
+async def watch(ctx):
+    await watch_list(ctx)
+
+@watch.command(name="add")
+async def watch_add(ctx, *symbols: str):
+    symbols = parse_symbols(symbols)
+    if not symbols:
+        await ctx.send("Usage: `!watch add <TICKER> [TICKER ...]`")
+        return
+    added = [s for s in symbols if watchlists.add(ctx.author.id, s)]
+    if added:
+        await ctx.send(f"👀 Now watching: {', '.join(f'`{s}`' for s in added)}")
+    else:
+        await ctx.send(f"⚠️ Nothing added (already watched, or your list is full at {watchlists.max_symbols}).")
+
+@watch.command(name="remove", aliases=["rm"])
+async def watch_remove(ctx, *symbols: str):
+    removed = [s for s in parse_symbols(symbols) if watchlists.remove(ctx.author.id, s)]
+    if removed:
+        await ctx.send(f"🗑️ Stopped watching: {', '.join(f'`{s}`' for s in removed)}")
+    else:
+        await ctx.send("⚠️ None of those symbols are on your watchlist.")
+
+@watch.command(name="list", aliases=["ls"])
+async def watch_list(ctx):
+    symbols = watchlists.get(ctx.author.id)
+    if not symbols:
+        await ctx.send("Your watchlist is empty. Add symbols with `!watch add <TICKER>`.")
+        return
+    # Served entirely from the prices the refresher stored, no upstream calls here
+    stored = watchlists.prices(symbols)
+    prices = {s: stored[s][0] if s in stored else None for s in symbols}
+    embed = quote_embed(f"👀 {ctx.author.display_name}'s Watchlist", prices, missing="⏳ refreshing")
+    if stored:
+        # The oldest price shown
+        updated_at = min(updated_at for _, updated_at in stored.values())
+        embed.timestamp = datetime.datetime.fromtimestamp(updated_at, datetime.timezone.utc)
+        embed.set_footer(text="Last refreshed")
+    await ctx.send(embed=embed)
+
+# Command: !alert <TICKER> <condition>, e.g. `!alert AAPL > 200`, `!alert TSLA rsi<30`
+@bot.group(name="alert", invoke_without_command=True)
+@cooldown(rate=3, per=10, type=BucketType.user)
+async def alert(ctx, symbol: str = None, *, condition: str = None):
+    parsed = parse_condition(condition)
+    if symbol is None or parsed is None:
+        await ctx.send("Usage: `!alert <TICKER> > 200` or `!alert <TICKER> rsi<30`")
+        return
+    metric, op, threshold = parsed
+    if metric == "rsi" and not 0 <= threshold <= 100:
+        await ctx.send("⚠️ RSI thresholds must be between 0 and 100.")
+        return
+    created = alert_engine.add(ctx.author.id, symbol.upper().strip(), metric, op, threshold)
+    if created is None:
+        await ctx.send(f"⚠️ You already have {alert_engine.max_per_user} alerts. Remove one with `!alert remove <id>`.")
+        return
+    await ctx.send(f"🔔 Alert {created.describe()} set. I'll DM you when it triggers.")
+
+@alert.command(name="list", aliases=["ls"])
+async def alert_list(ctx):
+    pending = alert_engine.pending(ctx.author.id)
+    if not pending:
+        await ctx.send("You have no pending alerts.")
+        return
+    await ctx.send("🔔 **Your alerts**\n" + "\n".join(a.describe() for a in pending))
+
+@alert.command(name="remove", aliases=["rm"])
+async def alert_remove(ctx, alert_id: int):
+    if alert_engine.remove(ctx.author.id, alert_id):
+        await ctx.send(f"🗑️ Alert #{alert_id} removed.")
+    else:
+        await ctx.send(f"⚠️ You have no pending alert #{alert_id}.")
 
 # Command: !info <TICKER>
 @bot.command(name="info", aliases=["i"])
@@ -53,8 +258,7 @@ async def price(ctx, symbol: str):
 async def info(ctx, symbol: str):
     symbol = symbol.upper().strip()
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
+        info = await market_data.get_info(symbol)
         name = info.get("shortName", "N/A")
         sector = info.get("sector", "N/A")
         market_cap = info.get("marketCap", 0)
@@ -73,8 +277,7 @@ async def info(ctx, symbol: str):
 async def volume(ctx, symbol: str):
     symbol = symbol.upper().strip()
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
+        info = await market_data.get_info(symbol)
         vol = info.get("volume", 0)
         avg_vol = info.get("averageVolume", 0)
 
@@ -85,13 +288,52 @@ async def volume(ctx, symbol: str):
         logging.warning(f"[volume] Error for {symbol}: {e}")
         await ctx.send(f"⚠️ Couldn’t fetch volume data for `{symbol}`.")
 
-# Command: !chart <TICKER>
+# Command: !spark <TICKER>
+@bot.command(name="spark")
+@cooldown(rate=3, per=10, type=BucketType.user)
+async def spark(ctx, symbol: str):
+    symbol = symbol.upper().strip()
+    try:
+        session = await market_data.get_session(symbol)
+    except Exception as e:
+        logging.warning(f"[spark] Error for {symbol}: {e}")
+        await ctx.send(f"⚠️ Couldn’t fetch live ticks for `{symbol}`.")
+        return
+    if session is None:
+        await ctx.send("⚠️ Live quotes are turned off, so there is no intraday data.")
+        return
+    times, prices = session
+    if prices.size < 2:
+        await ctx.send(f"⏳ Collecting live ticks for `{symbol}` — try again in a few minutes.")
+        return
+    start, end = (
+        datetime.datetime.fromtimestamp(t, market_data.MARKET_TZ).strftime("%H:%M") for t in (times[0], times[-1])
+    )
+    change = (prices[-1] / prices[0] - 1) * 100
+    await ctx.send(
+        f"📈 **{symbol}** {start}–{end} ET\n"
+        f"`{quote_stream.sparkline(prices)}`\n"
+        f"Last ${prices[-1]:,.2f} ({change:+.2f}%) · Low ${prices.min():,.2f} · High ${prices.max():,.2f}"
+    )
+
+# Command: !chart <TICKER> [RANGE]
 @bot.command(name="chart", aliases=["c"])
 @cooldown(rate=3, per=10, type=BucketType.user)
-async def chart(ctx, symbol: str):
+async def chart(ctx, symbol: str, period: str = charts.DEFAULT_RANGE):
     symbol = symbol.upper().strip()
+    period = period.lower()
     url = f"https://finance.yahoo.com/quote/{symbol}"
-    await ctx.send(f"📈 Chart for **{symbol}**: {url}")
+    if period not in charts.RANGES:
+        await ctx.send(f"Usage: `!chart <TICKER> [{'|'.join(charts.RANGES)}]`")
+        return
+    try:
+        hist = await market_data.get_daily_history(symbol)
+        path = await charts.chart(symbol, hist, period)
+        await ctx.send(f"📈 **{symbol}** ({period}): {url}", file=discord.File(path, filename=f"{symbol}-{period}.png"))
+    except Exception as e:
+        # Still give them somewhere to look
+        logging.warning(f"[chart] Error for {symbol}: {e}")
+        await ctx.send(f"📈 Chart for **{symbol}**: {url}")
 
 # Command: !rating <TICKER>
 @bot.command(name="rating", aliases=["r"])
@@ -99,13 +341,13 @@ async def chart(ctx, symbol: str):
 async def rating(ctx, symbol: str):
     symbol = symbol.upper().strip()
     try:
-        ticker = yf.Ticker(symbol)
-
-        info = ticker.info
+        info, recs = await asyncio.gather(
+            market_data.get_info(symbol),
+            market_data.get_recommendations(symbol),
+        )
         mean = info.get("recommendationMean")
         key = info.get("recommendationKey")
 
-        recs = ticker.recommendations
         latest = recs.tail(1).iloc[0] if recs is not None and not recs.empty else None
 
         msg = f"🧠 **{symbol}** Analyst Summary:\n"
@@ -146,29 +388,24 @@ async def rating(ctx, symbol: str):
 async def rsi(ctx, symbol: str):
     symbol = symbol.upper().strip()
     try:
-        ticker = yf.Ticker(symbol)
-        data = ticker.history(period="1mo", interval="1d")
+        values = market_digest.get(symbol)
+        if values is not None:
+            latest_rsi, note = values["rsi"], digest_note(values)
+        else:
+            data = await market_data.get_daily_history(symbol)
+
+            if data.empty or "Close" not in data:
+                await ctx.send(f"⚠️ Not enough data to calculate RSI for `{symbol}`.")
+                return
 
-        if data.empty or "Close" not in data:
+            # RSI calculation (14-day, Wilder smoothing)
+            latest_rsi, note = indicators.rsi(data["Close"].dropna().to_numpy()), ""
+        if latest_rsi is None:
             await ctx.send(f"⚠️ Not enough data to calculate RSI for `{symbol}`.")
             return
 
-        close = data["Close"]
-
-        # RSI calculation (14-day)
-        delta = close.diff()
-        gain = delta.where(delta > 0, 0)
-        loss = -delta.where(delta < 0, 0)
-
-        avg_gain = gain.rolling(window=14).mean()
-        avg_loss = loss.rolling(window=14).mean()
-
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        latest_rsi = rsi.dropna().iloc[-1]
-
         emoji = "🟢" if latest_rsi < 30 else "🔴" if latest_rsi > 70 else "🟡"
-        await ctx.send(f"{emoji} **{symbol} RSI (14-day)**: {latest_rsi:.2f}")
+        await ctx.send(f"{emoji} **{symbol} RSI (14-day)**: {latest_rsi:.2f}{note}")
     except Exception as e:
         logging.warning(f"[rsi] Error for {symbol}: {e}")
         await ctx.send(f"⚠️ Couldn’t calculate RSI for `{symbol}`.")
@@ -179,26 +416,18 @@ async def rsi(ctx, symbol: str):
 async def summary(ctx, symbol: str):
     symbol = symbol.upper().strip()
     try:
-        ticker = yf.Ticker(symbol)
-        price = ticker.fast_info.get("lastPrice")
-        info = ticker.info
+        price, info, hist = await asyncio.gather(
+            market_data.get_live_price(symbol),
+            market_data.get_info(symbol),
+            market_data.get_daily_history(symbol),
+        )
         key = info.get("recommendationKey", "N/A").title()
-        rsi_data = ticker.history(period="1mo", interval="1d")["Close"]
-        rsi_val = None
-
-        if not rsi_data.empty:
-            delta = rsi_data.diff()
-            gain = delta.where(delta > 0, 0)
-            loss = -delta.where(delta < 0, 0)
-            avg_gain = gain.rolling(window=14).mean()
-            avg_loss = loss.rolling(window=14).mean()
-            rs = avg_gain / avg_loss
-            rsi_val = 100 - (100 / (1 + rs)).dropna().iloc[-1]
+        rsi_val = indicators.rsi(hist["Close"].dropna().to_numpy())
 
         msg = f"📊 **{symbol}** Summary:\n"
         if price: msg += f"• Price: ${price:,.2f}\n"
         msg += f"• Rating: {key}\n"
-        if rsi_val: msg += f"• RSI (14): {rsi_val:.2f}"
+        if rsi_val is not None: msg += f"• RSI (14): {rsi_val:.2f}"
 
         await ctx.send(msg)
     except Exception as e:
@@ -211,154 +440,116 @@ async def summary(ctx, symbol: str):
 async def movingavg(ctx, symbol: str):
     symbol = symbol.upper().strip()
     try:
-        ticker = yf.Ticker(symbol)
-        data = ticker.history(period="1y", interval="1d")
-
-        if data.empty or "Close" not in data:
+        values = market_digest.get(symbol)
+        note = digest_note(values) if values is not None else ""
+        if values is None:
+            data = await market_data.get_daily_history(symbol)
+
+            if data.empty or "Close" not in data:
+                await ctx.send(f"⚠️ Not enough data to calculate moving averages for `{symbol}`.")
+                return
+
+            values = indicators.compute(data["Close"].to_numpy())
+        ma_50 = values["ma_fast"]
+        ma_200 = values["ma_slow"]
+        if ma_50 is None or ma_200 is None:
             await ctx.send(f"⚠️ Not enough data to calculate moving averages for `{symbol}`.")
             return
 
-        close = data["Close"]
-
-        ma_50 = close.rolling(window=50).mean().dropna().iloc[-1]
-        ma_200 = close.rolling(window=200).mean().dropna().iloc[-1]
-
         trend = "📈 Uptrend" if ma_50 > ma_200 else "📉 Downtrend"
 
         await ctx.send(
             f"🧮 **{symbol} Moving Averages**\n"
             f"• 50-Day: ${ma_50:,.2f}\n"
             f"• 200-Day: ${ma_200:,.2f}\n"
-            f"{trend} (50 vs. 200)"
+            f"{trend} (50 vs. 200){note}"
         )
     except Exception as e:
         logging.warning(f"[movingavg] Error for {symbol}: {e}")
         await ctx.send(f"⚠️ Couldn’t calculate moving averages for `{symbol}`.")
 
-# Command: !news <TICKER>
-@bot.command(name="news", aliases=["n"])
+# Command: !news <TICKER> | !news subscribe|unsubscribe|list
+@bot.group(name="news", aliases=["n"], invoke_without_command=True)
 @cooldown(rate=3, per=10, type=BucketType.user)
-async def news(ctx, symbol: str):
+async def news(ctx, symbol: str = None):
+    if not symbol:
+        await ctx.send("Usage: `!news <TICKER>` or `!news subscribe|unsubscribe|list <TICKER>`")
+        return
     symbol = symbol.upper().strip()
+    news_feed.requested(symbol)
     try:
-        ticker = yf.Ticker(symbol)
-        news_items = ticker.news[:3]  # top 3 items
+        news_items = await market_data.get_news(symbol)
         if not news_items:
             await ctx.send(f"📰 No news found for `{symbol}`.")
             return
 
-        msg = f"🗞️ **{symbol} Latest News**\n"
-        for item in news_items:
-            msg += f"• [{item['title']}]({item['link']})\n"
-        await ctx.send(msg)
+        await ctx.send(f"🗞️ **{symbol} Latest News**\n" + news_lines(news_items))  # top 3 items
     except Exception as e:
         logging.warning(f"[news] Error for {symbol}: {e}")
         await ctx.send(f"⚠️ Couldn't fetch news for `{symbol}`.")
 
+async def can_manage_news(ctx):
+    # Channel posts are for people who may manage the channel
+    if ctx.guild is not None and ctx.channel.permissions_for(ctx.author).manage_channels:
+        return True
+    await ctx.send("⚠️ You need the Manage Channels permission to change this channel's news.")
+    return False
+
+@news.command(name="subscribe", aliases=["sub"])
+async def news_subscribe(ctx, symbol: str):
+    if not await can_manage_news(ctx):
+        return
+    symbol = symbol.upper().strip()
+    if news_feed.subscribe(ctx.channel.id, symbol):
+        await ctx.send(f"🔔 New `{symbol}` headlines will be posted here.")
+    else:
+        await ctx.send(
+            f"⚠️ This channel already follows `{symbol}` or has {news_feed.max_per_channel} subscriptions."
+        )
+
+@news.command(name="unsubscribe", aliases=["unsub"])
+async def news_unsubscribe(ctx, symbol: str):
+    if not await can_manage_news(ctx):
+        return
+    symbol = symbol.upper().strip()
+    if news_feed.unsubscribe(ctx.channel.id, symbol):
+        await ctx.send(f"🔕 No more `{symbol}` headlines here.")
+    else:
+        await ctx.send(f"⚠️ This channel does not follow `{symbol}`.")
+
+@news.command(name="list")
+async def news_list(ctx):
+    symbols = news_feed.subscriptions(ctx.channel.id)
+    if not symbols:
+        await ctx.send("📭 This channel has no news subscriptions.")
+        return
+    await ctx.send("🗞️ News subscriptions here: " + ", ".join(f"`{s}`" for s in symbols))
+
 @bot.command(name="action", aliases=["a"])
 @cooldown(rate=3, per=10, type=BucketType.user)
 async def should_i_buy(ctx, symbol: str):
     symbol = symbol.upper().strip()
     try:
-        ticker = yf.Ticker(symbol)
-
-        # Use 1 year of daily data for all calculations
-        hist = ticker.history(period="1y", interval="1d")
-        if hist.empty or "Close" not in hist:
-            await ctx.send(f"⚠️ Not enough data to analyze `{symbol}`.")
-            return
-
-        close = hist["Close"]
-
-        # Current price
-        current_price = close.iloc[-1]
-
-        # RSI
-        delta = close.diff()
-        gain = delta.where(delta > 0, 0)
-        loss = -delta.where(delta < 0, 0)
-        avg_gain = gain.rolling(window=14).mean()
-        avg_loss = loss.rolling(window=14).mean()
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        latest_rsi = rsi.dropna()
-        if latest_rsi.empty:
-            await ctx.send(f"⚠️ Not enough RSI data for `{symbol}`.")
-            return
-        latest_rsi = latest_rsi.iloc[-1]
-
-        # Moving Averages
-        ma_50_series = close.rolling(window=50).mean().dropna()
-        ma_200_series = close.rolling(window=200).mean().dropna()
-        if ma_50_series.empty or ma_200_series.empty:
-            await ctx.send(f"⚠️ Not enough data for moving averages on `{symbol}`.")
-            return
-        ma_50 = ma_50_series.iloc[-1]
-        ma_200 = ma_200_series.iloc[-1]
+        values = market_digest.get(symbol)
+        if values is None:
+            # Use 1 year of daily data for all calculations
+            hist = await market_data.get_daily_history(symbol)
+            if hist.empty or "Close" not in hist:
+                await ctx.send(f"⚠️ Not enough data to analyze `{symbol}`.")
+                return
 
         # Analyst Recommendation
         try:
-            info = ticker.info
+            info = await market_data.get_info(symbol)
             recommendation = info.get("recommendationKey", "N/A").lower()
         except Exception as info_error:
             logging.warning(f"[info error] {symbol}: {info_error}")
             recommendation = "N/A"
 
-        # Score
-        score = 0
-        reasons = []
-
-        # Price confirms trend
-        if current_price > ma_50 and ma_50 > ma_200:
-            score += 1
-            reasons.append("🟢 Price > 50-day > 200-day → Confirmed uptrend")
-        elif current_price < ma_50 and ma_50 < ma_200:
-            score -= 1
-            reasons.append("🔴 Price < 50-day < 200-day → Confirmed downtrend")
-        else:
-            reasons.append("🔁 Price and MAs not aligned (neutral trend)")
-
-        # RSI
-        if latest_rsi < 30:
-            score += 1
-            reasons.append(f"📉 RSI {latest_rsi:.2f} < 30 → Oversold")
-        elif latest_rsi > 70:
-            score -= 1
-            reasons.append(f"📈 RSI {latest_rsi:.2f} > 70 → Overbought")
-        else:
-            reasons.append(f"🔁 RSI {latest_rsi:.2f} → Neutral")
-
-        # Analyst recommendation
-        if recommendation in ["buy", "strong buy"]:
-            score += 1
-            reasons.append(f"✅ Analyst rating: {recommendation.title()}")
-        elif recommendation in ["sell", "strong sell"]:
-            score -= 1
-            reasons.append(f"⚠️ Analyst rating: {recommendation.title()}")
+        if values is not None:
+            msg = analysis.action_message(symbol, values, recommendation, price_label="Last Close") + digest_note(values)
         else:
-            reasons.append(f"❔ Analyst rating: {recommendation.title()}")
-
-        # Final verdict based on score
-        if score >= 3:
-            verdict = "🟢 Recommendation: **BUY**"
-        elif score == 2:
-            verdict = "🔵 Recommendation: **WATCH TO BUY**"
-        elif score == -1:
-            verdict = "🟠 Recommendation: **WATCH TO SELL**"
-        elif score <= -2:
-            verdict = "🔴 Recommendation: **SELL**"
-        else:
-            verdict = "🟡 Recommendation: **HOLD / WAIT**"
-
-        # Output
-        msg = (
-            f"🤔 **Should You Buy `{symbol}`?**\n"
-            f"💲 Current Price: `${current_price:,.2f}`\n\n"
-            + "\n".join(reasons)
-            + f"\n\n{verdict}"
-            + f"\n⚠️ This is not financial advice. Use your own judgment or consult a professional."
-        )
-
+            msg = await analysis.action_report(symbol, hist["Close"].to_numpy(), recommendation)
         await ctx.send(msg)
 
     except Exception as e:
@@ -381,15 +572,20 @@ async def ping(ctx):
 async def help_command(ctx):
     help_text = """
 📌 **Available Commands**
-`!price <TICKER>` (p) — Get the latest stock price  
+`!price <TICKER> [TICKER ...]` (p) — Get the latest stock price(s), up to 10 at once
+`!watchlist` (wl) — Prices for the default watchlist
+`!watch add|remove|list <TICKER ...>` — Your personal watchlist
+`!alert <TICKER> > 200` / `!alert <TICKER> rsi<30` — DM me when it triggers (`!alert list`, `!alert remove <id>`)
 `!info <TICKER>` (i) — Company overview  
 `!volume <TICKER>` (v) — Current & average volume  
-`!chart <TICKER>` (c) — Link to Yahoo Finance chart  
+`!chart <TICKER> [1mo|3mo|6mo|1y]` (c) — Price chart with moving averages
+`!spark <TICKER>` — Intraday sparkline from live quotes
 `!rating <TICKER>` (r) — Latest analyst rating
 `!rsi <TICKER>` (rsi lol) — Show the latest RSI 
 `!summary <TICKER>` (s) — Price + Rating + RSI
 `!movingavg <TICKER>` (ma) — Returns Moving Average 50 and 200 day
 `!news <TICKER>` (n) — Returns top 3 news articles
+`!news subscribe|unsubscribe <TICKER>` — Post new headlines in this channel (`!news list`)
 `!action <TICKER>` (a) — Responds with what to do
 `!whoami <TICKER>` (w) — Responds with where I am
 `!help` (h) — Show this command list
@@ -402,4 +598,5 @@ if __name__ == "__main__":
     token = os.getenv("DISCORD_TOKEN")
     if not token:
         raise RuntimeError("Set DISCORD_TOKEN as an environment variable!")
+    analysis.start()  # fork the analysis workers before any other threads exist
     bot.run(token)
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Run against the modules in the repository root, and keep the stores that
+# market_data opens on import out of the working tree
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ.setdefault("HISTORY_DB_PATH", os.path.join(_scratch, "history.db"))
+os.environ.setdefault("INFO_CACHE_PATH", "")
+os.environ.setdefault("DIGEST_DB_PATH", os.path.join(_scratch, "digest.db"))
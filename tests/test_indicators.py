@@ -0,0 +1,158 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import digest
+import indicators
+
+
+def random_walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+
+
+def wilder(values, period):
+    # Textbook Wilder smoothing: seed with the mean of the first `period`
+    # values, then avg += (value - avg) / period
+    avg = sum(values[:period]) / period
+    for value in values[period:]:
+        avg += (value - avg) / period
+    return avg
+
+
+def reference_rsi(close, period=14):
+    changes = [b - a for a, b in zip(close, close[1:])]
+    avg_gain = wilder([max(c, 0.0) for c in changes], period)
+    avg_loss = wilder([max(-c, 0.0) for c in changes], period)
+    if avg_loss == 0:
+        return 100.0 if avg_gain > 0 else 50.0
+    return 100 - 100 / (1 + avg_gain / avg_loss)
+
+
+def reference_ema(close, span):
+    # pandas' recursive EMA, started from the SMA seed the bot uses
+    seeded = pd.Series([np.mean(close[:span]), *close[span:]])
+    return seeded.ewm(span=span, adjust=False).mean().iloc[-1]
+
+
+# ----- Batch helpers -----
+
+@pytest.mark.parametrize("n", [15, 16, 60, 400])
+def test_rsi_matches_wilder(n):
+    close = random_walk(n)
+    assert indicators.rsi(close) == pytest.approx(reference_rsi(list(close)), rel=1e-9)
+
+
+def test_rsi_needs_more_than_period_prices():
+    assert indicators.rsi(random_walk(14)) is None
+    assert indicators.rsi(random_walk(15)) is not None
+    assert indicators.rsi([]) is None
+
+
+def test_rsi_without_losses():
+    assert indicators.rsi(np.arange(1.0, 31.0)) == 100.0
+    assert indicators.rsi(np.full(30, 42.0)) == 50.0
+
+
+@pytest.mark.parametrize("window", [1, 20, 50])
+def test_sma_matches_pandas(window):
+    close = random_walk(120)
+    expected = pd.Series(close).rolling(window).mean()
+    assert indicators.sma(close, window) == pytest.approx(expected.iloc[-1])
+    np.testing.assert_allclose(indicators.sma_series(close, window), expected.dropna().to_numpy())
+
+
+def test_sma_short_series():
+    assert indicators.sma([1.0, 2.0], 3) is None
+    assert indicators.sma_series([1.0, 2.0], 3).size == 0
+
+
+@pytest.mark.parametrize("span", [5, 12, 26])
+def test_ema_matches_pandas(span):
+    close = random_walk(100)
+    assert indicators.ema(close, span) == pytest.approx(reference_ema(close, span))
+    assert indicators.ema(close[:span], span) == pytest.approx(close[:span].mean())
+    assert indicators.ema(close[:span - 1], span) is None
+
+
+def test_compute_drops_gaps():
+    close = random_walk(250)
+    gappy = close.copy()
+    gappy[[10, 100]] = np.nan
+    values = indicators.compute(gappy)
+    clean = close[~np.isnan(gappy)]
+    assert values["price"] == clean[-1]
+    assert values["rsi"] == pytest.approx(indicators.rsi(clean))
+    assert values["ma_slow"] == pytest.approx(clean[-200:].mean())
+    assert indicators.compute([]) == {"price": None, "rsi": None, "ma_fast": None, "ma_slow": None}
+
+
+# ----- Incremental state -----
+
+def test_states_follow_batch_helpers():
+    close = random_walk(80, seed=1)
+    rsi, sma, ema = indicators.RSIState(14), indicators.SMAState(20), indicators.EMAState(12)
+    for i, price in enumerate(close, 1):
+        prefix = close[:i]
+        for state, batch in ((rsi, indicators.rsi(prefix)),
+                             (sma, indicators.sma(prefix, 20)),
+                             (ema, indicators.ema(prefix, 12))):
+            value = state.update(price)
+            if batch is None:
+                assert value is None
+            else:
+                assert value == pytest.approx(batch, rel=1e-9)
+
+
+def test_rsi_state_without_losses():
+    state = indicators.RSIState(14)
+    for price in range(1, 20):
+        state.update(float(price))
+    assert state.value == 100.0
+    flat = indicators.RSIState(14)
+    for _ in range(20):
+        flat.update(5.0)
+    assert flat.value == 50.0
+
+
+# ----- Nightly digest (every series at once) -----
+
+def test_digest_compute_matches_indicators():
+    series = [random_walk(n, seed=n) for n in (300, 250, 201, 120, 30, 15, 14, 1)]
+    series[0][[5, 150]] = np.nan
+    series.append(np.arange(1.0, 61.0))  # no losses
+    series.append(np.full(40, 10.0))  # no changes at all
+    values = digest.compute(series)
+    assert values.shape == (len(series), len(digest.FIELDS))
+    for row, close in zip(values, series):
+        expected = indicators.compute(close, digest.RSI_PERIOD, digest.MA_FAST, digest.MA_SLOW)
+        for field, value in zip(digest.FIELDS, row):
+            if expected[field] is None:
+                assert np.isnan(value), field
+            else:
+                assert value == pytest.approx(expected[field], rel=1e-9), field
+
+
+def test_digest_compute_empty_and_short():
+    values = digest.compute([np.array([]), np.array([5.0, 6.0])])
+    assert np.isnan(values[0]).all()
+    assert values[1][0] == 6.0
+    assert np.isnan(values[1][1:]).all()
+
+
+def test_digest_build_skips_the_open_session(tmp_path, monkeypatch):
+    # A build during market hours must not take today's partial bar for the close
+    close_date = digest.last_close().date()
+    dates = pd.date_range(end=close_date + pd.Timedelta(days=1), periods=30, freq="D")
+    history = pd.DataFrame({"Close": random_walk(len(dates))}, index=dates)
+
+    async def get_daily_histories(symbols):
+        return {s: history for s in symbols}
+
+    monkeypatch.setattr(digest.market_data, "get_daily_histories", get_daily_histories)
+    table = digest.Digest(path=str(tmp_path / "digest.db"), universe=["AAA"])
+    asyncio.run(table.build())
+    assert table.as_of["AAA"] == close_date.isoformat()
+    assert table._values[0][0] == pytest.approx(history["Close"].iloc[-2])
@@ -0,0 +1,107 @@
+import time
+import asyncio
+
+import market_data
+import quote_stream
+from quote_stream import QuoteStream, SimulatedFeed, YahooFeed
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_subscribed_symbols_are_served_from_ticks():
+    async def main():
+        stream = QuoteStream(lambda: SimulatedFeed(interval=0.01, prices={"AAA": 100.0}, seed=1))
+        stream.subscribe(["AAA"])
+        stream.start()
+        try:
+            await wait_for(lambda: stream.price("AAA") is not None)
+            assert stream.connected
+            assert await stream.get_price("AAA") == stream.price("AAA")
+            # Subscribing while connected reaches the feed too
+            stream.subscribe(["BBB"])
+            await wait_for(lambda: stream.price("BBB") is not None)
+            times, prices = stream.session("AAA")
+            assert len(times) == len(prices) >= 1
+        finally:
+            stream.stop()
+
+    asyncio.run(main())
+
+
+def test_stale_and_unknown_symbols_fall_back_to_polling(monkeypatch):
+    async def get_price(symbol):
+        return 1.0
+
+    async def get_prices(symbols):
+        return {symbol: 2.0 for symbol in symbols}
+
+    monkeypatch.setattr(market_data.get_price, "local", get_price)
+    monkeypatch.setattr(market_data.get_prices, "local", get_prices)
+
+    async def main():
+        stream = QuoteStream(SimulatedFeed, max_age=60)
+        stream.subscribe(["OLD", "NEW"])
+        stream.on_tick("OLD", time.time() - 3600, 50.0)
+        stream.on_tick("NEW", time.time(), 60.0)
+        assert stream.price("OLD") is None
+        assert await stream.get_price("OLD") == 1.0
+        assert await stream.get_prices(["OLD", "NEW", "NONE"]) == {"OLD": 2.0, "NEW": 60.0, "NONE": 2.0}
+        assert "NONE" in stream.rings  # subscribed on first use
+
+    asyncio.run(main())
+
+
+def test_disabled_stream_does_not_subscribe():
+    stream = QuoteStream(None)
+    stream.subscribe(["AAA"])
+    assert not stream.enabled and not stream.rings
+
+
+def test_reconnects_after_a_failed_feed():
+    connects = []
+
+    class FlakyFeed(SimulatedFeed):
+        async def connect(self):
+            connects.append(time.monotonic())
+            if len(connects) == 1:
+                raise ConnectionError("refused")
+
+    async def main():
+        stream = QuoteStream(lambda: FlakyFeed(interval=0.01, seed=2))
+        stream.subscribe(["AAA"])
+        reconnects = quote_stream.stats["reconnects"]
+        stream.start()
+        try:
+            await wait_for(lambda: stream.price("AAA") is not None)
+        finally:
+            stream.stop()
+        assert len(connects) == 2
+        assert quote_stream.stats["reconnects"] == reconnects + 1
+
+    asyncio.run(main())
+
+
+def test_failed_heartbeat_closes_the_socket():
+    class Socket:
+        closed = False
+
+        async def send(self, message):
+            raise ConnectionError("broken pipe")
+
+        async def close(self):
+            self.closed = True
+
+    async def main():
+        feed = YahooFeed()
+        feed.heartbeat = 0.01
+        feed.symbols = {"AAA"}
+        feed._ws = Socket()
+        await asyncio.wait_for(feed._heartbeat(), 1)
+        assert feed._ws.closed
+
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+
+import market_data
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlists (
+    user_id  INTEGER NOT NULL,
+    symbol   TEXT NOT NULL,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (user_id, symbol)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS watchlists_symbol ON watchlists (symbol);
+CREATE TABLE IF NOT EXISTS watch_prices (
+    symbol     TEXT PRIMARY KEY,
+    price      REAL NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class WatchlistStore:
+    """Per-user symbol lists persisted in SQLite.
+
+    Adding or removing a symbol writes one row instead of rewriting every
+    list. The symbol index makes the union of every list (what the
+    refresher fetches) a scan of distinct keys rather than of all rows.
+    The refresher's latest prices are kept here too, so every bot process
+    serves ``!watch list`` from the one refresh.
+    """
+
+    def __init__(self, path, max_symbols=25):
+        self.path = path
+        self.max_symbols = max_symbols
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def import_json(self, path):
+        """Merge a ``{user_id: [symbol, ...]}`` file from the old JSON store, then set it aside."""
+        with open(path, "r") as f:
+            data = json.load(f)
+        now = time.time()
+        rows = [
+            (int(user_id), symbol, now + i * 1e-6)  # keep each list's order
+            for user_id, symbols in data.items()
+            for i, symbol in enumerate(symbols)
+        ]
+        with self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO watchlists VALUES (?, ?, ?)", rows)
+        os.replace(path, path + ".imported")
+        logging.info(f"[watchlist] Imported {len(rows)} entries from {path}")
+
+    def get(self, user_id):
+        rows = self._conn.execute(
+            "SELECT symbol FROM watchlists WHERE user_id = ? ORDER BY added_at", (user_id,)
+        ).fetchall()
+        return [symbol for (symbol,) in rows]
+
+    def symbols(self):
+        return {symbol for (symbol,) in self._conn.execute("SELECT DISTINCT symbol FROM watchlists")}
+
+    def add(self, user_id, symbol):
+        """Add ``symbol`` to the user's list. Returns False if it was already there or the list is full."""
+        with self._conn:
+            # One statement, so the size check and the insert cannot interleave
+            # with another writer
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO watchlists (user_id, symbol, added_at) "
+                "SELECT ?, ?, ? WHERE (SELECT COUNT(*) FROM watchlists WHERE user_id = ?) < ?",
+                (user_id, symbol, time.time(), user_id, self.max_symbols),
+            )
+        return cursor.rowcount == 1
+
+    def remove(self, user_id, symbol):
+        with self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM watchlists WHERE user_id = ? AND symbol = ?", (user_id, symbol)
+            )
+        return cursor.rowcount == 1
+
+    def prices(self, symbols):
+        """``{symbol: (price, updated_at)}`` for the given symbols that have a price."""
+        symbols = list(symbols)
+        rows = self._conn.execute(
+            f"SELECT symbol, price, updated_at FROM watch_prices WHERE symbol IN ({', '.join('?' * len(symbols))})",
+            symbols,
+        ).fetchall()
+        return {symbol: (price, updated_at) for symbol, price, updated_at in rows}
+
+    def unpriced(self):
+        """Watched symbols without a price yet."""
+        rows = self._conn.execute(
+            "SELECT DISTINCT symbol FROM watchlists WHERE symbol NOT IN (SELECT symbol FROM watch_prices)"
+        ).fetchall()
+        return {symbol for (symbol,) in rows}
+
+    def set_prices(self, prices, updated_at):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO watch_prices VALUES (?, ?, ?)",
+                [(symbol, price, updated_at) for symbol, price in prices.items()],
+            )
+
+    def prune_prices(self):
+        # Drop prices of symbols nobody watches any more
+        with self._conn:
+            self._conn.execute("DELETE FROM watch_prices WHERE symbol NOT IN (SELECT symbol FROM watchlists)")
+
+
+class WatchlistRefresher:
+    """Background task that refreshes every watched symbol on a schedule.
+
+    Each tick fetches the de-duplicated union of all lists in bulk, so the
+    cost depends on the number of distinct symbols, not on the number of users.
+    Symbols go out ``batch_size`` at a time, each batch under its own timeout,
+    and the prices that came back are written to the store with the time they
+    were fetched; a symbol that got none keeps its last price and time.
+
+    Only one process runs it. Between ticks it looks every ``min_interval``
+    seconds for symbols added (by any process) that have no price yet, and
+    fetches just those.
+    """
+
+    def __init__(self, store, interval_open=60, interval_closed=900,
+                 batch_size=10, batch_timeout=30, min_interval=5):
+        self.store = store
+        self.interval_open = interval_open
+        self.interval_closed = interval_closed
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.min_interval = min_interval
+        self._tried = set()  # unpriced symbols already fetched once this tick
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def interval(self):
+        return self.interval_open if market_data.is_market_open() else self.interval_closed
+
+    async def refresh(self, symbols=None):
+        """Fetch ``symbols`` (default: every watched symbol) into the store."""
+        if symbols is None:
+            self.store.prune_prices()
+            symbols = self.store.symbols()
+        symbols = sorted(symbols)
+        for i in range(0, len(symbols), self.batch_size):
+            batch = symbols[i:i + self.batch_size]
+            try:
+                prices = await asyncio.wait_for(market_data.get_prices(batch), self.batch_timeout)
+            except Exception as e:
+                logging.warning(f"[watchlist] Prices for {batch[0]}..{batch[-1]} failed: {str(e) or type(e).__name__}")
+                continue
+            self.store.set_prices({s: p for s, p in prices.items() if p is not None}, time.time())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.warning(f"[watchlist] Refresh failed: {e}")
+            self._tried = set()
+            deadline = time.monotonic() + self.interval()
+            while time.monotonic() < deadline:
+                await asyncio.sleep(min(self.min_interval, deadline - time.monotonic()))
+                try:
+                    new = self.store.unpriced() - self._tried
+                    if new:
+                        self._tried |= new
+                        await self.refresh(new)
+                except Exception as e:
+                    logging.warning(f"[watchlist] Refresh of new symbols failed: {e}")
@@ -1,13 +1,20 @@
-from discord.ext.commands import check
 import time
+import atexit
 import os
 import logging
 import discord
 from discord.ext import commands
 from discord.ext.commands import cooldown, BucketType
-import yfinance as yf
 from dotenv import load_dotenv
 import datetime
+import market_data
+import metrics
+import stale_notice
+from health import start_health_server
+from balance_store import BalanceStore
+from ledger import Ledger, InsufficientFunds
+from leaderboard import Leaderboard
+from routing import ChannelRouter, WrongChannel
 
 CHANNELS = {
     "welcome": 1397334679706800168,
@@ -20,6 +27,7 @@ CHANNELS = {
     "stock_info": 1397336166113476699,
     "discord_store": 1399515025605001298,  # <- store commands allowed only here
 }
+CHANNEL_IDS = frozenset(CHANNELS.values())  # O(1) "is this one of our channels?"
 
 # Load environment variables
 load_dotenv()
@@ -31,8 +39,20 @@ logging.basicConfig(level=logging.INFO)
 intents = discord.Intents.default()
 intents.message_content = True
 
+# Health and /metrics endpoints; its own port so it can share a host with the other bots
+HEALTH_PORT = int(os.getenv("YTBOT_HEALTH_PORT", "8082"))
+
 # Create the bot instance
-bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
+COMMAND_PREFIX = "!"
+bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents, help_command=None)
+metrics.instrument_bot(bot, "ytbot")  # command latency, gateway latency, loop lag
+stale_notice.install(bot)  # flag replies served from stale cache while rate limited
+
+@bot.event
+async def setup_hook():
+    await start_health_server(bot, port=HEALTH_PORT)
+    user_balances.start()
+    last_daily_claim.start()
 
 @bot.event
 async def on_ready():
@@ -48,15 +68,11 @@ async def on_member_join(member):
 #Rules
 @bot.command()
 async def rules(ctx):
-    if ctx.channel.id != CHANNELS["rules"]:
-        return
     await ctx.send("📏 **Server Rules**:\n1. Be kind.\n2. No spam.\n3. Stay on topic.\n4. Respect others.")
 
 #Announcements
 @bot.command()
 async def announce(ctx, *, message):
-    if ctx.channel.id != CHANNELS["announcements"]:
-        return
     if not ctx.author.guild_permissions.administrator:
         return await ctx.send("❌ Only admins can post announcements.")
     await ctx.send(f"📢 **Announcement:**\n{message}")
@@ -64,51 +80,65 @@ async def announce(ctx, *, message):
 #Trade Bot
 @bot.command()
 async def logtrade(ctx, *, trade_note):
-    if ctx.channel.id != CHANNELS["trade_bot"]:
-        return
     await ctx.send(f"📒 Trade logged: `{trade_note}`")
 
 #Stock Chat
 @bot.event
 async def on_message(message):
-    await bot.process_commands(message)  # ensure other commands still run
-
+    # Cheapest rejections first: most messages never reach the command parser
     if message.author.bot:
         return
 
     if message.channel.id == CHANNELS["stock_chat"]:
-        user_id = message.author.id
-        user_balances[user_id] = user_balances.get(user_id, 0) + 1  # +1 coin per msg
-        print(f"🪙 Gave 1 coin to {message.author.name} for chatting in stock-chat.")
+        economy.credit(message.author.id, 1)  # +1 coin per msg, persisted in batches
+        log_chat_reward(message.author.id)
+
+    if not message.content.startswith(COMMAND_PREFIX):
+        return
+    await bot.process_commands(message)
+
+# Chat rewards are logged as one summary line per interval, not one per message
+CHAT_LOG_INTERVAL = 60
+_chat_rewards = {"coins": 0, "users": set(), "since": time.monotonic()}
+
+def log_chat_reward(user_id):
+    _chat_rewards["coins"] += 1
+    _chat_rewards["users"].add(user_id)
+    if time.monotonic() - _chat_rewards["since"] >= CHAT_LOG_INTERVAL:
+        logging.info(
+            f"🪙 Gave {_chat_rewards['coins']} coins to {len(_chat_rewards['users'])} users "
+            f"for chatting in stock-chat."
+        )
+        _chat_rewards.update(coins=0, users=set(), since=time.monotonic())
 
 #Stock Info
 @bot.command()
 async def moreinfo(ctx, symbol: str):
-    if ctx.channel.id != CHANNELS["stock_info"]:
-        return
     symbol = symbol.upper().strip()
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
+        info = await market_data.get_info(symbol)
         description = info.get("longBusinessSummary", "No description.")
         await ctx.send(f"📝 **{symbol} Description**:\n{description[:1000]}")
     except Exception as e:
         await ctx.send("⚠️ Could not fetch extended info.")
 
 #Store
-def is_store_channel():
-    async def predicate(ctx):
-        return ctx.channel.id == CHANNELS["discord_store"]
-    return check(predicate)
-
-# In-memory user balance
-user_balances = {}
+# User balances and daily-claim timestamps, kept in memory and flushed to
+# SQLite in batches so they survive restarts
+ECONOMY_DB = "ytbot.db"
+user_balances = BalanceStore(ECONOMY_DB, table="balances")
 
 # Track when each user last claimed their daily reward
-last_daily_claim = {}
+last_daily_claim = BalanceStore(ECONOMY_DB, table="daily_claims")
+
+atexit.register(user_balances.flush)
+atexit.register(last_daily_claim.flush)
+
+economy = Ledger(user_balances)  # debit/credit with no lost updates
+coin_board = Leaderboard(user_balances.items())  # kept in sync on every change
+economy.subscribe(coin_board.update)
 
 @bot.command()
-@is_store_channel()
 async def daily(ctx):
     user_id = ctx.author.id
     now = time.time()
@@ -125,8 +155,10 @@ async def daily(ctx):
         )
 
     reward_amount = 50  # customize as needed
-    user_balances[user_id] = user_balances.get(user_id, 0) + reward_amount
+    # No await between the claim check above and these updates, so a double
+    # !daily can't pay out twice
     last_daily_claim[user_id] = now
+    economy.credit(user_id, reward_amount)
 
     await ctx.send(f"🎁 {ctx.author.mention}, you received **{reward_amount} coins** for your daily check-in!")
 
@@ -134,15 +166,37 @@ async def daily(ctx):
 @bot.command()
 async def balance(ctx):
     user = ctx.author.id
-    balance = user_balances.get(user, 0)
+    balance = economy.balance(user)
     await ctx.send(f"{ctx.author.mention}, your balance is {balance} coins.")
 
 @bot.command()
 async def give(ctx, member: discord.Member, amount: int):
     if ctx.author.guild_permissions.administrator:
-        user_balances[member.id] = user_balances.get(member.id, 0) + amount
+        if amount <= 0:
+            return await ctx.send("Amount must be positive.")
+        economy.credit(member.id, amount)
         await ctx.send(f"Gave {amount} coins to {member.mention}.")
 
+@bot.command(name="leaderboard", aliases=["top"])
+async def leaderboard(ctx):
+    top = coin_board.top(10)
+    if not top:
+        return await ctx.send("Nobody has any coins yet!")
+    lines = [f"**{i}.** <@{user_id}> — {coins} coins" for i, (user_id, coins) in enumerate(top, 1)]
+    embed = discord.Embed(title="🪙 Coin Leaderboard", description="\n".join(lines), color=discord.Color.gold())
+    await ctx.send(embed=embed)
+
+@bot.command(name="rank")
+async def rank(ctx, member: discord.Member = None):
+    member = member or ctx.author
+    position = coin_board.rank(member.id)
+    if position is None:
+        return await ctx.send(f"{member.mention} isn't on the leaderboard yet.")
+    await ctx.send(
+        f"{member.mention} is ranked **#{position}** of {len(coin_board)} "
+        f"with **{economy.balance(member.id)} coins**."
+    )
+
 store_items = {
     "vip": {"price": 100, "role_name": "VIP"},
 }
@@ -154,22 +208,43 @@ async def buy(ctx, item_name):
     if not item:
         return await ctx.send("Item not found.")
 
-    if user_balances.get(user, 0) < item["price"]:
+    if economy.balance(user) < item["price"]:
         return await ctx.send("Not enough coins!")
 
     role = discord.utils.get(ctx.guild.roles, name=item["role_name"])
     if role:
-        await ctx.author.add_roles(role)
-        user_balances[user] -= item["price"]
+        # Coins are taken before the Discord call and refunded if it fails
+        try:
+            async with economy.purchase(user, item["price"]):
+                await ctx.author.add_roles(role)
+        except InsufficientFunds:
+            return await ctx.send("Not enough coins!")
         await ctx.send(f"{ctx.author.mention} bought {item_name} and received the {role.name} role!")
 
 
+#Channel Routing
+# Commands that only run in one channel, checked once globally before dispatch
+WRONG_CHANNEL_NOTICE = "⚠️ You can't use this command in this channel. Please use the correct one."
+router = ChannelRouter(
+    bot,
+    routes={
+        "rules": CHANNELS["rules"],
+        "announce": CHANNELS["announcements"],
+        "logtrade": CHANNELS["trade_bot"],
+        "moreinfo": CHANNELS["stock_info"],
+        "daily": CHANNELS["discord_store"],
+    },
+    notices={"daily": WRONG_CHANNEL_NOTICE},
+)
+
 #Error Handling
 @bot.event
 async def on_command_error(ctx, error):
+    if isinstance(error, WrongChannel) and not error.notice:
+        return  # quietly ignored outside its channel
     if isinstance(error, commands.CheckFailure):
-        if ctx.channel.id not in CHANNELS.values():
+        if ctx.channel.id not in CHANNEL_IDS:
             return
-        await ctx.send("⚠️ You can't use this command in this channel. Please use the correct one.")
+        await ctx.send(getattr(error, "notice", None) or WRONG_CHANNEL_NOTICE)
 
 